@@ -1,14 +1,41 @@
+import asyncio
 import hashlib
 import json
 import logging
 import os
+import shutil
 import sqlite3
 import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-
-from pipelines import run_iep_alignment_selected
+from typing import Any, Dict, List, Optional, Tuple
+
+from pipelines import (
+    CancelToken,
+    Cancelled,
+    CheckpointLog,
+    ExplanationStore,
+    HistoryStore,
+    Job,
+    cc_alignment_pipeline,
+    explain_iep_alignment,
+    run_cc_alignment_selected,
+    run_iep_alignment_selected,
+)
+from pipelines import checkpoint as align_checkpoint
+from pipelines.chat_pipeline import HELP_TEXT as CHAT_HELP_TEXT, DirectiveIntake
+from pipelines import telemetry as llm_telemetry
+from pipelines.ingest import (
+    IEP_INGEST_MAX_FILES, IEP_INGEST_MAX_UPLOAD_MB, count_pdfs as count_iep_pdfs,
+    expand_inputs as expand_iep_inputs, ingest_pdfs, summarize as ingest_summarize,
+)
+from pipelines.llm import LLM_UNAVAILABLE, VerdictParseError
+from pipelines.llm_pool import POOL as LLM_POOL
+from pipelines.model_manager import LLM_WARMUP, MANAGER as MODEL_MANAGER
+from pipelines.resilience import BREAKER as LLM_BREAKER
 
 import jwt
 import uvicorn
@@ -21,13 +48,30 @@ from fastapi import (
     Form,
     Path as FPath,
     Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
 )
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 
+from jsonstore import STORE as JSON_STORE, StoreConflict, bump_rev, check_rev, read_json, rev_of, transaction, write_json
+from listing import BadQuery, ListIndex, Page, parse_fields
 from logger import SimpleAppLogger
+from metrics import (
+    ALIGN_CANCELLED,
+    ALIGN_COALESCED,
+    ALIGN_DURATION,
+    ALIGN_IN_FLIGHT,
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    HTTP_LATENCY,
+    HTTP_REQUESTS,
+    REGISTRY as METRICS,
+    STORE_IO,
+)
 
 # ============================================================
 # ======================= CONFIG =============================
@@ -126,6 +170,8 @@ class ReportMeta(BaseModel):
     category: str
     tags: List[str] = []
     students: List[str] = []  # <— NEW: searchable student names
+    course: Optional[str] = None  # snapshot reports
+    unit: Optional[str] = None
 
 
 class ReportUpdate(BaseModel):
@@ -139,6 +185,7 @@ class IEPAlignRequest(BaseModel):
     student_ids: List[str]
     courses: List[str]
     units: List[str]
+    scores_only: bool = False   # skip explanations; fetch them later via /align/explain
 
 class IEPAlignResponse(BaseModel):
     meta: Dict
@@ -196,16 +243,18 @@ def ensure_library():
         with open(LIB_INDEX, "w", encoding="utf-8") as f:
             json.dump({"docs": {}}, f)
 
-def _load_index() -> Dict[str, Dict]:
-    ensure_library()
-    with open(LIB_INDEX, "r", encoding="utf-8") as f:
-        return json.load(f)
+@STORE_IO.time(store="library_index", op="read")
+def _load_index(shared: bool = False) -> Dict[str, Dict]:
+    """shared=True: the cached object itself, for read-only callers (see jsonstore)."""
+    data = read_json(LIB_INDEX, None, store="library_index", shared=shared)
+    if data is None:
+        ensure_library()
+        data = read_json(LIB_INDEX, {"docs": {}}, store="library_index", shared=shared)
+    return data
 
+@STORE_IO.time(store="library_index", op="write")
 def _save_index(data: Dict):
-    tmp = str(LIB_INDEX) + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, LIB_INDEX)
+    write_json(LIB_INDEX, data, store="library_index")
 
 def _safe_filename(name: str) -> str:
     keep = "-_.() "
@@ -214,6 +263,47 @@ def _safe_filename(name: str) -> str:
 def _now_iso() -> str:
     return datetime.now().isoformat(timespec="seconds") + "Z"
 
+def _if_match(request: Request) -> Optional[int]:
+    """Revision from an If-Match header (ETag value as sent by GET), or None to skip the check."""
+    raw = (request.headers.get("if-match") or "").strip()
+    if not raw or raw == "*":
+        return None
+    try:
+        return int(raw.removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be a revision from the ETag header")
+
+def _etag(response: Response, record: Dict) -> None:
+    response.headers["ETag"] = f'"{rev_of(record)}"'
+
+def _query_list(index: ListIndex, sort: str, order: Optional[str], default_order: str, **kw) -> Page:
+    try:
+        return index.query(sort, descending=(order or default_order) == "desc", **kw)
+    except BadQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _page_headers(page: Page, response: Response) -> Dict[str, str]:
+    headers = {"X-Total-Count": str(page.total)}
+    if page.next_cursor:
+        headers["X-Next-Cursor"] = page.next_cursor
+    response.headers.update(headers)
+    return headers
+
+def _list_response(page: Page, response: Response):
+    """The page's rows; projected rows (fields=) skip the response model, which they no longer fit."""
+    headers = _page_headers(page, response)
+    if page.fields:
+        return JSONResponse(page.items, headers=headers)
+    return page.items
+
+@app.exception_handler(StoreConflict)
+async def _store_conflict(request: Request, exc: StoreConflict):
+    return JSONResponse(
+        {"detail": f"{exc.what} was changed by someone else; reload and retry", "rev": exc.current},
+        status_code=409,
+        headers={"ETag": f'"{exc.current}"'},
+    )
+
 def ensure_students_dir():
     STU_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -233,8 +323,7 @@ def _student_name_from_id(sid: str) -> Optional[str]:
     if not p.exists():
         return None
     try:
-        with open(p, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = read_json(p, {}, store="student", shared=True)
         nm = data.get("student", {}).get("student_name")
         if isinstance(nm, str) and nm.strip():
             return nm.strip()
@@ -248,21 +337,24 @@ def _student_file_for_id(sid: str) -> Path:
     safe = "".join(ch for ch in sid if ch.isalnum() or ch in "-_")
     return STU_DIR / f"{safe}.json"
 
+def _is_student_file(name: str) -> bool:
+    # Skip known non-student files and hidden ones
+    stem = name[:-5].lower() if name.endswith(".json") else ""
+    return bool(stem) and stem not in {"index", "reports"} and not name.startswith(("_", "."))
+
 def _scan_students() -> List[Tuple[str, Dict]]:
     """
     Scan /data/students for individual student JSONs.
     Ignores aggregator/aux files like index.json, reports.json, and hidden/underscore files.
+    The dicts are the shared cached objects: read-only.
     """
     ensure_students_dir()
     out: List[Tuple[str, Dict]] = []
     for p in sorted(STU_DIR.glob("*.json")):
-        stem = p.stem.lower()
-        # Skip known non-student files and hidden ones
-        if stem in {"index", "reports"} or p.name.startswith("_") or p.name.startswith("."):
+        if not _is_student_file(p.name):
             continue
         try:
-            with open(p, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            data = read_json(p, store="student", shared=True)
             sid = p.stem
             out.append((sid, data))
         except Exception as e:
@@ -270,6 +362,18 @@ def _scan_students() -> List[Tuple[str, Dict]]:
     return out
 
 
+def _student_file_sigs() -> List[Tuple[str, Tuple[int, int, int]]]:
+    """(student id, (inode, mtime_ns, size)) per student file; one scandir, no reads."""
+    ensure_students_dir()
+    out = []
+    with os.scandir(STU_DIR) as it:
+        for e in it:
+            if _is_student_file(e.name):
+                st = e.stat()
+                out.append((e.name[:-5], (st.st_ino, st.st_mtime_ns, st.st_size)))
+    return out
+
+
 def _badges_from_accommodations(accom_text: str) -> List[str]:
     s = accom_text.lower()
     badges = []
@@ -308,6 +412,7 @@ def _merge_deep(orig: Dict, patch: Dict) -> Dict:
 
 CUR_REPORTS_PATH = (DATA_DIR / "curriculum" / "reports.json")
 
+@STORE_IO.time(store="course_reports", op="read")
 def _load_course_reports() -> Dict[str, Dict]:
     """
     Shape:
@@ -330,12 +435,11 @@ def _load_course_reports() -> Dict[str, Dict]:
       }
     }
     """
-    CUR_DIR.mkdir(parents=True, exist_ok=True)
-    if not CUR_REPORTS_PATH.exists():
-        return {"courses": {}}
     try:
-        with open(CUR_REPORTS_PATH, "r", encoding="utf-8") as f:
-            obj = json.load(f)
+        obj = read_json(CUR_REPORTS_PATH, None, store="course_reports")
+        if obj is None:
+            CUR_DIR.mkdir(parents=True, exist_ok=True)
+            return {"courses": {}}
         if not isinstance(obj, dict) or "courses" not in obj:
             return {"courses": {}}
         if not isinstance(obj["courses"], dict):
@@ -345,12 +449,10 @@ def _load_course_reports() -> Dict[str, Dict]:
         logger.warning(f"Failed loading course reports store: {e}")
         return {"courses": {}}
 
+@STORE_IO.time(store="course_reports", op="write")
 def _save_course_reports(obj: Dict[str, Dict]) -> None:
     CUR_DIR.mkdir(parents=True, exist_ok=True)
-    tmp = str(CUR_REPORTS_PATH) + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, CUR_REPORTS_PATH)
+    write_json(CUR_REPORTS_PATH, obj, store="course_reports")
 
 def _all_student_names() -> List[str]:
     """
@@ -363,8 +465,7 @@ def _all_student_names() -> List[str]:
         if stem in {"index", "reports"} or p.name.startswith("_") or p.name.startswith("."):
             continue
         try:
-            with open(p, "r", encoding="utf-8") as f:
-                j = json.load(f)
+            j = read_json(p, {}, store="student", shared=True)
             nm = str(j.get("student", {}).get("student_name", "")).strip()
             if nm:
                 names.append(nm)
@@ -372,9 +473,19 @@ def _all_student_names() -> List[str]:
             continue
     return names
 
+def _student_names_by_id() -> Dict[str, str]:
+    """{student id: student_name} for every student JSON that has a name."""
+    out: Dict[str, str] = {}
+    for sid, data in _scan_students():
+        nm = str((data.get("student") or {}).get("student_name", "")).strip()
+        if nm:
+            out[sid] = nm
+    return out
+
 def _status_from_mean(mean: int) -> str:
     # Mirror your default thresholds
     return "good" if mean >= 85 else ("warn" if mean >= 70 else "bad")
+@transaction()
 def _apply_course_fit_overrides(course: str, units: List[str], worksheet_overall: Dict[str, int]) -> None:
     """
     Update per-unit sidecars (legacy) AND root curriculum/index.json (preferred).
@@ -387,10 +498,7 @@ def _apply_course_fit_overrides(course: str, units: List[str], worksheet_overall
             continue
         idx_path = unit_dir / "index.json"
         try:
-            current = {}
-            if idx_path.exists():
-                with open(idx_path, "r", encoding="utf-8") as f:
-                    current = json.load(f)
+            current = read_json(idx_path, {}, store="unit_index")
             if not isinstance(current, dict):
                 current = {}
             changed = False
@@ -411,10 +519,7 @@ def _apply_course_fit_overrides(course: str, units: List[str], worksheet_overall
                     }
                     changed = True
             if changed:
-                tmp = str(idx_path) + ".tmp"
-                with open(tmp, "w", encoding="utf-8") as f:
-                    json.dump(current, f, ensure_ascii=False, indent=2)
-                os.replace(tmp, idx_path)
+                write_json(idx_path, current, store="unit_index")
         except Exception as e:
             logger.warning(f"Failed updating unit sidecar for {course}/{unit}: {e}")
 
@@ -446,6 +551,7 @@ def _apply_course_fit_overrides(course: str, units: List[str], worksheet_overall
 
 STU_REPORTS_PATH = STU_DIR / "reports.json"
 
+@STORE_IO.time(store="student_reports", op="read")
 def _load_student_reports() -> Dict[str, Dict]:
     """
     Shape:
@@ -466,12 +572,11 @@ def _load_student_reports() -> Dict[str, Dict]:
       }
     }
     """
-    ensure_students_dir()
-    if not STU_REPORTS_PATH.exists():
-        return {"students": {}}
     try:
-        with open(STU_REPORTS_PATH, "r", encoding="utf-8") as f:
-            obj = json.load(f)
+        obj = read_json(STU_REPORTS_PATH, None, store="student_reports")
+        if obj is None:
+            ensure_students_dir()
+            return {"students": {}}
         if not isinstance(obj, dict) or "students" not in obj:
             return {"students": {}}
         if not isinstance(obj["students"], dict):
@@ -481,12 +586,10 @@ def _load_student_reports() -> Dict[str, Dict]:
         logger.warning(f"Failed loading student reports store: {e}")
         return {"students": {}}
 
+@STORE_IO.time(store="student_reports", op="write")
 def _save_student_reports(obj: Dict[str, Dict]) -> None:
     ensure_students_dir()
-    tmp = str(STU_REPORTS_PATH) + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, STU_REPORTS_PATH)
+    write_json(STU_REPORTS_PATH, obj, store="student_reports")
 
 
 # ====== Reports helpers ======
@@ -507,53 +610,78 @@ def _guess_category_from_name(name: str) -> str:
         return REPORT_CATEGORIES[2]
     return REPORT_CATEGORIES[0]
 
-def _load_reports_index() -> Dict[str, Dict]:
-    ensure_reports_dir()
+@STORE_IO.time(store="reports_index", op="read")
+def _load_reports_index(shared: bool = False) -> Dict[str, Dict]:
     try:
-        with open(REPORTS_INDEX, "r", encoding="utf-8") as f:
-            return json.load(f)
+        obj = read_json(REPORTS_INDEX, None, store="reports_index", shared=shared)
+        if obj is None:
+            ensure_reports_dir()
+            obj = read_json(REPORTS_INDEX, {"reports": {}}, store="reports_index", shared=shared)
+        return obj
     except Exception:
         return {"reports": {}}
 
+@STORE_IO.time(store="reports_index", op="write")
 def _save_reports_index(obj: Dict):
-    tmp = str(REPORTS_INDEX) + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, REPORTS_INDEX)
+    write_json(REPORTS_INDEX, obj, store="reports_index")
+
+def _mtime_iso(stat: os.stat_result) -> str:
+    return datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds") + "Z"
 
 def _rebuild_reports_index() -> Dict[str, Dict]:
-    idx = _load_reports_index()
-    existing = idx.get("reports", {})
-    seen_ids = set()
+    """
+    Sync the index with the PDFs in REPORTS_DIR; returns it shared (read-only).
+    Only new or changed PDFs (by size and mtime) are hashed, outside the writer lock.
+    When nothing changed, which is the usual GET, that is a stat per file and no lock.
+    """
+    current = _load_reports_index(shared=True)
+    recorded = current.get("reports", {})
+    known = {m.get("filename"): m for rid, m in recorded.items() if rid == str(m.get("sha256", ""))[:16]}
+    files, fresh = [], True
     for p in REPORTS_DIR.glob("*.pdf"):
         stat = p.stat()
-        sha = _sha256_file(p)
-        rid = sha[:16]
-        seen_ids.add(rid)
-        meta = existing.get(rid) or {}
-        title = meta.get("title") or p.stem
-        category = meta.get("category") or _guess_category_from_name(p.name)
-        tags = meta.get("tags") or []
-        students = meta.get("students") or []  # <— NEW: preserve previously stored names
-        existing[rid] = {
-            "id": rid,
-            "filename": p.name,
-            "title": title,
-            "size": stat.st_size,
-            "sha256": sha,
-            "generated_at": datetime.fromtimestamp(stat.st_mtime).isoformat(timespec="seconds") + "Z",
-            "category": category,
-            "tags": tags,
-            "students": students,  # <— NEW
-        }
-
-    # remove stale
-    stale = [rid for rid, m in existing.items() if not (REPORTS_DIR / m["filename"]).exists()]
-    for rid in stale:
-        existing.pop(rid, None)
-    idx["reports"] = existing
-    _save_reports_index(idx)
-    return idx
+        meta = known.get(p.name)
+        if meta and meta.get("size") == stat.st_size and meta.get("generated_at") == _mtime_iso(stat):
+            files.append((p, stat, meta["sha256"]))
+        else:
+            files.append((p, stat, _sha256_file(p)))
+            fresh = False
+    on_disk = {p.name for p, _, _ in files}
+    if fresh and all(m.get("filename") in on_disk for m in recorded.values()):
+        return current
+    with transaction():
+        idx = _load_reports_index()
+        existing = idx.get("reports", {})
+        before = dict(existing)
+        for p, stat, sha in files:
+            rid = sha[:16]
+            meta = existing.get(rid) or {}
+            title = meta.get("title") or p.stem
+            category = meta.get("category") or _guess_category_from_name(p.name)
+            tags = meta.get("tags") or []
+            students = meta.get("students") or []  # <— NEW: preserve previously stored names
+            existing[rid] = {
+                "id": rid,
+                "filename": p.name,
+                "title": title,
+                "size": stat.st_size,
+                "sha256": sha,
+                "generated_at": _mtime_iso(stat),
+                "category": category,
+                "tags": tags,
+                "students": students,  # <— NEW
+            }
+            if "_rev" in meta:
+                existing[rid]["_rev"] = meta["_rev"]
+
+        # remove stale
+        stale = [rid for rid, m in existing.items() if not (REPORTS_DIR / m["filename"]).exists()]
+        for rid in stale:
+            existing.pop(rid, None)
+        idx["reports"] = existing
+        if existing != before:
+            _save_reports_index(idx)
+    return _load_reports_index(shared=True)
 
 # ====== Robust PDF writer for alignment reports (ReportLab if available, else text-PDF) ======
 
@@ -772,19 +900,20 @@ def _create_pdf_report(
     os.replace(tmp_path, final_path)
 
     # try to reuse parsed students if available, else empty list
-    idx = _load_reports_index()
-    idx.setdefault("reports", {})[rid] = {
-        "id": rid,
-        "filename": final_name,
-        "title": title,
-        "size": final_path.stat().st_size,
-        "sha256": sha,
-        "generated_at": datetime.fromtimestamp(final_path.stat().st_mtime).isoformat(timespec="seconds") + "Z",
-        "category": category,
-        "tags": list(tags or []),
-        "students": students if 'students' in locals() else [],  # <— NEW
-    }
-    _save_reports_index(idx)
+    with transaction():
+        idx = _load_reports_index()
+        idx.setdefault("reports", {})[rid] = {
+            "id": rid,
+            "filename": final_name,
+            "title": title,
+            "size": final_path.stat().st_size,
+            "sha256": sha,
+            "generated_at": datetime.fromtimestamp(final_path.stat().st_mtime).isoformat(timespec="seconds") + "Z",
+            "category": category,
+            "tags": list(tags or []),
+            "students": students if 'students' in locals() else [],  # <— NEW
+        }
+        _save_reports_index(idx)
     logger.info(f"Report PDF created: {final_name} (category={category})")
     return {"id": rid, "filename": final_name}
 
@@ -798,19 +927,20 @@ def create_jwt(user_id: int, email: str) -> str:
     payload = {"sub": str(user_id), "email": email, "iat": int(time.time())}
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALG)
 
-def verify_jwt(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
+def decode_jwt(token: str) -> Dict:
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
-        return payload
+        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])
     except Exception as e:
         logger.warning(f"Invalid JWT: {str(e)}")
         raise HTTPException(status_code=401, detail="Invalid token")
+
+def verify_jwt(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return decode_jwt(credentials.credentials)
     
 
 
 @app.get("/align/history")
-async def align_history(course: str, unit: str, resource: str, user=Depends(verify_jwt)):
+async def align_history(course: str, resource: str, unit: Optional[str] = Query(None), user=Depends(verify_jwt)):
     """
     Returns last alignment summary for a specific worksheet:
     {
@@ -818,14 +948,89 @@ async def align_history(course: str, unit: str, resource: str, user=Depends(veri
       "consensus": [bullet lines],
       "evidence": "short string"
     }
+    unit is optional: with it, only runs that covered that unit count (a file name
+    can repeat across units of a course).
     """
-    key = f"{course}|{unit}|{_normalize_fname(resource)}"
-    hist = _load_align_history()
-    rec = hist.get(key)
+    rec = await run_in_threadpool(_latest_worksheet_summary, course, unit, _normalize_fname(resource))
     if not rec:
         raise HTTPException(status_code=404, detail="No history")
     return rec
 
+def _latest_worksheet_summary(course: str, unit: Optional[str], fname: str) -> Optional[Dict]:
+    key = f"worksheet:{course}/{fname}"
+    snaps = HISTORY.query(key, limit=1)
+    if snaps and unit and unit not in (snaps[0].get("units") or [unit]):
+        snaps = [s for s in HISTORY.query(key, limit=50) if unit in (s.get("units") or [unit])][-1:]
+    if snaps:
+        return {k: snaps[0].get(k) for k in ("affected", "consensus", "evidence")}
+    # runs from before the append-only history
+    legacy = _load_align_history()
+    if unit:
+        return legacy.get(f"{course}|{unit}|{fname}")
+    return next((v for k, v in legacy.items() if k.startswith(f"{course}|") and k.endswith(f"|{fname}")), None)
+
+
+HISTORY_KINDS = ("student", "course", "worksheet", "cc")
+
+def _history_key(kind: str, id: str, course: Optional[str]) -> str:
+    """student (optionally within a course), course, worksheet or cc (id = subject; course required)."""
+    if kind not in HISTORY_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind must be one of {', '.join(HISTORY_KINDS)}")
+    if kind == "student":
+        return f"student:{id}@{course}" if course else f"student:{id}"
+    if kind == "course":
+        return f"course:{id}"
+    if not course:
+        raise HTTPException(status_code=400, detail=f"{kind} history needs a course")
+    if kind == "cc":
+        return f"cc:{course}/{id}"
+    return f"worksheet:{course}/{_normalize_fname(id)}"
+
+
+@app.get("/align/history/series")
+async def align_history_series(
+    kind: str,
+    id: str,
+    course: Optional[str] = Query(None),
+    since: Optional[str] = Query(None, description="ISO timestamp or epoch seconds"),
+    until: Optional[str] = Query(None, description="ISO timestamp or epoch seconds"),
+    bucket: Optional[str] = Query(None, description="hour | day | week, or seconds (default: span / points)"),
+    points: int = Query(60, ge=1, le=1000),
+    user=Depends(verify_jwt),
+):
+    """
+    Progress-over-term chart data: downsampled means of overall + the four metrics.
+    { "key", "count", "points": [{ts, at, n, overall, understanding, ..., overall_min, overall_max}] }
+    """
+    key = _history_key(kind, id, course)
+    sizes = {"hour": 3600, "day": 86400, "week": 7 * 86400}
+    try:
+        bucket_s = sizes[bucket] if bucket in sizes else (float(bucket) if bucket else None)
+        series = await run_in_threadpool(HISTORY.trend, key, since, until, bucket_s, points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time filter or bucket: {e}")
+    count = await run_in_threadpool(HISTORY.count, key)
+    return {"key": key, "count": count, "points": series}
+
+
+@app.get("/align/history/snapshots")
+async def align_history_snapshots(
+    kind: str,
+    id: str,
+    course: Optional[str] = Query(None),
+    since: Optional[str] = Query(None, description="ISO timestamp or epoch seconds"),
+    until: Optional[str] = Query(None, description="ISO timestamp or epoch seconds"),
+    limit: int = Query(100, ge=1, le=2000),
+    user=Depends(verify_jwt),
+):
+    """Raw snapshots in [since, until], oldest first (the newest `limit`)."""
+    key = _history_key(kind, id, course)
+    try:
+        snaps = await run_in_threadpool(HISTORY.query, key, since, until, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time filter: {e}")
+    return {"key": key, "snapshots": snaps}
+
 
 # ============================================================
 # ======================= MIDDLEWARE =========================
@@ -842,9 +1047,185 @@ app.add_middleware(
     ],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Total-Count", "X-Next-Cursor"],
     allow_credentials=True,
 )
 
+class _RequestMetricsMiddleware:
+    """
+    Request count + latency per route. Plain ASGI rather than @app.middleware("http"):
+    BaseHTTPMiddleware hides client disconnects from request.is_disconnected(), which
+    alignment cancellation relies on.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            # label by route template ("/students/{sid}") so cardinality stays bounded
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUESTS.inc(method=scope["method"], route=route, status=str(status))
+            HTTP_LATENCY.observe(time.perf_counter() - t0, method=scope["method"], route=route)
+
+app.add_middleware(_RequestMetricsMiddleware)
+
+# ============================================================
+# ========================= METRICS ==========================
+# ============================================================
+
+# /metrics is meant for a local Prometheus scraper; set METRICS_ALLOW_REMOTE=1 to expose it.
+METRICS_ALLOW_REMOTE = os.environ.get("METRICS_ALLOW_REMOTE", "0") == "1"
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    client = request.client.host if request.client else ""
+    if not METRICS_ALLOW_REMOTE and client not in ("127.0.0.1", "::1", "localhost"):
+        raise HTTPException(status_code=403, detail="Metrics are only served to local clients")
+    return Response(content=METRICS.render(), media_type=METRICS_CONTENT_TYPE)
+
+@contextmanager
+def _track_alignment(kind: str):
+    """In-flight gauge + duration histogram around one alignment run."""
+    ALIGN_IN_FLIGHT.inc(kind=kind)
+    t0 = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        ALIGN_IN_FLIGHT.dec(kind=kind)
+        ALIGN_DURATION.observe(time.perf_counter() - t0, kind=kind, outcome=outcome)
+
+# Wall-clock budget for one alignment request (0 = none); pairs not started by then are dropped.
+ALIGN_DEADLINE_S = float(os.environ.get("ALIGN_DEADLINE_S", "900"))
+
+async def _run_pipeline(kind: str, token: CancelToken, fn, **kwargs):
+    """Blocking pipeline call off the event loop, tracked and cancellable via token."""
+    with _track_alignment(kind):
+        return await run_in_threadpool(fn, cancel=token, **kwargs)
+
+
+class _AlignFlight:
+    """One in-flight alignment run and the requests waiting on it."""
+
+    def __init__(self, task: "asyncio.Task", token: CancelToken):
+        self.task = task
+        self.token = token
+        self.waiters = 0
+
+
+# selection fingerprint -> in-flight run (see _coalesced)
+_ALIGN_FLIGHTS: Dict[str, _AlignFlight] = {}
+
+def _selection_files(selection: Dict[str, List[str]]) -> List[Path]:
+    return [
+        p
+        for course, units in sorted(selection.items())
+        for unit in sorted(set(units))
+        for p in sorted((CUR_DIR / course / unit).rglob("*"))
+        if p.is_file()
+    ]
+
+# Runs of at most this many pairs (students x worksheets) are "interactive" and are served
+# ahead of bulk rollups in the LLM queue; larger ones are "batch".
+ALIGN_INTERACTIVE_MAX_PAIRS = int(os.environ.get("ALIGN_INTERACTIVE_MAX_PAIRS", "40"))
+WORKSHEET_SUFFIXES = {".pdf", ".txt"}  # what collect_worksheets_texts reads
+
+def _alignment_job(user: Dict, selection: Dict[str, List[str]], n_students: int) -> Job:
+    """Scheduling identity for one alignment run: priority class by size, fair share per user."""
+    n_worksheets = sum(1 for p in _selection_files(selection) if p.suffix.lower() in WORKSHEET_SUFFIXES)
+    pairs = n_students * n_worksheets
+    priority = "interactive" if pairs <= ALIGN_INTERACTIVE_MAX_PAIRS else "batch"
+    return Job(priority=priority, user=str(user.get("email") or user.get("sub") or "-"))
+
+def _alignment_key(kind: str, selection: Dict[str, List[str]], student_names: List[str],
+                   scores_only: bool, student_files: List[Path]) -> str:
+    """
+    Fingerprint of an alignment request: normalized selection (courses, sorted units,
+    sorted students) plus a content hash of every worksheet and IEP file it reads, so
+    an edited file never joins a run that started on the old version.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        "kind": kind,
+        "selection": {c: sorted(set(u)) for c, u in selection.items()},
+        "students": sorted(set(student_names)),
+        "scores_only": bool(scores_only),
+    }, sort_keys=True).encode("utf-8"))
+    for p in _selection_files(selection) + sorted(set(student_files)):
+        h.update(str(p).encode("utf-8") + b"\0")
+        try:
+            h.update(hashlib.sha256(p.read_bytes()).digest())
+        except OSError:
+            h.update(b"missing")
+    return h.hexdigest()
+
+async def _coalesced(request: Request, key: str, kind: str, work):
+    """
+    Run `await work(token)` once per key: identical requests that arrive while it runs
+    attach to the same task instead of scoring the matrix again. The run is cancelled
+    only when every attached client has disconnected, or when ALIGN_DEADLINE_S passes.
+    request=None (startup resume) waits without a client to watch.
+    Failures map to HTTP errors: Cancelled -> 499/504, LLM backend down -> 503, else 500.
+    """
+    flight = _ALIGN_FLIGHTS.get(key)
+    if flight is None or flight.token.cancelled:
+        token = CancelToken(deadline_s=ALIGN_DEADLINE_S or None)
+        flight = _AlignFlight(asyncio.ensure_future(work(token)), token)
+        _ALIGN_FLIGHTS[key] = flight
+
+        def _done(task, flight=flight):
+            if _ALIGN_FLIGHTS.get(key) is flight:
+                del _ALIGN_FLIGHTS[key]
+            exc = None if task.cancelled() else task.exception()  # also marks it retrieved
+            if isinstance(exc, Cancelled):
+                ALIGN_CANCELLED.inc(kind=kind, reason=exc.reason)
+                logger.info(f"Alignment {kind} stopped: {exc.reason}")
+
+        flight.task.add_done_callback(_done)
+    else:
+        ALIGN_COALESCED.inc(scope="request")
+        logger.info(f"Alignment {kind}: joined in-flight run ({flight.waiters} already waiting)")
+
+    flight.waiters += 1
+    try:
+        while not flight.task.done():
+            await asyncio.wait({flight.task}, timeout=0.5)
+            if request is not None and not flight.task.done() and await request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client closed request")
+        return flight.task.result()
+    except HTTPException:
+        raise
+    except Cancelled as e:
+        if e.reason == "deadline exceeded":
+            raise HTTPException(status_code=504, detail=f"Alignment exceeded {ALIGN_DEADLINE_S:.0f}s")
+        raise HTTPException(status_code=499, detail="Client closed request")
+    except LLM_UNAVAILABLE as e:
+        logger.warning(f"Alignment {kind}: LLM backend unavailable: {e}")
+        raise HTTPException(status_code=503, detail=f"LLM backend unavailable: {e}")
+    except Exception as e:
+        logger.exception(f"Alignment {kind} pipeline failed")
+        raise HTTPException(status_code=500, detail=f"Pipeline error: {e}")
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            # nobody is waiting for this result any more
+            flight.token.cancel("client disconnected")
+
 # ============================================================
 # ====================== STARTUP HOOK ========================
 # ============================================================
@@ -852,11 +1233,76 @@ app.add_middleware(
 @app.on_event("startup")
 def _startup():
     DATA_DIR.mkdir(parents=True, exist_ok=True)
+    recovered = JSON_STORE.recover()
+    if recovered:
+        logger.warning(f"Finished {recovered} interrupted store commit(s)")
     ensure_users_dir()
     ensure_students_dir()
     ensure_library()
     ensure_reports_dir()
     init_user_db()
+    if LLM_WARMUP:
+        # load + pin the models in the background so the first alignment skips the cold load
+        MODEL_MANAGER.start()
+
+
+async def _resume_checkpointed_runs():
+    """
+    Re-run alignments that died mid-way (crash, restart, --reload) through the normal
+    handlers, one at a time: scored pairs come from the checkpoint, only the rest hit
+    the LLM. A client re-submitting the same selection meanwhile joins the resumed run.
+    """
+    handlers = {
+        "iep-selected": (IEPAlignRequest, align_iep_selected),
+        "course-selected": (CourseAlignRequest, align_course_selected),
+    }
+    for meta in align_checkpoint.pending(CHECKPOINT_DIR, ALIGN_CHECKPOINT_TTL_H * 3600):
+        model, handler = handlers.get(meta.get("kind"), (None, None))
+        if handler is None or not (meta.get("user") or {}).get("sub"):
+            continue
+        logger.info(f"Resuming alignment {meta['kind']} {meta['run_id']} ({meta['pairs_done']} pairs checkpointed)")
+        try:
+            await handler(model(**meta.get("payload") or {}), None, meta["user"])
+        except HTTPException as e:
+            logger.warning(f"Resumed alignment {meta['run_id']} failed: {e.status_code} {e.detail}")
+        except Exception:
+            logger.exception(f"Resumed alignment {meta['run_id']} failed")
+
+
+@app.on_event("startup")
+async def _startup_resume():
+    if ALIGN_RESUME_ON_STARTUP:
+        asyncio.get_running_loop().create_task(_resume_checkpointed_runs())
+
+
+@app.on_event("shutdown")
+def _shutdown():
+    MODEL_MANAGER.stop()
+    for job in list(_CC_ACTIVE.values()):
+        job.token.cancel("server shutdown")
+    for job in list(_INGEST_JOBS.values()):
+        if not job.finished:
+            job.token.cancel("server shutdown")
+    for sess in list(_CHAT_SESSIONS.values()):
+        if sess.cancel is not None:
+            sess.cancel.cancel("server shutdown")
+
+
+@app.get("/health")
+async def health():
+    """
+    Liveness + model readiness (no auth; meant for probes).
+    200 when at least one LLM host has every configured model warm, else 503.
+    """
+    ready = MODEL_MANAGER.ready()
+    body = {
+        "status": "ok" if ready else ("disabled" if not LLM_WARMUP else "degraded"),
+        "warmup": LLM_WARMUP,
+        "models": MODEL_MANAGER.status(),   # {host: {model: state}}
+        "pool": LLM_POOL.status(),
+        "breaker": LLM_BREAKER.status(),
+    }
+    return JSONResponse(body, status_code=200 if ready or not LLM_WARMUP else 503)
 
 # ============================================================
 # ======================= AUTH ROUTES ========================
@@ -979,12 +1425,37 @@ async def is_new(user=Depends(verify_jwt)):
 # ===================== LIBRARY ROUTES =======================
 # ============================================================
 
+DOC_LIST = ListIndex(
+    "library",
+    fields=list(DocMeta.model_fields),
+    sorts={
+        "recent": lambda d: d["uploaded_at"],
+        "title": lambda d: d["title"].lower(),
+        "size": lambda d: d["size"],
+    },
+    facets={"tag": lambda d: d["tags"], "source": lambda d: d["source"]},
+)
+
 @app.get("/library", response_model=List[DocMeta])
-async def list_documents(user=Depends(verify_jwt)):
-    data = _load_index()
-    docs = [DocMeta(**m) for m in data.get("docs", {}).values()]
-    docs.sort(key=lambda d: d.uploaded_at, reverse=True)
-    return docs
+async def list_documents(
+    response: Response,
+    user=Depends(verify_jwt),
+    sort: str = Query("recent", pattern="^(recent|title|size)$"),
+    order: Optional[str] = Query(None, pattern="^(asc|desc)$"),
+    tag: Optional[str] = Query(None),
+    source: Optional[str] = Query(None),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="comma-separated, e.g. id,title"),
+):
+    """Newest first by default. limit= pages (X-Next-Cursor -> cursor=); X-Total-Count counts all matches."""
+    data = _load_index(shared=True)
+    DOC_LIST.sync(data.get("docs", {}).items(), lambda _, m: DocMeta(**m).model_dump())
+    page = _query_list(
+        DOC_LIST, sort, order, "asc" if sort == "title" else "desc",
+        filters={"tag": tag, "source": source}, limit=limit, cursor=cursor, fields=parse_fields(fields),
+    )
+    return _list_response(page, response)
 
 @app.post("/library/upload", response_model=DocMeta)
 async def upload_document(
@@ -1002,44 +1473,53 @@ async def upload_document(
     sha256 = hashlib.sha256(content).hexdigest()
     doc_id = sha256[:16]
 
+    safe_name = _safe_filename(file.filename)
+    meta, created = await run_in_threadpool(_store_document, content, doc_id, safe_name, sha256, title, tags)
+    if created:
+        logger.info(f"Uploaded doc {meta['filename']} ({size} bytes) by {user['email']}")
+    return DocMeta(**meta)
+
+@transaction()
+def _store_document(content: bytes, doc_id: str, safe_name: str, sha256: str,
+                    title: Optional[str], tags: Optional[str]) -> Tuple[Dict, bool]:
+    """Write the PDF and its index entry; an already indexed doc_id is returned as is."""
     data = _load_index()
     docs = data.setdefault("docs", {})
     if doc_id in docs:
-        return DocMeta(**docs[doc_id])
+        return docs[doc_id], False
 
-    safe_name = _safe_filename(file.filename)
     stored_name = f"{doc_id}-{safe_name}"
-    stored_path = LIB_DIR / stored_name
-    with open(stored_path, "wb") as f:
+    with open(LIB_DIR / stored_name, "wb") as f:
         f.write(content)
 
     meta = DocMeta(
         id=doc_id,
         filename=stored_name,
         title=title or os.path.splitext(safe_name)[0],
-        size=size,
+        size=len(content),
         sha256=sha256,
         uploaded_at=_now_iso(),
         tags=[t.strip() for t in tags.split(",")] if tags else [],
         source="upload",
     ).model_dump()
+    meta["_rev"] = 1
 
     docs[doc_id] = meta
     _save_index(data)
-    logger.info(f"Uploaded doc {stored_name} ({size} bytes) by {user['email']}")
-    return DocMeta(**meta)
+    return meta, True
 
 @app.get("/library/{doc_id}", response_model=DocMeta)
-async def get_document(doc_id: str = FPath(..., min_length=6, max_length=64), user=Depends(verify_jwt)):
-    data = _load_index()
+async def get_document(response: Response, doc_id: str = FPath(..., min_length=6, max_length=64), user=Depends(verify_jwt)):
+    data = _load_index(shared=True)
     meta = data.get("docs", {}).get(doc_id)
     if not meta:
         raise HTTPException(status_code=404, detail="Not found")
+    _etag(response, meta)
     return DocMeta(**meta)
 
 @app.get("/library/{doc_id}/file")
 async def download_document(doc_id: str = FPath(..., min_length=6, max_length=64), user=Depends(verify_jwt)):
-    data = _load_index()
+    data = _load_index(shared=True)
     meta = data.get("docs", {}).get(doc_id)
     if not meta:
         raise HTTPException(status_code=404, detail="Not found")
@@ -1049,87 +1529,143 @@ async def download_document(doc_id: str = FPath(..., min_length=6, max_length=64
     return FileResponse(str(path), media_type="application/pdf", filename=meta["filename"])
 
 @app.put("/library/{doc_id}", response_model=DocMeta)
-async def update_document(payload: DocMetaUpdate, doc_id: str = FPath(..., min_length=6, max_length=64), user=Depends(verify_jwt)):
+async def update_document(
+    payload: DocMetaUpdate,
+    request: Request,
+    response: Response,
+    doc_id: str = FPath(..., min_length=6, max_length=64),
+    user=Depends(verify_jwt),
+):
+    """If-Match: <ETag from GET> makes the update fail with 409 if someone changed the doc since."""
+    expected = _if_match(request)
+    meta = await run_in_threadpool(_update_document_meta, doc_id, payload, expected)
+    _etag(response, meta)
+    return DocMeta(**meta)
+
+@transaction()
+def _update_document_meta(doc_id: str, payload: DocMetaUpdate, expected: Optional[int]) -> Dict:
     data = _load_index()
     docs = data.get("docs", {})
     meta = docs.get(doc_id)
     if not meta:
         raise HTTPException(status_code=404, detail="Not found")
+    check_rev(meta, expected, "Document")
 
     if payload.title is not None:
         meta["title"] = payload.title.strip() or meta["title"]
     if payload.tags is not None:
         meta["tags"] = [t.strip() for t in payload.tags if t.strip()]
 
+    bump_rev(meta)
     docs[doc_id] = meta
     _save_index(data)
-    return DocMeta(**meta)
+    return meta
 
 @app.delete("/library/{doc_id}")
 async def delete_document(doc_id: str = FPath(..., min_length=6, max_length=64), user=Depends(verify_jwt)):
-    data = _load_index()
-    docs = data.get("docs", {})
-    meta = docs.get(doc_id)
-    if not meta:
-        raise HTTPException(status_code=404, detail="Not found")
+    await run_in_threadpool(_delete_document, doc_id)
+    logger.info(f"Deleted doc {doc_id} by {user['email']}")
+    return {"ok": True}
 
-    path = LIB_DIR / meta["filename"]
-    try:
-        if path.exists():
-            path.unlink()
-    finally:
+def _delete_document(doc_id: str) -> None:
+    with transaction():
+        data = _load_index()
+        docs = data.get("docs", {})
+        meta = docs.get(doc_id)
+        if not meta:
+            raise HTTPException(status_code=404, detail="Not found")
         docs.pop(doc_id, None)
         _save_index(data)
-    logger.info(f"Deleted doc {doc_id} by {user['email']}")
-    return {"ok": True}
+
+    path = LIB_DIR / meta["filename"]
+    if path.exists():
+        path.unlink()
 
 # ============================================================
 # ====================== REPORTS ROUTES ======================
 # ============================================================
 
+def _report_row(rid: str, m: Dict) -> Dict:
+    # snapshot entries carry uploaded_at instead of generated_at
+    rec = {**m, "id": m.get("id") or rid, "generated_at": m.get("generated_at") or m.get("uploaded_at") or ""}
+    return ReportMeta(**rec).model_dump()
+
+REPORT_LIST = ListIndex(
+    "reports",
+    fields=list(ReportMeta.model_fields),
+    sorts={
+        "recent": lambda r: r["generated_at"],
+        "title": lambda r: r["title"].lower(),
+        "size": lambda r: r["size"],
+    },
+    facets={
+        "category": lambda r: r["category"],
+        "tag": lambda r: r["tags"],
+        "course": lambda r: r["course"],
+        "student": lambda r: r["students"],
+    },
+)
+
 @app.get("/reports", response_model=List[ReportMeta])
 async def list_reports(
+    response: Response,
     user=Depends(verify_jwt),
     category: Optional[str] = Query(None),
+    tag: Optional[str] = Query(None),
+    course: Optional[str] = Query(None),
+    student: Optional[str] = Query(None),
     sort: str = Query("recent", pattern="^(recent|title|size)$"),
+    order: Optional[str] = Query(None, pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="comma-separated, e.g. id,title"),
 ):
-    idx = _rebuild_reports_index()
-    items = [ReportMeta(**m) for m in idx.get("reports", {}).values()]
-    if category:
-        items = [r for r in items if r.category == category]
-    if sort == "recent":
-        items.sort(key=lambda r: r.generated_at, reverse=True)
-    elif sort == "title":
-        items.sort(key=lambda r: r.title.lower())
-    elif sort == "size":
-        items.sort(key=lambda r: r.size, reverse=True)
-    return items
+    """recent/size sort descending and title ascending unless order= says otherwise; paging as /library."""
+    idx = await run_in_threadpool(_rebuild_reports_index)
+    REPORT_LIST.sync(idx.get("reports", {}).items(), _report_row)
+    page = _query_list(
+        REPORT_LIST, sort, order, "asc" if sort == "title" else "desc",
+        filters={"category": category, "tag": tag, "course": course, "student": student},
+        limit=limit, cursor=cursor, fields=parse_fields(fields),
+    )
+    return _list_response(page, response)
 
 @app.get("/reports/categories")
 async def list_report_categories(user=Depends(verify_jwt)):
     return {"categories": REPORT_CATEGORIES}
 
 @app.put("/reports/{rid}", response_model=ReportMeta)
-async def update_report(rid: str, payload: ReportUpdate, user=Depends(verify_jwt)):
-    idx = _rebuild_reports_index()
-    rep = idx.get("reports", {}).get(rid)
-    if not rep:
-        raise HTTPException(status_code=404, detail="Not found")
-    if payload.title is not None:
-        rep["title"] = payload.title.strip() or rep["title"]
-    if payload.category is not None:
-        if payload.category not in REPORT_CATEGORIES:
-            raise HTTPException(status_code=400, detail="Invalid category")
-        rep["category"] = payload.category
-    if payload.tags is not None:
-        rep["tags"] = [t.strip() for t in payload.tags if t.strip()]
-    idx["reports"][rid] = rep
-    _save_reports_index(idx)
-    return ReportMeta(**rep)
+async def update_report(rid: str, payload: ReportUpdate, request: Request, response: Response, user=Depends(verify_jwt)):
+    """If-Match: <ETag from a previous PUT, or "0"> turns a concurrent edit into 409."""
+    expected = _if_match(request)
+    rep = await run_in_threadpool(_update_report_meta, rid, payload, expected)
+    _etag(response, rep)
+    return ReportMeta(**_report_row(rid, rep))
+
+def _update_report_meta(rid: str, payload: ReportUpdate, expected: Optional[int]) -> Dict:
+    _rebuild_reports_index()  # hashes new PDFs without holding the writer lock
+    with transaction():
+        idx = _load_reports_index()
+        rep = idx.get("reports", {}).get(rid)
+        if not rep:
+            raise HTTPException(status_code=404, detail="Not found")
+        check_rev(rep, expected, "Report")
+        if payload.title is not None:
+            rep["title"] = payload.title.strip() or rep["title"]
+        if payload.category is not None:
+            if payload.category not in REPORT_CATEGORIES:
+                raise HTTPException(status_code=400, detail="Invalid category")
+            rep["category"] = payload.category
+        if payload.tags is not None:
+            rep["tags"] = [t.strip() for t in payload.tags if t.strip()]
+        bump_rev(rep)
+        idx["reports"][rid] = rep
+        _save_reports_index(idx)
+    return rep
 
 @app.get("/reports/{rid}/file")
 async def download_report(rid: str, user=Depends(verify_jwt)):
-    idx = _rebuild_reports_index()
+    idx = await run_in_threadpool(_rebuild_reports_index)
     rep = idx.get("reports", {}).get(rid)
     if not rep:
         raise HTTPException(status_code=404, detail="Not found")
@@ -1142,33 +1678,92 @@ async def download_report(rid: str, user=Depends(verify_jwt)):
 # ===================== STUDENTS ROUTES ======================
 # ============================================================
 
+def _grade_key(grade: Optional[str]) -> Tuple[int, Any]:
+    g = str(grade or "").strip()
+    digits = "".join(ch for ch in g if ch.isdigit())
+    if digits:
+        return (0, int(digits))
+    return (1, g.lower())  # "K", unknown and missing grades after the numbered ones
+
+STUDENT_LIST = ListIndex(
+    "students",
+    fields=list(StudentSummary.model_fields),
+    sorts={
+        "name": lambda s: s["name"].lower(),
+        "grade": lambda s: _grade_key(s["grade"]),
+        "alignment": lambda s: -1 if s["alignment_pct"] is None else s["alignment_pct"],
+    },
+    facets={"badge": lambda s: s["badges"], "grade": lambda s: s["grade"], "teacher": lambda s: s["teacher"]},
+)
+
+def _student_row(sid: str, _sig) -> Optional[Dict]:
+    try:
+        data = read_json(STU_DIR / f"{sid}.json", store="student", shared=True)
+        return _summarize_student(sid, data).model_dump()
+    except Exception as e:
+        logger.warning(f"Skipping student file {sid}.json: {e}")
+        return None
+
 @app.get("/students", response_model=List[StudentSummary])
-async def list_students(user=Depends(verify_jwt)):
-    rows = _scan_students()
-    out = [ _summarize_student(sid, data) for sid, data in rows ]
-    # Sort by name asc
-    out.sort(key=lambda s: s.name.lower())
-    return out
+async def list_students(
+    response: Response,
+    user=Depends(verify_jwt),
+    badge: Optional[str] = Query(None),
+    grade: Optional[str] = Query(None),
+    teacher: Optional[str] = Query(None),
+    alignment_min: Optional[int] = Query(None, ge=0, le=100),
+    alignment_max: Optional[int] = Query(None, ge=0, le=100),
+    sort: str = Query("name", pattern="^(name|grade|alignment)$"),
+    order: Optional[str] = Query(None, pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="comma-separated, e.g. id,name"),
+):
+    """
+    Name order by default (alignment sorts descending). An alignment range leaves out
+    students with no alignment yet. Paging as /library.
+    """
+    STUDENT_LIST.sync(_student_file_sigs(), _student_row)
+    where = None
+    if alignment_min is not None or alignment_max is not None:
+        lo = 0 if alignment_min is None else alignment_min
+        hi = 100 if alignment_max is None else alignment_max
+        where = lambda s: s["alignment_pct"] is not None and lo <= s["alignment_pct"] <= hi
+    page = _query_list(
+        STUDENT_LIST, sort, order, "desc" if sort == "alignment" else "asc",
+        filters={"badge": badge, "grade": grade, "teacher": teacher}, where=where,
+        limit=limit, cursor=cursor, fields=parse_fields(fields),
+    )
+    return _list_response(page, response)
 
 @app.get("/students/{sid}", response_model=StudentFull)
-async def get_student(sid: str, user=Depends(verify_jwt)):
+async def get_student(sid: str, response: Response, user=Depends(verify_jwt)):
     p = _student_file_for_id(sid)
     if not p.exists():
         raise HTTPException(status_code=404, detail="Not found")
-    with open(p, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = read_json(p, {}, store="student", shared=True)
+    _etag(response, data)
     return StudentFull(id=sid, data=data)
 
 @app.put("/students/{sid}", response_model=StudentFull)
-async def update_student(sid: str, payload: StudentUpdate, user=Depends(verify_jwt)):
+async def update_student(sid: str, payload: StudentUpdate, request: Request, response: Response, user=Depends(verify_jwt)):
+    """Deep-merge the patch. If-Match: <ETag from GET> (data._rev) turns a concurrent edit into 409."""
+    expected = _if_match(request)
     p = _student_file_for_id(sid)
     if not p.exists():
         raise HTTPException(status_code=404, detail="Not found")
+    data = await run_in_threadpool(_update_student_file, p, sid, payload, expected)
+    _etag(response, data)
+    logger.info(f"Student {sid} updated by {user['email']}")
+    return StudentFull(id=sid, data=data)
+
+@transaction()
+def _update_student_file(p: Path, sid: str, payload: StudentUpdate, expected: Optional[int]) -> Dict:
     try:
-        with open(p, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        data = read_json(p, {}, store="student")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Corrupt JSON for {sid}: {e}")
+    check_rev(data, expected, "Student")
 
     patch = payload.model_dump(exclude_unset=True)
     # If present, nest values into the file
@@ -1184,13 +1779,9 @@ async def update_student(sid: str, payload: StudentUpdate, user=Depends(verify_j
             data[k] = patch[k]
 
     # Write back atomically
-    tmp = p.with_suffix(".json.tmp")
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, p)
-
-    logger.info(f"Student {sid} updated by {user['email']}")
-    return StudentFull(id=sid, data=data)
+    bump_rev(data)
+    write_json(p, data, store="student")
+    return data
 
 
 # ============================================================
@@ -1227,6 +1818,51 @@ CUR_DIR = DATA_DIR / "curriculum"
 
 CUR_ROOT_INDEX = DATA_DIR / "curriculum" / "index.json"
 ALIGN_HISTORY_PATH = DATA_DIR / "curriculum" / "history.json"
+EXPLANATIONS_PATH = DATA_DIR / "curriculum" / "explanations.json"
+
+# per-pair verdicts + lazily generated explanations (see /align/explain)
+EXPLANATIONS = ExplanationStore(EXPLANATIONS_PATH)
+
+# append-only student / course / worksheet snapshots (see /align/history/*)
+HISTORY = HistoryStore(DATA_DIR / "history")
+
+def _record_history(snapshots: List[Dict]) -> None:
+    """Best-effort: a history write must not fail the run that produced the numbers."""
+    try:
+        HISTORY.append(snapshots)
+    except Exception as e:
+        logger.warning(f"Failed to append alignment history: {e}")
+
+# one JSONL log per running alignment (pipelines/checkpoint.py); removed once persisted
+CHECKPOINT_DIR = DATA_DIR / "checkpoints"
+ALIGN_CHECKPOINT_TTL_H = float(os.environ.get("ALIGN_CHECKPOINT_TTL_H", "48"))
+ALIGN_RESUME_ON_STARTUP = os.environ.get("ALIGN_RESUME_ON_STARTUP", "1").lower() not in ("0", "false", "no")
+
+@contextmanager
+def _checkpointed(kind: str, selection: Dict[str, List[str]], student_names: List[str], payload: BaseModel, user: Dict):
+    """
+    Checkpoint log for one alignment run, keyed by the normalized selection so a
+    re-submission (or the startup resume) picks up the pairs already scored.
+    The caller calls .complete() after persisting; a run that stops early keeps its log,
+    marked with why (cancelled runs are not resumed at startup, failed ones are not either).
+    """
+    rid = align_checkpoint.run_id(kind, selection, student_names, getattr(payload, "scores_only", False))
+    ckpt = CheckpointLog(
+        CHECKPOINT_DIR / f"{rid}.jsonl",
+        meta={"kind": kind, "payload": payload.model_dump(), "user": {k: user.get(k) for k in ("sub", "email")}},
+    )
+    if ckpt.resumed:
+        logger.info(f"Alignment {kind}: resuming checkpoint {rid} ({len(ckpt)} pairs done)")
+    try:
+        yield ckpt
+    except Cancelled as e:
+        ckpt.mark(e.reason)
+        raise
+    except Exception:
+        ckpt.mark("failed")
+        raise
+    finally:
+        ckpt.close()
 
 def _normalize_fname(s: str) -> str:
     # match pipeline keys like "._File.pdf" to actual "File.pdf"
@@ -1235,43 +1871,35 @@ def _normalize_fname(s: str) -> str:
         s = s[2:]
     return s.strip()
 
-def _load_curriculum_root_index() -> Dict:
+@STORE_IO.time(store="curriculum_index", op="read")
+def _load_curriculum_root_index(shared: bool = False) -> Dict:
     try:
-        if CUR_ROOT_INDEX.exists():
-            with open(CUR_ROOT_INDEX, "r", encoding="utf-8") as f:
-                obj = json.load(f)
-            if isinstance(obj, dict) and "courses" in obj:
-                return obj
+        obj = read_json(CUR_ROOT_INDEX, None, store="curriculum_index", shared=shared)
+        if isinstance(obj, dict) and "courses" in obj:
+            return obj
     except Exception as e:
         logger.warning(f"curriculum root index read failed: {e}")
     return {"courses": {}}
 
+@STORE_IO.time(store="curriculum_index", op="write")
 def _save_curriculum_root_index(obj: Dict) -> None:
     CUR_DIR.mkdir(parents=True, exist_ok=True)
-    tmp = str(CUR_ROOT_INDEX) + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, CUR_ROOT_INDEX)
+    write_json(CUR_ROOT_INDEX, obj, store="curriculum_index")
 
+@STORE_IO.time(store="align_history", op="read")
 def _load_align_history() -> Dict[str, Dict]:
-    # key: f"{course}|{unit}|{filename}"
+    # key: f"{course}|{unit}|{filename}"; legacy, written before runs went to HISTORY.
+    # Read-only, so callers get the shared cached object.
     try:
-        if ALIGN_HISTORY_PATH.exists():
-            with open(ALIGN_HISTORY_PATH, "r", encoding="utf-8") as f:
-                obj = json.load(f)
-            if isinstance(obj, dict):
-                return obj
+        obj = read_json(ALIGN_HISTORY_PATH, None, store="align_history", shared=True)
+        if isinstance(obj, dict):
+            return obj
     except Exception as e:
         logger.warning(f"align history read failed: {e}")
     return {}
 
-def _save_align_history(hist: Dict[str, Dict]) -> None:
-    tmp = str(ALIGN_HISTORY_PATH) + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(hist, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, ALIGN_HISTORY_PATH)
-
-def _load_curriculum_analysis() -> Dict:
+@STORE_IO.time(store="align_history", op="read")
+def _load_curriculum_analysis(shared: bool = False) -> Dict:
     """
     Shape:
     { "<course>": { "<unit>": { "<filename>": {
@@ -1279,23 +1907,21 @@ def _load_curriculum_analysis() -> Dict:
          "students": { "<Student Name>": {... per-student detail from pipeline ...} }
     }}}}
     """
-    CUR_DIR.mkdir(parents=True, exist_ok=True)
-    if ALIGN_HISTORY_PATH.exists():
-        try:
-            with open(ALIGN_HISTORY_PATH, "r", encoding="utf-8") as f:
-                j = json.load(f)
-            if isinstance(j, dict):
-                return j
-        except Exception:
-            pass
+    try:
+        j = read_json(ALIGN_HISTORY_PATH, None, store="align_history", shared=shared)
+        if j is None:
+            CUR_DIR.mkdir(parents=True, exist_ok=True)
+        elif isinstance(j, dict):
+            return j
+    except Exception:
+        pass
     return {}
 
+@STORE_IO.time(store="align_history", op="write")
 def _save_curriculum_analysis(obj: Dict) -> None:
-    tmp = str(ALIGN_HISTORY_PATH) + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, ALIGN_HISTORY_PATH)
+    write_json(ALIGN_HISTORY_PATH, obj, store="align_history")
 
+@transaction()
 def _update_index_fit_from_overall(course: str, units: list[str], worksheet_overall: Dict[str, int]) -> None:
     """
     Update data/curriculum/index.json 'fit' for matching filenames.
@@ -1324,6 +1950,7 @@ def _update_index_fit_from_overall(course: str, units: list[str], worksheet_over
     if changed:
         _save_curriculum_index(idx)
 
+@transaction()
 def _persist_analysis_details(course: str, units: list[str], details: Dict[str, Dict[str, Dict]]) -> None:
     """
     Write last-run per-worksheet student details into analysis.json.
@@ -1387,29 +2014,22 @@ def _iso_from_stat(path: Path) -> str:
         return _now_iso()
 
 def _load_order(unit_dir: Path) -> List[str]:
-    order_file = unit_dir / "order.json"
-    if order_file.exists():
-        try:
-            with open(order_file, "r", encoding="utf-8") as f:
-                obj = json.load(f)
-            if isinstance(obj, dict) and "order" in obj and isinstance(obj["order"], list):
-                return [str(x) for x in obj["order"]]
-        except Exception:
-            pass
+    try:
+        obj = read_json(unit_dir / "order.json", None, store="unit_order", shared=True)
+        if isinstance(obj, dict) and "order" in obj and isinstance(obj["order"], list):
+            return [str(x) for x in obj["order"]]
+    except Exception:
+        pass
     return []
 
 def _save_order(unit_dir: Path, filenames: List[str]) -> None:
-    order_file = unit_dir / "order.json"
-    tmp = str(order_file) + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump({"order": filenames}, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, order_file)
+    write_json(unit_dir / "order.json", {"order": filenames}, store="unit_order")
 def _scan_curriculum() -> CurriculumOut:
     """
     If data/curriculum/index.json exists (root index with courses->units->resources), use it.
     Otherwise fall back to scanning folders and per-unit sidecars.
     """
-    root = _load_curriculum_root_index()
+    root = _load_curriculum_root_index(shared=True)
     if root.get("courses"):
         # Normalize into API shape, preserve provided fit/issues exactly
         courses: Dict[str, Dict[str, List[ResourceOut]]] = {}
@@ -1449,12 +2069,10 @@ def _scan_curriculum() -> CurriculumOut:
                      and p.name not in ("index.json", "order.json")]
             unit_index = {}
             idx_path = unit_dir / "index.json"
-            if idx_path.exists():
-                try:
-                    with open(idx_path, "r", encoding="utf-8") as f:
-                        unit_index = json.load(f)
-                except Exception:
-                    unit_index = {}
+            try:
+                unit_index = read_json(idx_path, {}, store="unit_index", shared=True)
+            except Exception:
+                unit_index = {}
             def default_fit(n: str) -> dict:
                 lower = n.lower()
                 mean = 88
@@ -1490,11 +2108,89 @@ def _scan_curriculum() -> CurriculumOut:
 
     return CurriculumOut(courses=courses)
 
+RESOURCE_LIST = ListIndex(
+    "curriculum",
+    fields=list(ResourceOut.model_fields) + ["course", "unit"],
+    sorts={
+        "order": lambda r: r["position"],  # course, unit, then the unit's own order
+        "name": lambda r: r["name"].lower(),
+        "fit": lambda r: int((r["fit"] or {}).get("mean", 0)),
+        "recent": lambda r: r["uploaded_at"],
+    },
+    facets={
+        "course": lambda r: r["course"],
+        "unit": lambda r: r["unit"],
+        "status": lambda r: (r["fit"] or {}).get("status"),
+        "issue": lambda r: r["issues"],
+    },
+)
+
+def _sync_resource_list(root: Dict) -> None:
+    placed: Dict[str, Tuple[str, str, int]] = {}
+    items: List[Tuple[str, Dict]] = []
+    for course, units in (root.get("courses") or {}).items():
+        for unit, resources in (units or {}).items():
+            for rec in resources or []:
+                fname = _normalize_fname(rec.get("filename", ""))
+                path = f"{course}/{unit}/{fname}"
+                placed[path] = (course, unit, len(placed))
+                items.append((path, rec))
+
+    def to_row(path: str, rec: Dict) -> Dict:
+        course, unit, position = placed[path]
+        row = ResourceOut(
+            name=rec.get("name") or Path(path).stem,
+            filename=Path(path).name,
+            path=path,
+            size=int(rec.get("size", 0)),
+            uploaded_at=str(rec.get("uploaded_at") or ""),
+            fit=rec.get("fit") or {"mean": 80, "spread": 15, "status": "warn"},
+            issues=rec.get("issues", []) or [],
+        ).model_dump()
+        row.update(course=course, unit=unit, position=position)
+        return row
+
+    RESOURCE_LIST.sync(items, to_row)
+
 @app.get("/curriculum", response_model=CurriculumOut)
-async def get_curriculum(user=Depends(verify_jwt)):
-    obj = _load_curriculum_root_index()
-    # Coerce to pydantic shape
-    return CurriculumOut(courses=obj.get("courses", {}))
+async def get_curriculum(
+    response: Response,
+    user=Depends(verify_jwt),
+    course: Optional[str] = Query(None),
+    unit: Optional[str] = Query(None),
+    status: Optional[str] = Query(None, pattern="^(good|warn|bad)$"),
+    issue: Optional[str] = Query(None),
+    sort: str = Query("order", pattern="^(order|name|fit|recent)$"),
+    order: Optional[str] = Query(None, pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = Query(None),
+    fields: Optional[str] = Query(None, description="comma-separated resource fields, e.g. path,fit"),
+):
+    """
+    Resources grouped as courses -> units -> list. Filters and paging apply to the
+    resources; a page holds only the units its resources belong to. Without them
+    the response lists every course and unit, empty ones included, as before.
+    """
+    root = _load_curriculum_root_index(shared=True)
+    _sync_resource_list(root)
+    filters = {"course": course, "unit": unit, "status": status, "issue": issue}
+    wanted = parse_fields(fields)
+    page = _query_list(
+        RESOURCE_LIST, sort, order, "desc" if sort in ("fit", "recent") else "asc",
+        filters=filters, limit=limit, cursor=cursor,
+        fields=wanted and list(dict.fromkeys(wanted + ["course", "unit"])),  # grouping needs them
+    )
+    courses: Dict[str, Dict[str, List[Dict]]] = {}
+    if limit is None and cursor is None and not any(filters.values()):
+        for c, units in (root.get("courses") or {}).items():
+            courses[c] = {u: [] for u in (units or {})}
+    for row in page.items:
+        out = {f: row[f] for f in wanted} if wanted else row
+        courses.setdefault(row["course"], {}).setdefault(row["unit"], []).append(out)
+    headers = _page_headers(page, response)
+    if page.fields:
+        return JSONResponse({"courses": courses}, headers=headers)
+    return {"courses": courses}
 
 
 @app.post("/curriculum/{course}/{unit}/reorder")
@@ -1515,7 +2211,7 @@ async def reorder_unit(payload: ReorderIn, course: str, unit: str, user=Depends(
 @app.get("/curriculum/{course}/{unit}/analysis", response_model=AnalysisOut)
 async def analyze_resource(course: str, unit: str, resource: str, user=Depends(verify_jwt)):
     fname = _normalize_fname(resource)
-    store = _load_curriculum_analysis()
+    store = _load_curriculum_analysis(shared=True)
     course_rec = store.get(course, {})
     unit_rec = course_rec.get(unit, {})
     res = unit_rec.get(fname)
@@ -1582,6 +2278,11 @@ async def class_snapshot(payload: SnapshotIn, course: str, unit: str, user=Depen
     Demo: create a placeholder PDF in /data/reports and index it as
     'Class Alignment Snapshot — Today’s Fire Map' for quick access.
     """
+    rid, pdf_file = await run_in_threadpool(_write_snapshot_report, payload, course, unit)
+    logger.info(f"Snapshot report created: {pdf_file.name} for {course}/{unit}")
+    return {"ok": True, "report_id": rid, "filename": pdf_file.name}
+
+def _write_snapshot_report(payload: SnapshotIn, course: str, unit: str) -> Tuple[str, Path]:
     # 1) Make a tiny valid PDF (placeholder)
     REPORTS_DIR = DATA_DIR / "reports"
     REPORTS_DIR.mkdir(parents=True, exist_ok=True)
@@ -1595,35 +2296,28 @@ async def class_snapshot(payload: SnapshotIn, course: str, unit: str, user=Depen
 
     # 2) Update reports index via existing reports system if present
     #    (compatible with earlier /reports design; if missing, silently skip).
-    reports_index = DATA_DIR / "reports" / "index.json"
-    index = {"reports": {}}
-    if reports_index.exists():
+    with transaction():
+        reports_index = DATA_DIR / "reports" / "index.json"
         try:
-            with open(reports_index, "r", encoding="utf-8") as f:
-                index = json.load(f)
+            index = read_json(reports_index, {"reports": {}}, store="reports_index")
         except Exception:
             index = {"reports": {}}
-    # Insert/overwrite entry
-    index["reports"][rid] = {
-        "id": rid,
-        "filename": pdf_file.name,
-        "title": f"Class Alignment Snapshot — {course} / {unit}",
-        "size": pdf_file.stat().st_size,
-        "sha256": hashlib.sha256(pdf_file.read_bytes()).hexdigest(),
-        "uploaded_at": _now_iso(),
-        "category": "Class Alignment Snapshot — Today’s Fire Map",
-        "unit": unit,
-        "course": course,
-        "source": "snapshot",
-        "tags": ["auto", "snapshot"] + [f for f in (payload.resources or [])],
-    }
-    tmp = str(reports_index) + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(index, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, reports_index)
-
-    logger.info(f"Snapshot report created: {pdf_file.name} for {course}/{unit}")
-    return {"ok": True, "report_id": rid, "filename": pdf_file.name}
+        # Insert/overwrite entry
+        index["reports"][rid] = {
+            "id": rid,
+            "filename": pdf_file.name,
+            "title": f"Class Alignment Snapshot — {course} / {unit}",
+            "size": pdf_file.stat().st_size,
+            "sha256": hashlib.sha256(pdf_file.read_bytes()).hexdigest(),
+            "uploaded_at": _now_iso(),
+            "category": "Class Alignment Snapshot — Today’s Fire Map",
+            "unit": unit,
+            "course": course,
+            "source": "snapshot",
+            "tags": ["auto", "snapshot"] + [f for f in (payload.resources or [])],
+        }
+        write_json(reports_index, index, store="reports_index")
+    return rid, pdf_file
 
 @app.get("/curriculum/{course}/{unit}/{filename}")
 async def get_curriculum_resource(course: str, unit: str, filename: str, user=Depends(verify_jwt)):
@@ -1674,9 +2368,7 @@ CURR_DIR      = DATA_DIR / "curriculum"  # /course/unit/resource.pdf
 
 def _load_json_safe(path: Path, default):
     try:
-        if path.exists():
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
+        return read_json(path, default, store="search")
     except Exception as e:
         logger.warning(f"search/_load_json_safe error: {e}")
     return default
@@ -1968,7 +2660,7 @@ async def search_suggest(s: Optional[str] = "", limit: int = 6, user=Depends(ver
 # =================== ALIGNMENT (IEP-SELECTED) ===============
 # ============================================================
 @app.post("/align/iep-selected", response_model=IEPAlignResponse)
-async def align_iep_selected(payload: IEPAlignRequest, user=Depends(verify_jwt)):
+async def align_iep_selected(payload: IEPAlignRequest, request: Request, user=Depends(verify_jwt)):
     """
     Run IEP alignment for an explicit subset and persist:
       - alignment_pct into each student's JSON
@@ -2009,21 +2701,53 @@ async def align_iep_selected(payload: IEPAlignRequest, user=Depends(verify_jwt))
     if not selection:
         raise HTTPException(status_code=400, detail="No matching units found under selected courses")
 
-    # 3) Run pipeline
-    try:
-        result = run_iep_alignment_selected(
-            student_names=student_names,
-            base_students_dir=str(STU_DIR),
-            selection=selection,
-            base_curriculum_dir=str(CUR_DIR),
-        )
-    except Exception as e:
-        logger.exception("Alignment pipeline failed")
-        raise HTTPException(status_code=500, detail=f"Pipeline error: {e}")
+    # 3) Run pipeline + persist, once per identical selection in flight
+    key = await run_in_threadpool(
+        _alignment_key, "iep-selected", selection, student_names, payload.scores_only,
+        [_student_file_for_id(sid) for sid in student_ids],
+    )
+    job = await run_in_threadpool(_alignment_job, user, selection, len(student_names))
+
+    async def _work(token: CancelToken):
+        with _checkpointed("iep-selected", selection, student_names, payload, user) as ckpt:
+            result = await _run_pipeline(
+                "iep-selected",
+                token,
+                run_iep_alignment_selected,
+                student_names=student_names,
+                base_students_dir=str(STU_DIR),
+                selection=selection,
+                base_curriculum_dir=str(CUR_DIR),
+                scores_only=payload.scores_only,
+                explanation_store=EXPLANATIONS,
+                job=job,
+                checkpoint=ckpt,
+            )
+            if not result or not isinstance(result, dict):
+                raise HTTPException(status_code=500, detail="No result from pipeline")
+            if ((result.get("meta") or {}).get("fallback") or {}).get("neutral"):
+                # LLM was down and some pairs had no cached verdict: show, but don't persist
+                # placeholders; the checkpoint keeps the real verdicts for a re-submission
+                logger.warning(f"Alignment returned {result['meta']['fallback']} fallback verdicts; not persisting")
+                ckpt.mark("partial")
+                return result
+            await run_in_threadpool(
+                _persist_iep_selected, result, student_names, student_ids, requested_courses, requested_units
+            )
+            ckpt.complete()
+            return result
+
+    # 7) Return original pipeline result (shared by identical concurrent requests)
+    return await _coalesced(request, key, "iep-selected", _work)
 
-    if not result or not isinstance(result, dict):
-        raise HTTPException(status_code=500, detail="No result from pipeline")
 
+def _persist_iep_selected(result: Dict, student_names: List[str], student_ids: List[str],
+                          requested_courses: List[str], requested_units, pdf: bool = True) -> None:
+    """
+    Steps 4-6 of /align/iep-selected: per-student breakdowns from result.details,
+    alignment_pct + last_alignment into each student JSON, the pie-chart store, and a PDF
+    (pdf=False skips it; precompute.py refreshes the stores without adding reports).
+    """
     # 4) Compute per-student overall and metric breakdowns from result.details
     matrix_obj = result.get("matrix", {}) or {}
     matrix_students: List[str] = list(matrix_obj.get("students", []) or [])
@@ -2068,49 +2792,57 @@ async def align_iep_selected(payload: IEPAlignRequest, user=Depends(verify_jwt))
 
     # 5) Persist: (a) alignment_pct into student JSONs, (b) reports store for pie charts
     name_to_sid = {name: sid for name, sid in zip(student_names, student_ids)}
-    reports_store = _load_student_reports()
-    reports_students = reports_store.setdefault("students", {})
-
-    for s_name, stats in per_student_stats.items():
-        sid = name_to_sid.get(s_name)
-        if not sid:
-            continue
+    # student files and the pie-chart store commit together
+    with transaction():
+        reports_store = _load_student_reports()
+        reports_students = reports_store.setdefault("students", {})
+        snapshots: List[Dict] = []
+
+        for s_name, stats in per_student_stats.items():
+            sid = name_to_sid.get(s_name)
+            if not sid:
+                continue
 
-        # (a) student file
-        p = _student_file_for_id(sid)
-        if p.exists():
-            try:
-                with open(p, "r", encoding="utf-8") as f:
-                    s_json = json.load(f)
-            except Exception as e:
-                logger.warning(f"Could not read student {sid} to update alignment: {e}")
-                s_json = {}
-            s_json["alignment_pct"] = int(stats["overall"])
-            s_json["last_alignment"] = {
+            # (a) student file
+            p = _student_file_for_id(sid)
+            if p.exists():
+                try:
+                    s_json = read_json(p, {}, store="student")
+                except Exception as e:
+                    logger.warning(f"Could not read student {sid} to update alignment: {e}")
+                    s_json = {}
+                s_json["alignment_pct"] = int(stats["overall"])
+                s_json["last_alignment"] = {
+                    "updated_at": _now_iso(),
+                    "overall": int(stats["overall"]),
+                    "metrics": stats["metrics"],
+                    "selection": {"courses": requested_courses, "units": list(requested_units)},
+                }
+                bump_rev(s_json)
+                write_json(p, s_json, store="student")
+
+            # (b) pie-chart store
+            reports_students[sid] = {
                 "updated_at": _now_iso(),
                 "overall": int(stats["overall"]),
-                "metrics": stats["metrics"],
+                "metrics": {
+                    "understanding": int(stats["metrics"]["understanding"]),
+                    "accessibility": int(stats["metrics"]["accessibility"]),
+                    "accommodation": int(stats["metrics"]["accommodation"]),
+                    "engagement":    int(stats["metrics"]["engagement"]),
+                },
                 "selection": {"courses": requested_courses, "units": list(requested_units)},
             }
-            tmp = p.with_suffix(".json.tmp")
-            with open(tmp, "w", encoding="utf-8") as f:
-                json.dump(s_json, f, ensure_ascii=False, indent=2)
-            os.replace(tmp, p)
-
-        # (b) pie-chart store
-        reports_students[sid] = {
-            "updated_at": _now_iso(),
-            "overall": int(stats["overall"]),
-            "metrics": {
-                "understanding": int(stats["metrics"]["understanding"]),
-                "accessibility": int(stats["metrics"]["accessibility"]),
-                "accommodation": int(stats["metrics"]["accommodation"]),
-                "engagement":    int(stats["metrics"]["engagement"]),
-            },
-            "selection": {"courses": requested_courses, "units": list(requested_units)},
-        }
+            snapshots.append({
+                "key": f"student:{sid}",
+                "source": "iep-selected",
+                "overall": int(stats["overall"]),
+                "metrics": reports_students[sid]["metrics"],
+                "selection": {"courses": requested_courses, "units": sorted(requested_units)},
+            })
 
-    _save_student_reports(reports_store)
+        _save_student_reports(reports_store)
+    _record_history(snapshots)
 
     logger.info(
         f"Alignment persisted for {len(per_student_stats)} students; "
@@ -2118,6 +2850,8 @@ async def align_iep_selected(payload: IEPAlignRequest, user=Depends(verify_jwt))
     )
 
     # 6) Emit a minimal PDF into /data/reports and index it
+    if not pdf:
+        return
     try:
         title = f"IEP Alignment — {len(per_student_stats)} students • {', '.join(sorted(requested_courses))}"
         # Use the 'snapshot' category so it groups under your first bucket in UI
@@ -2131,8 +2865,58 @@ async def align_iep_selected(payload: IEPAlignRequest, user=Depends(verify_jwt))
     except Exception as e:
         logger.warning(f"Failed to create IEP-selected PDF: {e}")
 
-    # 7) Return original pipeline result
-    return result
+
+def _find_worksheet(worksheet: str, course: Optional[str], unit: Optional[str]) -> Optional[Path]:
+    """Resolve a pipeline worksheet id / filename to its file under CUR_DIR."""
+    def _segment(part: Optional[str]) -> bool:
+        return not part or not ("/" in part or "\\" in part or part.startswith(".") or any(c in part for c in "*?["))
+
+    fname = _normalize_fname(worksheet)
+    if not fname or not _segment(fname) or not _segment(course) or not _segment(unit):
+        return None
+    if course and unit:
+        p = CUR_DIR / course / unit / fname
+    else:
+        pattern = f"{course}/*/{fname}" if course else f"*/*/{fname}"
+        p = next((p for p in sorted(CUR_DIR.glob(pattern)) if p.is_file()), None)
+    if p is None or not p.is_file() or not p.resolve().is_relative_to(CUR_DIR.resolve()):
+        return None
+    return p
+
+
+@app.get("/align/explain")
+async def align_explain(
+    worksheet: str,
+    student: str,
+    course: Optional[str] = None,
+    unit: Optional[str] = None,
+    user=Depends(verify_jwt),
+):
+    """
+    Explanation for one worksheet x student cell, generated on first open and cached.
+    student may be a name or a student id. Explains the scores of the last run when they
+    were scores-only; returns {worksheet, student, scores, explanation, cached}.
+    """
+    path = _find_worksheet(worksheet, course, unit)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Worksheet not found")
+    student_name = _student_name_from_id(student) or student
+
+    try:
+        out = await run_in_threadpool(
+            explain_iep_alignment, student_name, str(STU_DIR), str(path), EXPLANATIONS,
+            Job(priority="interactive", user=str(user.get("email") or user.get("sub") or "-")),
+        )
+    except LLM_UNAVAILABLE as e:
+        raise HTTPException(status_code=503, detail=f"LLM backend unavailable: {e}")
+    except VerdictParseError as e:
+        raise HTTPException(status_code=502, detail=f"LLM output could not be parsed: {e}")
+    except Exception as e:
+        logger.exception("Explanation generation failed")
+        raise HTTPException(status_code=500, detail=f"Pipeline error: {e}")
+    if out is None:
+        raise HTTPException(status_code=404, detail="Student or worksheet text not found")
+    return out
 
 
 
@@ -2165,9 +2949,10 @@ class CourseAlignRequest(BaseModel):
     course: str
     units: Optional[List[str]] = None          # if None or empty => all units under course
     student_ids: Optional[List[str]] = None    # optional restriction; default is ALL students
+    scores_only: bool = True                   # rollups only need numbers; explanations via /align/explain
 
 @app.post("/align/course-selected", response_model=IEPAlignResponse)
-async def align_course_selected(payload: CourseAlignRequest, user=Depends(verify_jwt)):
+async def align_course_selected(payload: CourseAlignRequest, request: Request, user=Depends(verify_jwt)):
     """
     Evaluate a course's selected units against a student set (default: ALL students).
     Persists a course-level rollup in /data/curriculum/reports.json:
@@ -2208,21 +2993,54 @@ async def align_course_selected(payload: CourseAlignRequest, user=Depends(verify
         if not student_names:
             raise HTTPException(status_code=400, detail="No students found")
 
-    # Run the same selection-based pipeline
-    try:
-        result = run_iep_alignment_selected(
-            student_names=student_names,
-            base_students_dir=str(STU_DIR),
-            selection=selection,
-            base_curriculum_dir=str(CUR_DIR),
-        )
-    except Exception as e:
-        logger.exception("Course alignment pipeline failed")
-        raise HTTPException(status_code=500, detail=f"Pipeline error: {e}")
-
-    if not result or not isinstance(result, dict):
-        raise HTTPException(status_code=500, detail="No result from pipeline")
-
+    # Run the same selection-based pipeline (+ rollup persistence), once per identical
+    # selection in flight: duplicates from other teachers attach to the running one
+    if payload.student_ids:
+        student_files = [_student_file_for_id(sid) for sid in student_ids]
+    else:
+        student_files = [p for p in STU_DIR.glob("*.json") if p.stem.lower() not in {"index", "reports"}]
+    key = await run_in_threadpool(
+        _alignment_key, "course-selected", selection, student_names, payload.scores_only, student_files
+    )
+    job = await run_in_threadpool(_alignment_job, user, selection, len(student_names))
+
+    async def _work(token: CancelToken):
+        with _checkpointed("course-selected", selection, student_names, payload, user) as ckpt:
+            result = await _run_pipeline(
+                "course-selected",
+                token,
+                run_iep_alignment_selected,
+                student_names=student_names,
+                base_students_dir=str(STU_DIR),
+                selection=selection,
+                base_curriculum_dir=str(CUR_DIR),
+                scores_only=payload.scores_only,
+                explanation_store=EXPLANATIONS,
+                job=job,
+                checkpoint=ckpt,
+            )
+            if not result or not isinstance(result, dict):
+                raise HTTPException(status_code=500, detail="No result from pipeline")
+            if ((result.get("meta") or {}).get("fallback") or {}).get("neutral"):
+                # LLM was down and some pairs had no cached verdict: show, but don't persist
+                # placeholders; the checkpoint keeps the real verdicts for a re-submission
+                logger.warning(f"Alignment returned {result['meta']['fallback']} fallback verdicts; not persisting")
+                ckpt.mark("partial")
+                return result
+            await run_in_threadpool(_persist_course_rollup, result, course, requested_units, selection, student_names)
+            ckpt.complete()
+            return result
+
+    return await _coalesced(request, key, "course-selected", _work)
+
+
+def _persist_course_rollup(result: Dict, course: str, requested_units, selection: Dict[str, List[str]],
+                           student_names: List[str], pdf: bool = True) -> None:
+    """
+    Persistence half of /align/course-selected: the course rollup in
+    /data/curriculum/reports.json, per-worksheet history for the Analyze pane,
+    fit overrides for /curriculum, and the rollup PDF (unless pdf=False).
+    """
     # Aggregate course-level rollup from details (avg across all students & worksheets)
     details: Dict[str, Dict[str, Dict]] = result.get("details", {}) or {}
     mat = (result.get("matrix", {}) or {}).get("matrix", []) or []
@@ -2265,22 +3083,23 @@ async def align_course_selected(payload: CourseAlignRequest, user=Depends(verify
 
 
        # Persist to course store (existing)
-    store = _load_course_reports()
-    courses = store.setdefault("courses", {})
-    courses[course] = {
-        "updated_at": _now_iso(),
-        "selection": {"units": sorted(list(requested_units))},
-        "overall": int(overall),
-        "metrics": {
-            "understanding": int(metrics["understanding"]),
-            "accessibility": int(metrics["accessibility"]),
-            "accommodation": int(metrics["accommodation"]),
-            "engagement":    int(metrics["engagement"]),
-        },
-        "students_count": int(students_count),
-        "worksheets_count": int(worksheets_count),
-    }
-    _save_course_reports(store)
+    with transaction():
+        store = _load_course_reports()
+        courses = store.setdefault("courses", {})
+        courses[course] = {
+            "updated_at": _now_iso(),
+            "selection": {"units": sorted(list(requested_units))},
+            "overall": int(overall),
+            "metrics": {
+                "understanding": int(metrics["understanding"]),
+                "accessibility": int(metrics["accessibility"]),
+                "accommodation": int(metrics["accommodation"]),
+                "engagement":    int(metrics["engagement"]),
+            },
+            "students_count": int(students_count),
+            "worksheets_count": int(worksheets_count),
+        }
+        _save_course_reports(store)
 
     # Build per-worksheet overall mean across students (filename -> int mean)
     worksheet_overall: Dict[str, int] = {}
@@ -2291,8 +3110,18 @@ async def align_course_selected(payload: CourseAlignRequest, user=Depends(verify
             return 0
         return int(round(sum(vals) / len(vals)))
 
-    # Also create a small per-worksheet "history" summary for the Analyze side panel
-    hist = _load_align_history()
+    # Time series: the course, each worksheet (incl. the Analyze side panel summary)
+    # and each student's numbers within this course
+    snapshots: List[Dict] = [{
+        "key": f"course:{course}",
+        "source": "course-selected",
+        "overall": int(overall),
+        "metrics": store["courses"][course]["metrics"],
+        "units": sorted(requested_units),
+        "students_count": int(students_count),
+        "worksheets_count": int(worksheets_count),
+    }]
+    per_student: Dict[str, Dict[str, List[int]]] = {}
     for ws_fname, per_ws in details.items():
         norm = _normalize_fname(ws_fname)
         vals_overall, u_vals, a11n_vals, acc_vals, eng_vals = [], [], [], [], []
@@ -2307,6 +3136,8 @@ async def align_course_selected(payload: CourseAlignRequest, user=Depends(verify
             e = int(d.get("engagement_fit", 0))
             vals_overall.append(o)
             u_vals.append(u); a11n_vals.append(a); acc_vals.append(ac); eng_vals.append(e)
+            sv = per_student.setdefault(s_name, {k: [] for k in ("overall", "u", "a", "ac", "e")})
+            sv["overall"].append(o); sv["u"].append(u); sv["a"].append(a); sv["ac"].append(ac); sv["e"].append(e)
             if o < 70:  # threshold for "affected"
                 affected.append(s_name)
         worksheet_overall[norm] = _avg_int(vals_overall)
@@ -2336,11 +3167,40 @@ async def align_course_selected(payload: CourseAlignRequest, user=Depends(verify
                     f"U { _avg_int(u_vals)}%, Acc { _avg_int(a11n_vals)}%, "
                     f"Accom { _avg_int(acc_vals)}%, Eng { _avg_int(eng_vals)}%.")
 
-        key = f"{course}|{sorted(list(requested_units))[0] if len(requested_units)==1 else 'Multiple'}|{norm}"
-        # If units>1, we'll store under 'Multiple' (analyze pane asks specific unit; single-unit runs are exact)
-        hist[key] = {"affected": affected, "consensus": consensus, "evidence": evidence}
-
-    _save_align_history(hist)
+        snapshots.append({
+            "key": f"worksheet:{course}/{norm}",
+            "source": "course-selected",
+            "overall": worksheet_overall[norm],
+            "metrics": {
+                "understanding": _avg_int(u_vals),
+                "accessibility": _avg_int(a11n_vals),
+                "accommodation": _avg_int(acc_vals),
+                "engagement":    _avg_int(eng_vals),
+            },
+            "units": sorted(requested_units),
+            "affected": affected,
+            "consensus": consensus,
+            "evidence": evidence,
+        })
+
+    name_to_sid = {name: sid for sid, name in _student_names_by_id().items()}
+    for s_name, sv in per_student.items():
+        sid = name_to_sid.get(s_name)
+        if not sid:
+            continue
+        snapshots.append({
+            "key": f"student:{sid}@{course}",
+            "source": "course-selected",
+            "overall": _avg_int(sv["overall"]),
+            "metrics": {
+                "understanding": _avg_int(sv["u"]),
+                "accessibility": _avg_int(sv["a"]),
+                "accommodation": _avg_int(sv["ac"]),
+                "engagement":    _avg_int(sv["e"]),
+            },
+            "units": sorted(requested_units),
+        })
+    _record_history(snapshots)
 
     # Persist back into per-unit sidecar AND ROOT index.json so /curriculum reflects new fit
     _apply_course_fit_overrides(course, selection[course], worksheet_overall)
@@ -2350,15 +3210,739 @@ async def align_course_selected(payload: CourseAlignRequest, user=Depends(verify
         f"students={students_count}, worksheets={worksheets_count}, overall={overall}"
     )
 
+    if not pdf:
+        return
     try:
         title = f"Activity Fit Rollup — {course} • {len(requested_units)} unit(s) • {students_count} student(s)"
         _create_pdf_report(title=title, category=REPORT_CATEGORIES[1], tags=["auto", "course-selected", course], payload=result)
     except Exception as e:
         logger.warning(f"Failed to create course-selected PDF: {e}")
 
-    return result
 
 
+# ============================================================
+# ================= CORE COMPETENCY JOBS =====================
+# ============================================================
+
+# <subject>.json competency frameworks (same shape as sample_data/CCs/*.json)
+CC_DIR = DATA_DIR / "competencies"
+CC_REPORTS_PATH = DATA_DIR / "curriculum" / "cc_reports.json"
+# per (competency, worksheet text) verdicts, reused across runs
+CC_VERDICTS = ExplanationStore(DATA_DIR / "curriculum" / "cc_verdicts.json")
+# finished jobs kept in memory for status / result lookups
+CC_JOBS_KEEP = int(os.environ.get("CC_JOBS_KEEP", "50"))
+# competency runs are long background jobs: a larger budget than interactive alignments
+CC_DEADLINE_S = float(os.environ.get("CC_DEADLINE_S", "7200"))
+
+class CCAlignRequest(BaseModel):
+    course: str
+    subject: str                              # competency file stem under data/competencies
+    units: Optional[List[str]] = None         # if None or empty => all units under course
+    grade_band: Optional[str] = None          # default: first band in the file
+
+class _CCJob:
+    """One background competency run; progress is updated from the pipeline's worker threads."""
+
+    def __init__(self, job_id: str, key: str, payload: CCAlignRequest, selection: Dict[str, List[str]], user: Dict):
+        self.id = job_id
+        self.key = key
+        self.payload = payload
+        self.selection = selection
+        self.user = str(user.get("email") or user.get("sub") or "-")
+        self.state = "queued"                 # queued | running | done | failed | cancelled
+        self.done = 0
+        self.total = 0
+        self.error: Optional[str] = None
+        self.result: Optional[Dict] = None
+        self.created_at = _now_iso()
+        self.finished_at: Optional[str] = None
+        self.token = CancelToken(deadline_s=CC_DEADLINE_S or None)
+        self.task: Optional["asyncio.Task"] = None
+
+    def progress(self, done: int, total: int) -> None:
+        self.done, self.total = done, total
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def status(self) -> Dict:
+        meta = (self.result or {}).get("meta") or {}
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "course": self.payload.course,
+            "subject": self.payload.subject,
+            "grade_band": meta.get("grade_band") or self.payload.grade_band,
+            "units": self.selection[self.payload.course],
+            "done": self.done,
+            "total": self.total,
+            "reused": meta.get("reused", 0),
+            "error": self.error,
+            "user": self.user,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+_CC_JOBS: "OrderedDict[str, _CCJob]" = OrderedDict()
+_CC_ACTIVE: Dict[str, _CCJob] = {}            # request fingerprint -> queued/running job
+
+def _cc_file(subject: str) -> Path:
+    safe = "".join(ch for ch in subject if ch.isalnum() or ch in "-_")
+    p = CC_DIR / f"{safe}.json"
+    if not safe or not p.is_file():
+        raise HTTPException(status_code=404, detail=f"Competency framework not found: {subject}")
+    return p
+
+@STORE_IO.time(store="cc_reports", op="read")
+def _load_cc_reports() -> Dict[str, Dict]:
+    """
+    Shape:
+    { "courses": { "<course>": { "<subject>": {
+        "updated_at": ISO, "grade_band": str, "units": [...], "overall": int,
+        "competencies": { "<competency_id>": int mean },
+        "matrix": { "competencies": [...], "worksheets": [...], "matrix": [[int]] },
+        "row_averages": [...], "column_averages": [...]
+    }}}}
+    """
+    try:
+        obj = read_json(CC_REPORTS_PATH, None, store="cc_reports")
+        if isinstance(obj, dict) and isinstance(obj.get("courses"), dict):
+            return obj
+    except Exception as e:
+        logger.warning(f"Failed loading CC reports store: {e}")
+    return {"courses": {}}
+
+@STORE_IO.time(store="cc_reports", op="write")
+def _save_cc_reports(obj: Dict[str, Dict]) -> None:
+    CUR_DIR.mkdir(parents=True, exist_ok=True)
+    write_json(CC_REPORTS_PATH, obj, store="cc_reports")
+
+def _persist_cc_result(result: Dict, course: str, subject: str, units: List[str]) -> None:
+    """Competency matrix + per-competency means into cc_reports.json, and a history snapshot."""
+    meta = result.get("meta") or {}
+    comp_ids = list(meta.get("competencies") or [])
+    col_avgs = list(result.get("column_averages") or [])
+    row_avgs = list(result.get("row_averages") or [])
+    overall = int(round(sum(row_avgs) / len(row_avgs))) if row_avgs else 0
+    per_comp = {cid: int(round(col_avgs[i])) for i, cid in enumerate(comp_ids) if i < len(col_avgs)}
+
+    with transaction():
+        store = _load_cc_reports()
+        store["courses"].setdefault(course, {})[subject] = {
+            "updated_at": _now_iso(),
+            "grade_band": meta.get("grade_band"),
+            "units": sorted(units),
+            "overall": overall,
+            "competencies": per_comp,
+            "matrix": result.get("matrix") or {},
+            "row_averages": row_avgs,
+            "column_averages": col_avgs,
+        }
+        _save_cc_reports(store)
+    _record_history([{
+        "key": f"cc:{course}/{subject}",
+        "source": "cc",
+        "overall": overall,
+        "grade_band": meta.get("grade_band"),
+        "units": sorted(units),
+        "competencies": per_comp,
+    }])
+    logger.info(f"CC alignment persisted: course={course}, subject={subject}, overall={overall}")
+
+async def _run_cc_job(job: _CCJob, cc_file: Path, llm_job: Job) -> None:
+    job.state = "running"
+    try:
+        result = await _run_pipeline(
+            "cc",
+            job.token,
+            run_cc_alignment_selected,
+            cc_file=str(cc_file),
+            selection=job.selection,
+            base_curriculum_dir=str(CUR_DIR),
+            grade_band=job.payload.grade_band,
+            verdict_store=CC_VERDICTS,
+            job=llm_job,
+            progress=job.progress,
+        )
+        if ((result.get("meta") or {}).get("fallback") or {}).get("neutral"):
+            logger.warning(f"CC job {job.id}: {result['meta']['fallback']} fallback verdicts; not persisting")
+        else:
+            await run_in_threadpool(
+                _persist_cc_result, result, job.payload.course, job.payload.subject, job.selection[job.payload.course]
+            )
+        job.result = result
+        job.state = "done"
+    except Cancelled as e:
+        job.state, job.error = "cancelled", e.reason
+        ALIGN_CANCELLED.inc(kind="cc", reason=e.reason)
+    except LLM_UNAVAILABLE as e:
+        job.state, job.error = "failed", str(e) or "LLM backend unavailable"
+        logger.warning(f"CC job {job.id}: {job.error}")
+    except Exception as e:
+        job.state, job.error = "failed", f"Pipeline error: {e}"
+        logger.exception(f"CC job {job.id} failed")
+    finally:
+        job.finished_at = _now_iso()
+        if _CC_ACTIVE.get(job.key) is job:
+            del _CC_ACTIVE[job.key]
+        finished = [j for j in _CC_JOBS.values() if j.finished]
+        for old in finished[: max(0, len(finished) - CC_JOBS_KEEP)]:
+            _CC_JOBS.pop(old.id, None)
+
+def _get_cc_job(job_id: str) -> _CCJob:
+    job = _CC_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/align/cc/subjects")
+async def list_cc_subjects(user=Depends(verify_jwt)):
+    """Competency frameworks in data/competencies with their grade bands."""
+    out = []
+    for p in sorted(CC_DIR.glob("*.json")) if CC_DIR.exists() else []:
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            out.append({"subject": p.stem, "name": raw.get("subject") or p.stem,
+                        "grade_bands": sorted((raw.get("grade_bands") or {}).keys())})
+        except Exception as e:
+            logger.warning(f"Skipping competency file {p.name}: {e}")
+    return {"subjects": out}
+
+@app.post("/align/cc", status_code=202)
+async def align_cc(payload: CCAlignRequest, user=Depends(verify_jwt)):
+    """
+    Start core competency alignment for a course's units as a background job.
+    Returns { job_id, state, ... }; follow progress at /align/cc/jobs/{id}/events (SSE)
+    or poll /align/cc/jobs/{id}. The result is persisted in /data/curriculum/cc_reports.json.
+    An identical request (same selection, subject, band and files) joins the running job.
+    """
+    course = (payload.course or "").strip()
+    course_dir = CUR_DIR / course
+    if not course or not course_dir.is_dir():
+        raise HTTPException(status_code=404, detail=f"Course not found: {course}")
+    cc_file = _cc_file(payload.subject)
+    if payload.units:
+        units = sorted({u for u in payload.units if isinstance(u, str) and (course_dir / u).is_dir()})
+    else:
+        units = sorted(u.name for u in course_dir.iterdir() if u.is_dir())
+    if not units:
+        raise HTTPException(status_code=400, detail="No matching units found under the course")
+    selection = {course: units}
+
+    competencies = await run_in_threadpool(
+        lambda: cc_alignment_pipeline.normalize_competencies(
+            cc_alignment_pipeline.safe_load_json_file(cc_file), grade_band=payload.grade_band
+        )
+    )
+    if not competencies:
+        raise HTTPException(status_code=400, detail="No competencies for that grade band")
+
+    key = await run_in_threadpool(
+        _alignment_key, "cc", selection, [payload.subject, payload.grade_band or ""], False, [cc_file]
+    )
+    job = _CC_ACTIVE.get(key)
+    if job is not None:
+        ALIGN_COALESCED.inc(scope="request")
+        return dict(job.status(), coalesced=True)
+
+    llm_job = await run_in_threadpool(_alignment_job, user, selection, len(competencies))
+    job = _CCJob(uuid.uuid4().hex[:16], key, payload, selection, user)
+    _CC_JOBS[job.id] = job
+    _CC_ACTIVE[key] = job
+    job.task = asyncio.ensure_future(_run_cc_job(job, cc_file, llm_job))
+    return dict(job.status(), coalesced=False)
+
+@app.get("/align/cc/jobs")
+async def list_cc_jobs(user=Depends(verify_jwt)):
+    return {"jobs": [j.status() for j in reversed(_CC_JOBS.values())]}
+
+@app.get("/align/cc/jobs/{job_id}")
+async def get_cc_job(job_id: str, user=Depends(verify_jwt)):
+    """Job status; once done, also the full result (same shape as run_cc_alignment)."""
+    job = _get_cc_job(job_id)
+    body = job.status()
+    if job.state == "done":
+        body["result"] = job.result
+    return body
+
+@app.delete("/align/cc/jobs/{job_id}")
+async def cancel_cc_job(job_id: str, user=Depends(verify_jwt)):
+    job = _get_cc_job(job_id)
+    if not job.finished:
+        job.token.cancel("cancelled by user")
+    return job.status()
+
+@app.get("/align/cc/jobs/{job_id}/events")
+async def cc_job_events(job_id: str, request: Request, user=Depends(verify_jwt)):
+    """
+    Server-sent events: `progress` whenever done/total/state change, then one `done`
+    event with the final status. A comment line keeps idle connections open.
+    """
+    return _job_events(request, _get_cc_job(job_id))
+
+def _job_events(request: Request, job) -> StreamingResponse:
+    """
+    SSE for a background job (anything with status() and finished): `progress` when the
+    status changes, one `item` per new entry of job.items if it has them, then `done`.
+    """
+    async def _stream():
+        last = None
+        sent = 0
+        idle = 0.0
+        while True:
+            items = getattr(job, "items", None)
+            if items is not None:
+                for item in items[sent:]:
+                    yield f"event: item\ndata: {json.dumps(item)}\n\n"
+                    sent += 1
+            status = job.status()
+            if job.finished:
+                yield f"event: done\ndata: {json.dumps(status)}\n\n"
+                return
+            if status != last:
+                yield f"event: progress\ndata: {json.dumps(status)}\n\n"
+                last, idle = status, 0.0
+            elif idle >= 15:
+                yield ": keepalive\n\n"
+                idle = 0.0
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(0.5)
+            idle += 0.5
+
+    return StreamingResponse(
+        _stream(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/align/cc/report")
+async def get_cc_report(course: str, subject: Optional[str] = Query(None), user=Depends(verify_jwt)):
+    """Last persisted competency rollup(s) for a course: one subject, or all of them."""
+    rec = (_load_cc_reports().get("courses") or {}).get(course) or {}
+    if subject is not None:
+        rec = rec.get(subject)
+    if not rec:
+        raise HTTPException(status_code=404, detail="No competency report")
+    return rec
+
+
+# ============================================================
+# ===================== IEP INGESTION ========================
+# ============================================================
+
+# uploads are staged here per job and removed when the job ends
+INGEST_TMP_DIR = DATA_DIR / "tmp"
+INGEST_JOBS_KEEP = int(os.environ.get("INGEST_JOBS_KEEP", "20"))
+
+class _IngestJob:
+    """One bulk IEP upload; `items` grows by one result per file as the pool finishes them."""
+
+    def __init__(self, job_id: str, user: Dict, dry_run: bool, uploads: List[str]):
+        self.id = job_id
+        self.user = str(user.get("email") or user.get("sub") or "-")
+        self.dry_run = dry_run
+        self.uploads = uploads
+        self.state = "queued"                 # queued | running | done | failed | cancelled
+        self.total = 0
+        self.items: List[Dict] = []
+        self.error: Optional[str] = None
+        self.created_at = _now_iso()
+        self.finished_at: Optional[str] = None
+        self.token = CancelToken()
+        self.scratch = INGEST_TMP_DIR / f"ingest-{job_id}"
+        self.task: Optional["asyncio.Task"] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def status(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "dry_run": self.dry_run,
+            "uploads": self.uploads,
+            "done": len(self.items),
+            "total": self.total,
+            "counts": ingest_summarize(self.items),
+            "error": self.error,
+            "user": self.user,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+_INGEST_JOBS: "OrderedDict[str, _IngestJob]" = OrderedDict()
+# one ingest at a time: upserts match against the store as it stands
+_INGEST_LOCK = asyncio.Lock()
+
+async def _run_ingest_job(job: _IngestJob, inputs: List[Path], labels: Dict[Path, str]) -> None:
+    try:
+        async with _INGEST_LOCK:
+            job.state = "running"
+            pdfs, rejected, names = await run_in_threadpool(
+                expand_iep_inputs, inputs, job.scratch / "unzipped", labels
+            )
+            job.total = len(pdfs) + len(rejected)
+            job.items.extend(rejected)
+            await run_in_threadpool(
+                ingest_pdfs, pdfs, STU_DIR,
+                progress=lambda done, total, item: job.items.append(item),
+                cancel=job.token, dry_run=job.dry_run, names=names,
+            )
+            job.state = "done"
+    except Cancelled as e:
+        job.state, job.error = "cancelled", e.reason
+    except Exception as e:
+        job.state, job.error = "failed", f"Ingest error: {e}"
+        logger.exception(f"Ingest job {job.id} failed")
+    finally:
+        job.finished_at = _now_iso()
+        shutil.rmtree(job.scratch, ignore_errors=True)
+        logger.info(f"Ingest job {job.id} by {job.user}: {job.state} {ingest_summarize(job.items)}")
+        finished = [j for j in _INGEST_JOBS.values() if j.finished]
+        for old in finished[: max(0, len(finished) - INGEST_JOBS_KEEP)]:
+            _INGEST_JOBS.pop(old.id, None)
+
+def _get_ingest_job(job_id: str) -> _IngestJob:
+    job = _INGEST_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _ingest_upload_totals(files: List[UploadFile]) -> Tuple[int, int]:
+    """(total bytes, PDFs including zip members) of the uploads; leaves each file at offset 0."""
+    size = count = 0
+    for f in files:
+        f.file.seek(0, os.SEEK_END)
+        size += f.file.tell()
+        f.file.seek(0)
+        count += count_iep_pdfs(f.filename, f.file)
+        f.file.seek(0)
+    return size, count
+
+@app.post("/students/ingest", status_code=202)
+async def ingest_students(
+    user=Depends(verify_jwt),
+    files: List[UploadFile] = File(...),
+    dry_run: bool = Form(False),
+):
+    """
+    Bulk-import IEP PDFs (and/or zips of PDFs) into /data/students as a background job.
+    Each PDF is parsed, validated and upserted (matched by PEN, else by name).
+    dry_run=true parses and validates without writing. Follow /students/ingest/{id}/events.
+    """
+    bad = [f.filename for f in files if not (f.filename or "").lower().endswith((".pdf", ".zip"))]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Only .pdf and .zip files are allowed: {', '.join(bad)}")
+    # checked on the spooled uploads, before anything is copied to data/tmp
+    size, count = await run_in_threadpool(_ingest_upload_totals, files)
+    if size > IEP_INGEST_MAX_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"Uploads total more than {IEP_INGEST_MAX_UPLOAD_MB:g} MB")
+    if count > IEP_INGEST_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"{count} PDFs in one batch; the limit is {IEP_INGEST_MAX_FILES}")
+
+    job = _IngestJob(uuid.uuid4().hex[:16], user, dry_run, [f.filename for f in files])
+    inputs: List[Path] = []
+    labels: Dict[Path, str] = {}
+    job.scratch.mkdir(parents=True, exist_ok=True)
+    for i, f in enumerate(files):
+        dest = job.scratch / f"{i:05d}-{_safe_filename(f.filename)}"
+        with open(dest, "wb") as out:
+            await run_in_threadpool(shutil.copyfileobj, f.file, out, 1024 * 1024)
+        inputs.append(dest)
+        labels[dest] = f.filename
+
+    _INGEST_JOBS[job.id] = job
+    job.task = asyncio.ensure_future(_run_ingest_job(job, inputs, labels))
+    logger.info(f"Ingest job {job.id}: {len(files)} upload(s) by {job.user}{' (dry run)' if dry_run else ''}")
+    return job.status()
+
+@app.get("/students/ingest/{job_id}")
+async def get_ingest_job(job_id: str, user=Depends(verify_jwt)):
+    """Status plus one result per file so far: {file, status, id, student_name, errors, warnings}."""
+    job = _get_ingest_job(job_id)
+    return dict(job.status(), items=job.items)
+
+@app.get("/students/ingest/{job_id}/events")
+async def ingest_job_events(job_id: str, request: Request, user=Depends(verify_jwt)):
+    """SSE: one `item` per finished file, `progress` on status changes, then `done`."""
+    return _job_events(request, _get_ingest_job(job_id))
+
+@app.delete("/students/ingest/{job_id}")
+async def cancel_ingest_job(job_id: str, user=Depends(verify_jwt)):
+    """Stops parsing; students already written stay written."""
+    job = _get_ingest_job(job_id)
+    if not job.finished:
+        job.token.cancel("cancelled by user")
+    return job.status()
+
+# ============================================================
+# ===================== DIRECTIVE CHAT =======================
+# ============================================================
+
+# saved directive sets: chat/<user id>/<session id>.json
+CHAT_DIR = DATA_DIR / "chat"
+CHAT_MODEL = os.environ.get("CHAT_MODEL", "phi3")
+CHAT_SESSION_TTL_S = float(os.environ.get("CHAT_SESSION_TTL_S", "1800"))
+CHAT_MAX_SESSIONS = int(os.environ.get("CHAT_MAX_SESSIONS", "200"))
+
+class _ChatSession:
+    """
+    Server-side state of one directive chat (chat_pipeline.DirectiveIntake). Outlives its
+    socket for CHAT_SESSION_TTL_S, so a page reload resumes it with ?session=<id>.
+    """
+
+    def __init__(self, sid: str, user: Dict, directives: Optional[List[str]] = None):
+        self.id = sid
+        self.owner = str(user.get("sub"))
+        self.user = str(user.get("email") or user.get("sub") or "-")
+        # interactive class: chat turns jump ahead of batch alignments for the next free slot
+        self.intake = DirectiveIntake(
+            model=CHAT_MODEL, session_id=sid, job=Job(priority="interactive", user=self.user),
+            directives=directives,
+        )
+        self.lock = asyncio.Lock()            # one turn at a time
+        self.cancel: Optional[CancelToken] = None  # set while a turn is running
+        self.sockets = 0
+        self.touched = time.monotonic()
+        self.created_at = _now_iso()
+        self.saved_at: Optional[str] = None
+
+    def status(self) -> Dict:
+        return dict(
+            self.intake.state(),
+            session=self.id,
+            busy=self.lock.locked(),
+            connected=self.sockets,
+            created_at=self.created_at,
+            saved_at=self.saved_at,
+        )
+
+_CHAT_SESSIONS: "OrderedDict[str, _ChatSession]" = OrderedDict()
+
+def _expire_chat_sessions() -> None:
+    """Drop sessions idle past the TTL, then the least recently used beyond the cap."""
+    now = time.monotonic()
+    idle = [s for s in _CHAT_SESSIONS.values() if not s.sockets and not s.lock.locked()]
+    over = len(_CHAT_SESSIONS) - CHAT_MAX_SESSIONS
+    for sess in idle:
+        if now - sess.touched > CHAT_SESSION_TTL_S or over > 0:
+            _CHAT_SESSIONS.pop(sess.id, None)
+            over -= 1
+
+def _chat_file(owner: str, sid: str) -> Path:
+    return CHAT_DIR / _safe_filename(owner) / f"{_safe_filename(sid)}.json"
+
+def _load_saved_chat(owner: str, sid: str) -> Optional[Dict]:
+    path = _chat_file(owner, sid)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Failed loading saved chat {path}: {e}")
+        return None
+
+@STORE_IO.time(store="chat", op="write")
+def _save_chat(sess: _ChatSession) -> Dict:
+    path = _chat_file(sess.owner, sess.id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    rec = {
+        "session": sess.id,
+        "user": sess.user,
+        "directives": list(sess.intake.confirmed),
+        "created_at": sess.created_at,
+        "saved_at": _now_iso(),
+    }
+    tmp = str(path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(rec, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    sess.saved_at = rec["saved_at"]
+    return rec
+
+def _open_chat_session(user: Dict, sid: Optional[str]) -> Tuple[_ChatSession, bool]:
+    """(session, resumed): the live session, else one restored from its saved directives, else a new one."""
+    _expire_chat_sessions()
+    owner = str(user.get("sub"))
+    if sid:
+        sess = _CHAT_SESSIONS.get(sid)
+        if sess is not None and sess.owner == owner:
+            _CHAT_SESSIONS.move_to_end(sid)
+            return sess, True
+        saved = _load_saved_chat(owner, sid)
+        if saved is not None:
+            sess = _ChatSession(sid, user, saved.get("directives") or [])
+            sess.created_at = saved.get("created_at") or sess.created_at
+            sess.saved_at = saved.get("saved_at")
+            _CHAT_SESSIONS[sid] = sess
+            return sess, True
+    sess = _ChatSession(uuid.uuid4().hex[:16], user)
+    _CHAT_SESSIONS[sess.id] = sess
+    return sess, False
+
+async def _chat_turn(sess: _ChatSession, text: str, send) -> None:
+    """Run one line through the session, streaming tokens, then send its events and the new state."""
+    loop = asyncio.get_running_loop()
+    # tokens arrive on a worker thread; hop them onto the loop in order
+    on_token = lambda piece: loop.call_soon_threadsafe(send, {"type": "token", "text": piece})
+    async with sess.lock:
+        sess.cancel = CancelToken()
+        try:
+            events = await run_in_threadpool(sess.intake.handle, text, on_token, sess.cancel)
+        finally:
+            sess.cancel = None
+            sess.touched = time.monotonic()
+    for ev in events:
+        kind = ev["type"]
+        if kind == "end":
+            send(dict(sess.intake.state(), type="end"))  # the writer closes the socket after it
+            return
+        if kind == "help":
+            send({"type": "help", "text": CHAT_HELP_TEXT})
+        elif kind == "save":
+            # the path is a CLI notion; the web chat saves into the user's chat store
+            try:
+                rec = await run_in_threadpool(_save_chat, sess)
+                send({"type": "saved", "session": sess.id, "saved_at": rec["saved_at"],
+                      "directives": rec["directives"]})
+            except OSError as e:
+                logger.error(f"Failed saving chat {sess.id}: {e}")
+                send({"type": "error", "text": "Failed to save directives"})
+        else:
+            send(ev)
+    send(dict(sess.intake.state(), type="state"))
+
+def _log_chat_turn(sess: _ChatSession, task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Chat {sess.id} turn failed: {task.exception()!r}")
+
+@app.websocket("/chat/ws")
+async def chat_ws(ws: WebSocket, token: str = Query(...), session: Optional[str] = Query(None)):
+    """
+    Report-directive chat (the chat_pipeline workflow) over a WebSocket.
+    Browsers cannot set headers on a WebSocket, so the JWT comes as ?token=.
+    Client -> server: {"type": "message", "text": "..."} (or a bare text frame), {"type": "cancel"}
+    Server -> client: {"type": "session", ...} once, then per turn any of
+      token (streamed reply text), bot, info, warn, ok, error, proposed, directives,
+      help, copy, saved, and finally state {directives, pending}.
+    """
+    try:
+        user = decode_jwt(token)
+    except HTTPException:
+        await ws.close(code=1008, reason="Invalid token")
+        return
+    await ws.accept()
+    sess, resumed = _open_chat_session(user, session)
+    sess.sockets += 1
+
+    # one writer per socket, so streamed tokens and events never interleave mid-frame
+    outbox: asyncio.Queue = asyncio.Queue()
+
+    async def _writer():
+        while True:
+            msg = await outbox.get()
+            if msg is None:
+                return
+            await ws.send_json(msg)
+            if msg["type"] == "end":
+                await ws.close()
+                return
+
+    writer = asyncio.ensure_future(_writer())
+    turn: Optional[asyncio.Future] = None
+    outbox.put_nowait(dict(sess.status(), type="session", resumed=resumed))
+    logger.info(f"Chat {sess.id} opened by {sess.user}{' (resumed)' if resumed else ''}")
+    try:
+        while True:
+            raw = await ws.receive_text()  # keeps reading during a turn, so cancel gets through
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                msg = {"type": "message", "text": raw}
+            if not isinstance(msg, dict):
+                msg = {"type": "message", "text": str(msg)}
+            if msg.get("type") == "cancel":
+                if sess.cancel is not None:
+                    sess.cancel.cancel("cancelled by user")
+                continue
+            if turn is not None and not turn.done():
+                outbox.put_nowait({"type": "warn", "text": "Still answering your previous message."})
+                continue
+            turn = asyncio.ensure_future(_chat_turn(sess, str(msg.get("text") or ""), outbox.put_nowait))
+            turn.add_done_callback(lambda t: _log_chat_turn(sess, t))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sess.sockets -= 1
+        sess.touched = time.monotonic()
+        if turn is not None and not turn.done() and sess.cancel is not None:
+            sess.cancel.cancel("client disconnected")
+        outbox.put_nowait(None)
+        writer.cancel()
+
+
+@app.get("/chat/sessions")
+async def list_chat_sessions(user=Depends(verify_jwt)):
+    """The caller's live chats and saved directive sets, newest first."""
+    owner = str(user.get("sub"))
+    out: Dict[str, Dict] = {}
+    user_dir = CHAT_DIR / _safe_filename(owner)
+    for path in sorted(user_dir.glob("*.json")) if user_dir.exists() else []:
+        rec = _load_saved_chat(owner, path.stem)
+        if rec:
+            out[path.stem] = {
+                "session": path.stem, "directives": rec.get("directives") or [], "pending": None,
+                "live": False, "created_at": rec.get("created_at"), "saved_at": rec.get("saved_at"),
+            }
+    for sess in _CHAT_SESSIONS.values():
+        if sess.owner == owner:
+            out[sess.id] = dict(sess.status(), live=True)
+    return {"sessions": sorted(out.values(), key=lambda r: r.get("created_at") or "", reverse=True)}
+
+@app.get("/chat/sessions/{sid}")
+async def get_chat_session(sid: str, user=Depends(verify_jwt)):
+    owner = str(user.get("sub"))
+    sess = _CHAT_SESSIONS.get(sid)
+    if sess is not None and sess.owner == owner:
+        return dict(sess.status(), live=True)
+    rec = _load_saved_chat(owner, sid)
+    if rec is None:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return dict(rec, pending=None, live=False)
+
+# ============================================================
+# ===================== LLM TELEMETRY ROUTES =================
+# ============================================================
+
+@app.get("/telemetry/llm")
+async def get_llm_telemetry(
+    user=Depends(verify_jwt),
+    pipeline: Optional[str] = Query(None),
+    worksheet: Optional[str] = Query(None),
+    student: Optional[str] = Query(None),
+    competency: Optional[str] = Query(None),
+    since: Optional[str] = Query(None, description="ISO timestamp or epoch seconds"),
+    until: Optional[str] = Query(None, description="ISO timestamp or epoch seconds"),
+    limit: int = Query(100, ge=0, le=2000),
+):
+    """
+    Per-call token counts and Ollama timings from data/telemetry/llm_calls.jsonl.
+    Returns { "totals": {<pipeline>: {calls, retries, tokens, ms, tokens/s...}}, "calls": [last `limit` records] }
+    """
+    try:
+        records = llm_telemetry.query_llm_calls(
+            pipeline=pipeline, worksheet=worksheet, student=student,
+            competency=competency, since=since, until=until,
+        )
+        # records is lazy: the file is read (and since/until parsed) on the worker thread
+        return await run_in_threadpool(llm_telemetry.summarize, records, keep_last=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid time filter: {e}")
+
 
 # ============================================================
 # ========================== MAIN ============================
@@ -0,0 +1,80 @@
+# ingest_ieps.py
+"""
+Bulk IEP import from the command line: parse many IEP PDFs (or zips of them) in
+parallel and upsert them into data/students, the same way POST /students/ingest does.
+
+- one line per file as it finishes: status, student id, name, problems found
+- invalid parses (no student name, malformed sections) are reported and not written
+- students are matched by PEN (else by name); matched files keep their app-side keys
+
+Usage (from backend/):
+  python ingest_ieps.py ~/Downloads/ieps/*.pdf
+  python ingest_ieps.py school_2025.zip --workers 8
+  python ingest_ieps.py incoming/ --dry-run           # a directory means every PDF/zip in it
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from pipelines.ingest import STU_DIR, expand_inputs, ingest_pdfs, summarize
+
+
+def _inputs(args: List[str]) -> List[Path]:
+    out: List[Path] = []
+    for a in args:
+        p = Path(a)
+        if p.is_dir():
+            out.extend(sorted(q for q in p.rglob("*") if q.suffix.lower() in (".pdf", ".zip")))
+        else:
+            out.append(p)
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Parse IEP PDFs into data/students.")
+    ap.add_argument("paths", nargs="+", help="PDFs, zips of PDFs, or directories of them")
+    ap.add_argument("--workers", type=int, help="parser processes (default: IEP_INGEST_WORKERS or min(cpus, 8))")
+    ap.add_argument("--students-dir", default=str(STU_DIR), help="students store (default: data/students)")
+    ap.add_argument("--dry-run", action="store_true", help="parse and validate only; write nothing")
+    ap.add_argument("--json", action="store_true", help="print the per-file results as JSON at the end")
+    args = ap.parse_args(argv)
+
+    inputs = _inputs(args.paths)
+    missing = [str(p) for p in inputs if not p.is_file()]
+    if missing:
+        print(f"Not found: {', '.join(missing)}", file=sys.stderr)
+        return 2
+
+    def _progress(done: int, total: int, item: dict) -> None:
+        problems = "; ".join(item["errors"] + item["warnings"])
+        print(f"[{done}/{total}] {item['status']:<8} {item['id'] or '-':<32} {item['file']}"
+              + (f"  ({problems})" if problems else ""))
+
+    t0 = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="iep-ingest-") as scratch:
+        pdfs, rejected, names = expand_inputs(inputs, Path(scratch))
+        total = len(pdfs) + len(rejected)
+        results = []
+        for item in rejected:
+            results.append(item)
+            _progress(len(results), total, item)
+        results += ingest_pdfs(
+            pdfs, Path(args.students_dir), workers=args.workers, dry_run=args.dry_run, names=names,
+            progress=lambda done, _, item: _progress(len(rejected) + done, total, item),
+        )
+
+    counts = summarize(results)
+    print(f"{total} files in {time.perf_counter() - t0:.1f}s{' (dry run)' if args.dry_run else ''}: "
+          + ", ".join(f"{v} {k}" for k, v in counts.items()))
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    return 1 if counts["invalid"] or counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
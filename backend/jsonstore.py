@@ -0,0 +1,413 @@
+"""
+jsonstore.py
+Read-through cache for the API's JSON stores (library/reports/curriculum indexes,
+student files, rollups), so read-heavy pages stop re-parsing the same files.
+- entries are keyed by path and revalidated on every read by one stat():
+  (inode, mtime_ns, size). Writers replace files atomically, so a write from any
+  process, including another uvicorn worker, gets a new inode and misses
+- write_json() is the atomic tmp + os.replace write the stores already used; it
+  refreshes the entry in place, so a save is not followed by a re-parse
+- read_json() hands out a private copy by default (callers load, mutate, save).
+  Copies are rebuilt from a marshal snapshot, ~3x cheaper than json.loads. Read-only
+  callers pass shared=True and get the cached object itself, which they must not mutate
+- hits/misses go to metrics.record_cache as cache="json:<store>"
+
+Read-modify-write goes through transaction(), so several uvicorn workers (or the
+API and a CLI) can share data/ without lost updates:
+- one exclusive lock for all writers: a thread lock in-process plus flock (msvcrt on
+  Windows) on data/.store.lock across processes. Reads never take it, since atomic
+  replaces mean a reader sees either the old file or the new one
+- inside the block, write_json() only stages; read_json() sees the staged objects.
+  Everything is written on exit, or nothing if the block raised
+- commits touching several files write a journal after the tmp files and before the
+  renames; recover() (at startup) rolls an interrupted commit forward
+- transactions nest by joining the outer one, so existing _load_*/_save_* helpers
+  become transactional by being called inside a `with`
+- records edited by users carry a "_rev" counter (bump_rev / check_rev) for
+  optimistic concurrency: a stale If-Match becomes StoreConflict (HTTP 409)
+- a transaction blocks on the writer lock, so async code must open it on a worker
+  thread (run_in_threadpool); JSON_STORE_LOOP_CHECK makes a slip an error
+
+Config (env):
+  JSON_CACHE=1           0 = always read from disk
+  JSON_CACHE_MAX_MB=256  LRU bound on cached snapshots (by serialized size)
+  JSON_STORE_LOOP_CHECK=0  1 = transaction() on an event-loop thread raises RuntimeError
+"""
+
+import asyncio
+import contextvars
+import json
+import marshal
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+from metrics import record_cache
+
+JSON_CACHE = os.environ.get("JSON_CACHE", "1").lower() not in ("0", "false", "no")
+JSON_CACHE_MAX_MB = float(os.environ.get("JSON_CACHE_MAX_MB", "256"))
+JSON_STORE_LOOP_CHECK = os.environ.get("JSON_STORE_LOOP_CHECK", "0").lower() not in ("0", "false", "no")
+
+Sig = Tuple[int, int, int]
+
+
+class _Entry:
+    __slots__ = ("sig", "blob", "obj")
+
+    def __init__(self, sig: Sig, blob: bytes, obj: Any = None):
+        self.sig = sig
+        self.blob = blob  # marshal snapshot: the source of private copies
+        self.obj = obj    # shared read-only object, decoded on first shared read
+
+
+def _snapshot(obj: Any) -> Optional[bytes]:
+    try:
+        return marshal.dumps(obj)  # the caller may keep mutating obj
+    except ValueError:
+        return None  # not plain JSON data (json.dump coerces it); re-read next time
+
+
+def _sig(path: Path) -> Optional[Sig]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class JsonFileCache:
+    def __init__(self, max_bytes: int, enabled: bool = True):
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+
+    def _put(self, key: str, entry: _Entry) -> None:
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old.blob)
+            if len(entry.blob) > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += len(entry.blob)
+            while self._bytes > self.max_bytes and self._entries:
+                _, dropped = self._entries.popitem(last=False)
+                self._bytes -= len(dropped.blob)
+
+    def read(self, path: Union[str, Path], default: Any = None, store: str = "json", shared: bool = False) -> Any:
+        """
+        Parsed contents of `path`, or `default` if it does not exist.
+        Parse errors propagate, as with json.load; the bad file is not cached.
+        """
+        path = Path(path)
+        tx = _CURRENT_TX.get()
+        if tx is not None and str(path) in tx.staged:
+            return tx.staged_copy(path, shared)
+        if not self.enabled:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                return default
+        key = str(path)
+        sig = _sig(path)
+        if sig is None:
+            self.invalidate(path)
+            return default
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.sig == sig:
+                self._entries.move_to_end(key)
+            else:
+                entry = None
+        if entry is not None:
+            record_cache(f"json:{store}", True)
+            if not shared:
+                return marshal.loads(entry.blob)
+            if entry.obj is None:
+                entry.obj = marshal.loads(entry.blob)
+            return entry.obj
+
+        record_cache(f"json:{store}", False)
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return default
+        obj = json.loads(raw)
+        # the file may have been replaced while we read it; only cache what matches the stat
+        if _sig(path) == sig:
+            self._put(key, _Entry(sig, marshal.dumps(obj), obj if shared else None))
+        return obj
+
+    def write(self, path: Union[str, Path], obj: Any, store: str = "json", indent: Optional[int] = 2) -> None:
+        """Atomic write (tmp + os.replace); the entry is refreshed from `obj`."""
+        path = Path(path)
+        tmp = str(path) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp, path)
+        self.remember(path, _snapshot(obj))
+
+    def remember(self, path: Path, blob: Optional[bytes]) -> None:
+        """Cache `blob` as the contents `path` was just replaced with."""
+        if not self.enabled:
+            return
+        sig = _sig(path)
+        if sig is None or blob is None:
+            self.invalidate(path)
+        else:
+            self._put(str(path), _Entry(sig, blob))
+
+    def invalidate(self, path: Optional[Union[str, Path]] = None) -> None:
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            old = self._entries.pop(str(Path(path)), None)
+            if old is not None:
+                self._bytes -= len(old.blob)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"enabled": self.enabled, "entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes}
+
+
+# ---------- Transactions ----------
+
+_CURRENT_TX: "contextvars.ContextVar[Optional[Transaction]]" = contextvars.ContextVar("jsonstore_tx", default=None)
+
+
+class StoreConflict(Exception):
+    """Optimistic check failed: the record changed since the client read it."""
+
+    def __init__(self, what: str, expected: int, current: int):
+        super().__init__(f"{what} is at revision {current}, not {expected}")
+        self.what = what
+        self.expected = expected
+        self.current = current
+
+
+class Transaction:
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.staged: "OrderedDict[str, Tuple[Path, Any, Optional[bytes], Optional[int]]]" = OrderedDict()
+
+    def stage(self, path: Path, obj: Any, indent: Optional[int]) -> None:
+        # snapshot now: the caller may keep mutating obj after "saving" it
+        blob = _snapshot(obj)
+        self.staged[str(path)] = (path, obj if blob is None else None, blob, indent)
+
+    def staged_copy(self, path: Path, shared: bool) -> Any:
+        _, obj, blob, _ = self.staged[str(path)]
+        return obj if blob is None else marshal.loads(blob)
+
+
+class JsonStore:
+    """Writer lock, transactions and crash recovery for the JSON files under `root`."""
+
+    def __init__(self, root: Path, cache: JsonFileCache, loop_check: bool = JSON_STORE_LOOP_CHECK):
+        self.root = Path(root)
+        self.cache = cache
+        self.loop_check = loop_check
+        self.lock_path = self.root / ".store.lock"
+        self.journal_dir = self.root / ".journal"
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """Exclusive across threads and processes; re-entrant within a thread."""
+        with self._rlock:
+            if self._depth == 0:
+                self.root.mkdir(parents=True, exist_ok=True)
+                fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    _lock_fd(fd)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0:
+                    fd, self._fd = self._fd, None
+                    try:
+                        _unlock_fd(fd)
+                    finally:
+                        os.close(fd)
+
+    @contextmanager
+    def transaction(self) -> Iterator[Transaction]:
+        """
+        Stage write_json() calls made in the block and commit them together on exit.
+        Keep the block synchronous: it holds the writer lock, and an await inside would
+        let other requests on the same thread reach it.
+        """
+        outer = _CURRENT_TX.get()
+        if outer is not None:
+            yield outer
+            return
+        if self.loop_check and _on_event_loop():
+            raise RuntimeError("transaction() opened on the event loop thread; run it via run_in_threadpool")
+        with self.locked():
+            tx = Transaction()
+            token = _CURRENT_TX.set(tx)
+            try:
+                yield tx
+            finally:
+                _CURRENT_TX.reset(token)
+            self._commit(tx)
+
+    def _commit(self, tx: Transaction) -> None:
+        items = list(tx.staged.values())
+        if not items:
+            return
+        durable = len(items) > 1  # a single replace is atomic already
+        written: List[Tuple[str, Path, Optional[bytes]]] = []
+        journal: Optional[Path] = None
+        tmp: Optional[str] = None
+        try:
+            for path, obj, blob, indent in items:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = f"{path}.{tx.id}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(obj if blob is None else marshal.loads(blob), f, ensure_ascii=False, indent=indent)
+                    if durable:
+                        f.flush()
+                        os.fsync(f.fileno())
+                written.append((tmp, path, blob))
+            if durable:
+                self.journal_dir.mkdir(parents=True, exist_ok=True)
+                journal = self.journal_dir / f"{tx.id}.json"
+                with open(journal, "w", encoding="utf-8") as f:
+                    json.dump({"replace": [[tmp, str(path)] for tmp, path, _ in written]}, f)
+                    f.flush()
+                    os.fsync(f.fileno())
+        except BaseException:
+            # nothing is visible yet: drop the staged files, including a half-written one
+            if tmp is not None:
+                _unlink(tmp)
+            for tmp, _, _ in written:
+                _unlink(tmp)
+            if journal is not None:
+                _unlink(journal)
+            raise
+        # past the commit point: an error from here on is finished by recover()
+        for tmp, path, blob in written:
+            os.replace(tmp, path)
+            self.cache.remember(path, blob)
+        if journal is not None:
+            _unlink(journal)
+
+    def recover(self) -> int:
+        """Finish commits interrupted after their journal was written; returns how many."""
+        if not self.journal_dir.exists():
+            return 0
+        done = 0
+        with self.locked():
+            for journal in sorted(self.journal_dir.glob("*.json")):
+                try:
+                    with open(journal, "r", encoding="utf-8") as f:
+                        pairs = json.load(f).get("replace") or []
+                except (OSError, ValueError):
+                    pairs = []  # torn journal: its commit never reached the renames
+                for tmp, path in pairs:
+                    if os.path.exists(tmp):
+                        os.replace(tmp, path)
+                        self.cache.invalidate(path)
+                _unlink(journal)
+                done += 1
+        return done
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _lock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)  # retries for ~10s, then raises
+                return
+            except OSError:
+                continue
+
+
+def _unlock_fd(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+def _unlink(path: Union[str, Path]) -> None:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+# ---------- Revisions ----------
+
+def rev_of(record: Dict[str, Any]) -> int:
+    try:
+        return int(record.get("_rev") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def check_rev(record: Dict[str, Any], expected: Optional[int], what: str = "record") -> None:
+    """expected=None skips the check (client sent no If-Match)."""
+    if expected is not None and rev_of(record) != expected:
+        raise StoreConflict(what, expected, rev_of(record))
+
+
+def bump_rev(record: Dict[str, Any]) -> int:
+    record["_rev"] = rev_of(record) + 1
+    return record["_rev"]
+
+
+CACHE = JsonFileCache(int(JSON_CACHE_MAX_MB * 1024 * 1024), enabled=JSON_CACHE)
+STORE = JsonStore(Path(__file__).resolve().parent / "data", CACHE)
+read_json = CACHE.read
+transaction = STORE.transaction
+
+
+def write_json(path: Union[str, Path], obj: Any, store: str = "json", indent: Optional[int] = 2) -> None:
+    """Atomic write, or staged until commit inside transaction()."""
+    tx = _CURRENT_TX.get()
+    if tx is not None:
+        tx.stage(Path(path), obj, indent)
+    else:
+        CACHE.write(path, obj, store=store, indent=indent)
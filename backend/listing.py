@@ -0,0 +1,208 @@
+"""
+listing.py
+In-memory indexes behind the list routes (GET /students, /library, /reports,
+/curriculum), so a page of rows costs a bisect and a short walk, not a rebuild,
+re-sort and full serialization of the collection.
+- each ListIndex is synced from (id, source) pairs: the shared objects
+  jsonstore.read_json hands out, which only change identity when their file changes,
+  or a file's stat signature. An unchanged collection is recognised by comparing
+  sources, and only changed records are re-derived
+- sorted views (sort key, id) are built lazily per sort and kept until the next change
+- facets (badge, grade, tag, category, course, ...) map normalized value -> ids, so
+  equality filters are set intersections; ranges are a predicate over those ids
+- pagination is keyset: the cursor encodes the last row's (sort key, id), so pages
+  stay consistent while rows are added or removed between requests
+- fields= projects rows to the listed fields
+- syncs go to metrics.record_cache as cache="list:<name>" (hit = index reused)
+
+Config (env):
+  LIST_MAX_LIMIT=500   largest page size a client may ask for
+"""
+
+import base64
+import json
+import os
+import threading
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from metrics import record_cache
+
+LIST_MAX_LIMIT = int(os.environ.get("LIST_MAX_LIMIT", "500"))
+
+_MISSING = object()
+
+
+class BadQuery(ValueError):
+    """Unknown sort/field/filter or a cursor from another query; the API answers 400."""
+
+
+@dataclass
+class Page:
+    items: List[Dict[str, Any]]
+    total: int                        # rows matching the filters, across all pages
+    next_cursor: Optional[str] = None
+    fields: Optional[List[str]] = None  # set when the rows were projected
+
+
+def parse_fields(raw: Optional[str]) -> Optional[List[str]]:
+    """"id,name" -> ["id", "name"]; None/empty -> None (all fields)."""
+    if not raw:
+        return None
+    out = [f.strip() for f in raw.split(",") if f.strip()]
+    return out or None
+
+
+def _norm(value: Any) -> str:
+    return str(value).strip().lower()
+
+
+def _encode_cursor(sort: str, descending: bool, key: Any, rid: str) -> str:
+    raw = json.dumps([sort, descending, key, rid], separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, sort: str, descending: bool) -> Tuple[Any, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        c_sort, c_desc, key, rid = json.loads(raw)
+    except Exception:
+        raise BadQuery("Malformed cursor")
+    if c_sort != sort or bool(c_desc) != descending:
+        raise BadQuery("Cursor belongs to a different sort; restart without it")
+    return (tuple(key) if isinstance(key, list) else key), str(rid)
+
+
+class ListIndex:
+    """
+    Rows of one collection plus their sorted views and facets.
+    sorts:  name -> row -> key. Keys of one sort must compare with each other
+            (str/int/float or tuples of them, no None); ties are broken by row id.
+    facets: name -> row -> value or list of values, matched case-insensitively.
+    """
+
+    def __init__(self, name: str, fields: Sequence[str],
+                 sorts: Dict[str, Callable[[Dict[str, Any]], Any]],
+                 facets: Optional[Dict[str, Callable[[Dict[str, Any]], Any]]] = None):
+        self.name = name
+        self.fields = list(fields)
+        self.sorts = sorts
+        self.facet_fns = facets or {}
+        self._lock = threading.Lock()
+        self._src: Dict[str, Any] = {}
+        self._rows: Dict[str, Dict[str, Any]] = {}
+        self._views: Dict[str, List[Tuple[Any, str]]] = {}
+        self._facets: Dict[str, Dict[str, Set[str]]] = {}
+
+    def sync(self, items: Iterable[Tuple[str, Any]], to_row: Callable[[str, Any], Optional[Dict[str, Any]]]) -> None:
+        """
+        items: (row id, source). A row is re-derived with to_row only when its source
+        is neither the object nor equal to the value it was last derived from.
+        to_row may return None to leave the item out (e.g. an unreadable file).
+        """
+        items = list(items)
+
+        def same(old: Any, obj: Any) -> bool:
+            return old is obj or (old is not _MISSING and old == obj)
+
+        with self._lock:
+            src = self._src
+            if len(items) == len(src) and all(same(src.get(rid, _MISSING), obj) for rid, obj in items):
+                record_cache(f"list:{self.name}", True)
+                return
+            record_cache(f"list:{self.name}", False)
+            rows: Dict[str, Dict[str, Any]] = {}
+            new_src: Dict[str, Any] = {}
+            for rid, obj in items:
+                row = self._rows.get(rid) if same(src.get(rid, _MISSING), obj) else to_row(rid, obj)
+                if row is not None:
+                    rows[rid] = row
+                new_src[rid] = obj
+            facets: Dict[str, Dict[str, Set[str]]] = {}
+            for fname, fn in self.facet_fns.items():
+                by_value: Dict[str, Set[str]] = {}
+                for rid, row in rows.items():
+                    values = fn(row)
+                    if values is None:
+                        continue
+                    if not isinstance(values, (list, tuple, set)):
+                        values = [values]
+                    for v in values:
+                        if v is not None and str(v).strip():
+                            by_value.setdefault(_norm(v), set()).add(rid)
+                facets[fname] = by_value
+            self._src, self._rows, self._facets, self._views = new_src, rows, facets, {}
+
+    def _view(self, sort: str) -> List[Tuple[Any, str]]:
+        # called with the lock held
+        view = self._views.get(sort)
+        if view is None:
+            fn = self.sorts[sort]
+            view = sorted((fn(row), rid) for rid, row in self._rows.items())
+            self._views[sort] = view
+        return view
+
+    def query(self, sort: str, descending: bool = False,
+              filters: Optional[Dict[str, Any]] = None,
+              where: Optional[Callable[[Dict[str, Any]], bool]] = None,
+              limit: Optional[int] = None, cursor: Optional[str] = None,
+              fields: Optional[List[str]] = None) -> Page:
+        """
+        One page in sort order. filters: facet -> value (None values are ignored);
+        where: extra predicate (ranges). limit=None returns every matching row.
+        """
+        if sort not in self.sorts:
+            raise BadQuery(f"Unknown sort '{sort}'; one of: {', '.join(self.sorts)}")
+        if fields:
+            unknown = [f for f in fields if f not in self.fields]
+            if unknown:
+                raise BadQuery(f"Unknown field(s) {', '.join(unknown)}; one of: {', '.join(self.fields)}")
+        filters = {k: v for k, v in (filters or {}).items() if v is not None and str(v).strip()}
+        for k in filters:
+            if k not in self.facet_fns:
+                raise BadQuery(f"Unknown filter '{k}'")
+        if limit is not None and not 1 <= limit <= LIST_MAX_LIMIT:
+            raise BadQuery(f"limit must be between 1 and {LIST_MAX_LIMIT}")
+        after = _decode_cursor(cursor, sort, descending) if cursor else None
+
+        with self._lock:
+            rows, view = self._rows, self._view(sort)
+            match: Optional[Set[str]] = None
+            for k, v in sorted(filters.items(), key=lambda kv: len(self._facets[kv[0]].get(_norm(kv[1]), ()))):
+                ids = self._facets[k].get(_norm(v), set())
+                match = set(ids) if match is None else match & ids
+                if not match:
+                    break
+        if where is not None:
+            match = {rid for rid in (rows if match is None else match) if where(rows[rid])}
+        total = len(rows) if match is None else len(match)
+
+        try:
+            if descending:
+                end = len(view) if after is None else bisect_left(view, after)
+                walk = (view[i] for i in range(end - 1, -1, -1))
+            else:
+                start = 0 if after is None else bisect_right(view, after)
+                walk = (view[i] for i in range(start, len(view)))
+        except TypeError:
+            raise BadQuery("Malformed cursor")
+
+        picked: List[Tuple[Any, str]] = []
+        want = None if limit is None else limit + 1
+        if match is None or match:
+            for entry in walk:
+                if match is None or entry[1] in match:
+                    picked.append(entry)
+                    if want is not None and len(picked) == want:
+                        break
+        next_cursor = None
+        if want is not None and len(picked) == want:
+            picked.pop()
+            next_cursor = _encode_cursor(sort, descending, *picked[-1])
+
+        if fields:
+            items = [{f: rows[rid].get(f) for f in fields} for _, rid in picked]
+        else:
+            items = [rows[rid] for _, rid in picked]
+        return Page(items=items, total=total, next_cursor=next_cursor, fields=fields)
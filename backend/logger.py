@@ -1,7 +1,31 @@
+import atexit
+import copy
+import json
 import os
+import queue
 import re
+import threading
+import time
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+
+# Defaults for every SimpleAppLogger; constructor arguments win over these.
+#   LOG_MODE=queued|sync      queued: a listener thread does the file I/O (default)
+#   LOG_FORMAT=text|json      json: one structured object per line
+#   LOG_RATE_LIMIT=<float>    max INFO/DEBUG records per second per call site
+#   LOG_SAMPLE_RATE=<0..1>    fraction of INFO/DEBUG records kept per call site (0 = none)
+LOG_MODE = os.environ.get("LOG_MODE", "queued").lower()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "text").lower()
+LOG_RATE_LIMIT = os.environ.get("LOG_RATE_LIMIT")
+LOG_SAMPLE_RATE = os.environ.get("LOG_SAMPLE_RATE")
+
+TEXT_FMT = "%(asctime)s - (%(name)s - %(filename)s:%(funcName)s) - [%(levelname)s] - %(message)s"
+
+# one listener per log file, shared by every logger writing to it
+_listeners = {}
+_listeners_lock = threading.Lock()
+
 
 def _normalize_level(level):
     """
@@ -20,20 +44,146 @@ def _normalize_level(level):
         raise ValueError(f"Invalid logging level number: {level}")
     raise TypeError(f"Level must be str or int, got {type(level).__name__}")
 
+
+class TextFormatter(logging.Formatter):
+    """TEXT_FMT lines; a record that follows sampling drops ends with "[+N similar suppressed]"."""
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        s = super().formatMessage(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{s} [+{suppressed} similar suppressed]" if suppressed else s
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, src, msg (+ suppressed / exc when present)."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        obj = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "src": f"{record.filename}:{record.funcName}:{record.lineno}",
+            "msg": record.getMessage(),
+        }
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            obj["suppressed"] = suppressed
+        exc = record.exc_text or (self.formatException(record.exc_info) if record.exc_info else None)
+        if exc:
+            obj["exc"] = exc
+        return json.dumps(obj, ensure_ascii=False)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    Enqueues the record with its message merged and its traceback rendered to exc_text,
+    but unformatted: the stock prepare() runs a default Formatter first, which folds the
+    traceback into msg and leaves the file handler's formatter nothing to put in "exc".
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None  # don't keep the frames alive in the queue
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Per call site (file:line) token bucket + every-Nth sampling for INFO and below.
+    WARNING and above always pass. The next record that passes after drops carries
+    the number of suppressed records so the log still says something was skipped.
+    The alignment pipelines cap their per-pair INFO lines this way (rate_limit=5), so
+    a 1,000-pair run keeps a bounded log. sample_rate=0 drops every INFO/DEBUG record.
+    """
+
+    def __init__(self, rate_limit=None, sample_rate=None):
+        super().__init__()
+        self.rate = float(rate_limit) if rate_limit else None
+        self.burst = max(1.0, 2 * self.rate) if self.rate else None
+        rate = float(sample_rate) if sample_rate not in (None, "") else 1.0
+        if not 0 <= rate <= 1:
+            raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate!r}")
+        # every=0: keep none
+        self.every = 0 if rate == 0 else max(1, int(round(1.0 / rate)))
+        self._sites = {}  # (pathname, lineno) -> [tokens, last_ts, seen, dropped]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                site = self._sites[key] = [self.burst or 0.0, now, 0, 0]
+            site[2] += 1
+            keep = self.every > 0 and (site[2] - 1) % self.every == 0
+            if keep and self.rate:
+                site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+                site[1] = now
+                if site[0] >= 1.0:
+                    site[0] -= 1.0
+                else:
+                    keep = False
+            if not keep:
+                site[3] += 1
+                return False
+            dropped, site[3] = site[3], 0
+        if dropped:
+            record.suppressed = dropped  # rendered by TextFormatter / JsonFormatter
+        return True
+
+
+def _stop_listeners():
+    with _listeners_lock:
+        for listener in _listeners.values():
+            try:
+                listener.stop()  # drains the queue before returning
+            except Exception:
+                pass
+        _listeners.clear()
+
+
+atexit.register(_stop_listeners)
+
+
 class SimpleAppLogger:
-    def __init__(self, dir: str, name: str, level):
+    def __init__(self, dir: str, name: str, level, mode=None, fmt=None, rate_limit=None, sample_rate=None):
         """
         Logs to {dir}/{name}.{pid}.log rotated nightly; keeps 10 backups.
         Per-process files avoid Windows rename/lock conflicts.
+        mode/fmt/rate_limit/sample_rate default to the LOG_* environment settings above.
         """
         self.name = name
         self.level = _normalize_level(level)  # <-- strict validation here
+        self.mode = (mode or LOG_MODE).lower()
+        self.fmt = (fmt or LOG_FORMAT).lower()
+        self.rate_limit = rate_limit if rate_limit is not None else LOG_RATE_LIMIT
+        self.sample_rate = sample_rate if sample_rate is not None else LOG_SAMPLE_RATE
+        if self.mode not in ("sync", "queued"):
+            raise ValueError(f"Invalid log mode: {self.mode!r}")
         dir = os.path.abspath(dir)
         os.makedirs(dir, exist_ok=True)
 
         pid = os.getpid()
         self.file_path = os.path.join(dir, f"{name}.{pid}.log")
 
+    def _file_handler(self) -> logging.Handler:
+        handler = TimedRotatingFileHandler(
+            self.file_path, when="midnight", interval=1, backupCount=10,
+            encoding="utf-8", delay=True
+        )
+        handler.suffix = "%Y-%m-%d"
+        handler.extMatch = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+        handler.setFormatter(JsonFormatter() if self.fmt == "json" else TextFormatter(TEXT_FMT))
+        return handler
+
     def get_logger(self) -> logging.Logger:
         logger = logging.getLogger(self.name)   # don't touch root
         logger.setLevel(self.level)
@@ -42,17 +192,23 @@ class SimpleAppLogger:
         # Avoid duplicate handlers if called multiple times
         abs_path = os.path.abspath(self.file_path)
         for h in logger.handlers:
-            if isinstance(h, TimedRotatingFileHandler) and getattr(h, "baseFilename", "") == abs_path:
+            if getattr(h, "baseFilename", "") == abs_path or getattr(h, "target_path", "") == abs_path:
                 return logger
 
-        handler = TimedRotatingFileHandler(
-            self.file_path, when="midnight", interval=1, backupCount=10,
-            encoding="utf-8", delay=True
-        )
-        handler.suffix = "%Y-%m-%d"
-        handler.extMatch = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+        if (self.rate_limit or self.sample_rate not in (None, "")) and not any(isinstance(f, SamplingFilter) for f in logger.filters):
+            logger.addFilter(SamplingFilter(self.rate_limit, self.sample_rate))
+
+        if self.mode == "sync":
+            logger.addHandler(self._file_handler())
+            return logger
 
-        fmt = "%(asctime)s - (%(name)s - %(filename)s:%(funcName)s) - [%(levelname)s] - %(message)s"
-        handler.setFormatter(logging.Formatter(fmt))
+        with _listeners_lock:
+            listener = _listeners.get(abs_path)
+            if listener is None:
+                listener = QueueListener(queue.SimpleQueue(), self._file_handler(), respect_handler_level=True)
+                listener.start()
+                _listeners[abs_path] = listener
+        handler = _QueueHandler(listener.queue)
+        handler.target_path = abs_path
         logger.addHandler(handler)
         return logger
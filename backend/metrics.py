@@ -0,0 +1,289 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format (served at /metrics).
+Dependency-free on purpose: counters, gauges and histograms keyed by label tuples, all
+thread-safe so the pipeline worker threads and the API event loop can record concurrently.
+"""
+
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Timer:
+    """Context manager / decorator that observes elapsed seconds into a histogram."""
+
+    def __init__(self, hist: "Histogram", labels: Dict[str, str]):
+        self.hist = hist
+        self.labels = labels
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self._t0, **self.labels)
+        return False
+
+    def __call__(self, fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with _Timer(self.hist, self.labels):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, doc, labelnames=()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, doc, labelnames=()):
+        super().__init__(name, doc, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], Dict[Tuple[str, ...], float]]) -> None:
+        """Compute values at scrape time: fn() -> {label_values_tuple: value}."""
+        self._callback = fn
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        if self._callback is not None:
+            try:
+                values.update(self._callback())
+            except Exception:
+                pass
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, le in enumerate(self.buckets):
+                if value <= le:
+                    row[i] += 1
+                    break
+            row[-2] += value
+            row[-1] += 1
+
+    def time(self, **labels) -> _Timer:
+        """`with HIST.time(a="x"):` or `@HIST.time(a="x")`."""
+        self._key(labels)
+        return _Timer(self, labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for key, row in items:
+            cumulative = 0.0
+            for i, le in enumerate(self.buckets):
+                cumulative += row[i]
+                out.append(
+                    f"{self.name}_bucket{_fmt_labels(self.labelnames, key, ('le', _fmt_value(le)))} {_fmt_value(cumulative)}"
+                )
+            out.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(row[-2])}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {_fmt_value(row[-1])}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing  # module re-import (uvicorn --reload) keeps the first instance
+            self._metrics[metric.name] = metric
+            return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name: str, doc: str, labelnames: Iterable[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, doc, labelnames))
+
+
+def gauge(name: str, doc: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, doc, labelnames))
+
+
+def histogram(name: str, doc: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, doc, labelnames, buckets))
+
+
+# ---------- Application metrics ----------
+
+HTTP_REQUESTS = counter(
+    "instructive_http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status")
+)
+HTTP_LATENCY = histogram(
+    "instructive_http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route")
+)
+ALIGN_IN_FLIGHT = gauge("instructive_alignment_jobs_in_flight", "Alignment requests currently running.", ("kind",))
+ALIGN_DURATION = histogram(
+    "instructive_alignment_duration_seconds", "End-to-end alignment handler time.", ("kind", "outcome")
+)
+LLM_LATENCY = histogram("instructive_llm_call_duration_seconds", "run_llm call latency.", ("model", "outcome"))
+LLM_RETRIES = counter(
+    "instructive_llm_retries_total", "LLM calls repeated because the output did not parse.", ("pipeline",)
+)
+LLM_MODEL_LOAD = histogram(
+    "instructive_llm_model_warm_duration_seconds",
+    "Warm-up / keep-alive ping time per model (includes any cold load).",
+    ("host", "model", "outcome"),
+)
+LLM_MODEL_READY = gauge("instructive_llm_model_ready", "1 when the model answered its last warm-up.", ("host", "model"))
+LLM_HOST_REQUESTS = counter("instructive_llm_host_requests_total", "LLM calls per pool host.", ("host", "outcome"))
+LLM_HOST_INFLIGHT = gauge("instructive_llm_host_inflight", "LLM calls currently running per pool host.", ("host",))
+LLM_HOST_LIMIT = gauge("instructive_llm_host_concurrency_limit", "Current adaptive in-flight limit per pool host.", ("host",))
+LLM_QUEUE_DEPTH = gauge("instructive_llm_queue_depth", "LLM calls waiting for a free host slot.", ("priority",))
+LLM_QUEUE_WAIT = histogram(
+    "instructive_llm_queue_wait_seconds", "Time an LLM call waited for a host slot.", ("priority",)
+)
+LLM_HOST_HEALTHY = gauge("instructive_llm_host_healthy", "0 while a pool host is ejected.", ("host",))
+LLM_BREAKER_STATE = gauge("instructive_llm_breaker_state", "LLM circuit breaker: 0 closed, 0.5 half-open, 1 open.")
+LLM_FALLBACKS = counter(
+    "instructive_llm_fallback_verdicts_total", "Pairs answered without the LLM (source=cached|neutral).", ("pipeline", "source")
+)
+ALIGN_CANCELLED = counter("instructive_alignment_cancelled_total", "Alignment runs stopped early.", ("kind", "reason"))
+ALIGN_COALESCED = counter(
+    "instructive_alignment_coalesced_total",
+    "Work attached to an identical in-flight run (scope=request|pair).",
+    ("scope",),
+)
+PDF_EXTRACT_DURATION = histogram(
+    "instructive_pdf_extract_duration_seconds", "extract_text_from_pdf wall time per file.", ("pipeline",)
+)
+PDF_PAGE_DURATION = histogram(
+    "instructive_pdf_page_duration_seconds",
+    "Text extraction time per page (method=text|ocr).",
+    ("method",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+STORE_IO = histogram(
+    "instructive_store_io_duration_seconds",
+    "JSON store read/write latency.",
+    ("store", "op"),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+CACHE_REQUESTS = counter("instructive_cache_requests_total", "Cache lookups by outcome.", ("cache", "result"))
+CACHE_HIT_RATIO = gauge("instructive_cache_hit_ratio", "hits / (hits + misses) since process start.", ("cache",))
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _cache_ratios() -> Dict[Tuple[str, ...], float]:
+    totals: Dict[str, List[float]] = {}
+    for (cache, result), v in list(CACHE_REQUESTS._values.items()):
+        row = totals.setdefault(cache, [0.0, 0.0])
+        row[0 if result == "hit" else 1] += v
+    return {(c,): (h / (h + m) if (h + m) else 0.0) for c, (h, m) in totals.items()}
+
+
+CACHE_HIT_RATIO.set_function(_cache_ratios)
@@ -1,10 +1,15 @@
 from pathlib import Path
-from typing import Any, Dict, List, Tuple, Iterable
+from typing import Any, Callable, Dict, List, Optional, Tuple, Iterable
 
 from . import iep_alignment_pipeline
 from . import cc_alignment_pipeline
+from .checkpoint import CheckpointLog
+from .explanations import ALIGN_REUSE_VERDICTS, ALIGN_VERDICT_MAX_AGE_H, ExplanationStore, pair_key
+from .history import HistoryStore
+from .resilience import LLM_FALLBACK, CancelToken, Cancelled
+from .scheduler import Job
 
-__all__ = ["run_iep_alignment_selected"]
+__all__ = ["run_iep_alignment_selected", "run_cc_alignment_selected", "explain_iep_alignment", "ExplanationStore", "CancelToken", "Cancelled", "Job", "CheckpointLog", "HistoryStore"]
 
 def run_iep_alignment(iep_dir: str, worksheets_dir: str):
     """Run IEPs alignment scores on ALL students in iep_dir and ALL worksheets in worksheets_dir."""
@@ -20,10 +25,16 @@ def run_iep_alignment(iep_dir: str, worksheets_dir: str):
     return alignment_results
 
 
-def run_cc_alignment(cc_file: str, worksheets_dir: str, grade_band: str):
+def run_cc_alignment(
+    cc_file: str,
+    worksheets_dir: str,
+    grade_band: str,
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
+):
     """Run core competencies alignment scores on ALL worksheets in worksheets_dir."""
     alignment_results = cc_alignment_pipeline.run_pipeline(
-        cc_file, worksheets_dir, grade_band
+        cc_file, worksheets_dir, grade_band=grade_band, cancel=cancel, job=job
     )
     mat = alignment_results["matrix"]["matrix"]
     alignment_results["row_averages"] = [
@@ -36,6 +47,48 @@ def run_cc_alignment(cc_file: str, worksheets_dir: str, grade_band: str):
     return alignment_results
 
 
+def run_cc_alignment_selected(
+    cc_file: str,
+    selection: Dict[str, List[str]],
+    base_curriculum_dir: str,
+    grade_band: Optional[str] = None,
+    verdict_store: Optional[ExplanationStore] = None,
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+):
+    """
+    Core competency alignment for the worksheets of a { "<course>": ["<unit>", ...] } selection.
+      - grade_band: band key in cc_file (falls back to the first band)
+      - verdict_store: reuse/record verdicts per competency + worksheet text (meta.reused)
+      - cancel / job: as in run_iep_alignment_selected
+      - progress(done, total): called as pairs finish
+    Returns the run_cc_alignment() shape (row/column averages included).
+    """
+    cc_raw = cc_alignment_pipeline.safe_load_json_file(Path(cc_file))
+    competencies = cc_alignment_pipeline.normalize_competencies(cc_raw, grade_band=grade_band)
+    worksheets, worksheet_ids = _collect_worksheets_for_selection(Path(base_curriculum_dir), selection)
+    scored, reused = cc_alignment_pipeline.evaluate_pairs(
+        worksheets, worksheet_ids, competencies,
+        cancel=cancel, job=job, verdict_store=verdict_store, progress=progress,
+    )
+    payload = cc_alignment_pipeline.assemble_payload(cc_raw, competencies, worksheet_ids, scored)
+    if reused:
+        payload["meta"]["reused"] = reused
+
+    mat = payload["matrix"]["matrix"]
+    payload["row_averages"] = [round(sum(row) / len(row), 2) if row else 0 for row in mat]
+    payload["column_averages"] = (
+        [
+            round(sum(mat[r][c] for r in range(len(mat))) / len(mat), 2)
+            for c in range(len(mat[0]))
+        ]
+        if mat and mat[0]
+        else [0 for _ in competencies]
+    )
+    return payload
+
+
 # =========================
 # UNTESTED selection-based IEP
 # =========================
@@ -51,13 +104,12 @@ def _load_ieps_by_names(students_dir: Path, names: Iterable[str]):
         if p.name.lower() == "index.json":
             continue
         try:
-            raw = iep_alignment_pipeline.safe_load_json_file(p)
+            profile = iep_alignment_pipeline.load_student_profile(p)
         except Exception:
             continue
-        stu = (raw.get("student", {}) or {})
-        sname = str(stu.get("student_name", "")).strip()
+        sname = str((profile.meta or {}).get("student_name", "")).strip()
         if sname.lower() in want:
-            profiles.append(iep_alignment_pipeline.normalize_iep(raw))
+            profiles.append(profile)
     return profiles
 
 
@@ -107,11 +159,94 @@ def _collect_worksheets_from_paths(paths: List[str]):
     return merged, ordered_ids
 
 
+def _cached_verdict(explanation_store: Optional[ExplanationStore]):
+    """evaluate_pairs fallback: the last recorded verdict for the same inputs, if any."""
+
+    def fn(wid: str, student, text: str):
+        rec = explanation_store.get(pair_key(student, text)) if explanation_store is not None else None
+        if not rec or not rec.get("scores"):
+            return None
+        return dict(rec["scores"], explanation=rec.get("explanation") or "", fallback="cached")
+
+    return fn
+
+
+def _stored_verdict(explanation_store: ExplanationStore, max_age_s: Optional[float], hits: set):
+    """evaluate_pairs reuse: a fresh stored verdict (keys served are added to hits)."""
+
+    def fn(key: str, scores_only: bool):
+        verdict = explanation_store.fresh(key, scores_only, max_age_s)
+        if verdict is not None:
+            hits.add(key)
+        return verdict
+
+    return fn
+
+
+def _evaluate_and_record(
+    worksheets: Dict[str, Dict],
+    worksheet_ids: List[str],
+    students: List,
+    scores_only: bool,
+    explanation_store: Optional[ExplanationStore],
+    cancel: Optional[CancelToken],
+    job: Optional[Job] = None,
+    checkpoint: Optional[CheckpointLog] = None,
+    reuse_max_age_s: Optional[float] = None,
+):
+    """
+    Run every pair, record fresh verdicts in the store (fallbacks and reused verdicts
+    are not recorded). With ALIGN_REUSE_VERDICTS, pairs the store already has a verdict
+    for (recorded within reuse_max_age_s; None = ALIGN_VERDICT_MAX_AGE_H) skip the LLM.
+    Returns (results_overall, full_results, fallback_counts, reused_count).
+    """
+    results_overall: Dict[str, Dict[str, int]] = {wid: {} for wid in worksheet_ids}
+    full_results: Dict[str, Dict[str, Dict[str, Any]]] = {wid: {} for wid in worksheet_ids}
+    fallbacks: Dict[str, int] = {}
+    reused: set = set()
+    reuse = None
+    if explanation_store is not None and ALIGN_REUSE_VERDICTS:
+        if reuse_max_age_s is None:
+            reuse_max_age_s = ALIGN_VERDICT_MAX_AGE_H * 3600
+        reuse = _stored_verdict(explanation_store, reuse_max_age_s, reused)
+
+    verdicts = []
+    for wid, s, eval_result in iep_alignment_pipeline.evaluate_pairs(
+        worksheets,
+        worksheet_ids,
+        students,
+        scores_only=scores_only,
+        cancel=cancel,
+        fallback=_cached_verdict(explanation_store) if LLM_FALLBACK else None,
+        job=job,
+        checkpoint=checkpoint,
+        reuse=reuse,
+    ):
+        results_overall[wid][s.student_name] = int(eval_result["overall_alignment"])
+        full_results[wid][s.student_name] = eval_result
+        source = eval_result.get("fallback")
+        if source:
+            fallbacks[source] = fallbacks.get(source, 0) + 1
+            continue
+        key = pair_key(s, worksheets[wid].get("text") or "")
+        if key not in reused:
+            verdicts.append((key, wid, s.student_name, eval_result))
+    if explanation_store is not None and verdicts:
+        explanation_store.record_verdicts(verdicts)
+    return results_overall, full_results, fallbacks, len(reused)
+
+
 def run_iep_alignment_selected(
     student_names: List[str],
     base_students_dir: str,
     selection: Dict[str, List[str]],
     base_curriculum_dir: str,
+    scores_only: bool = False,
+    explanation_store: Optional[ExplanationStore] = None,
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
+    checkpoint: Optional[CheckpointLog] = None,
+    reuse_max_age_s: Optional[float] = None,
 ):
     """
     Run alignment for an explicit subset:
@@ -119,7 +254,17 @@ def run_iep_alignment_selected(
       - selection: { "<course>": ["<unit>", ...], ... }
       - base_students_dir: path to /data/students
       - base_curriculum_dir: path to /data/curriculum
-
+      - scores_only: numeric verdicts only (explanations are "", see explain_iep_alignment)
+      - explanation_store: if given, every pair's verdict is recorded there
+      - cancel: CancelToken checked between pairs; raises Cancelled once it fires
+      - job: scheduling class + user for the LLM queue (scheduler.Job; default batch)
+      - checkpoint: CheckpointLog for this run; finished pairs are appended as they land
+        and pairs already in it are skipped (the caller completes/removes it)
+      - reuse_max_age_s: with a store, pairs whose stored verdict is younger than this are
+        not re-scored (None = ALIGN_VERDICT_MAX_AGE_H, 0 = any age); meta.reused counts them
+
+    With LLM_FALLBACK on, pairs the LLM cannot answer reuse the stored verdict (or a
+    neutral placeholder) and meta.fallback counts them by source.
     Returns the same JSON shape as run_iep_alignment() with row/column averages added.
     """
     students_dir = Path(base_students_dir)
@@ -149,18 +294,10 @@ def run_iep_alignment_selected(
         }
 
     # 3) Evaluate pairs (same logic as pipeline.run_pipeline but filtered)
-    results_overall: Dict[str, Dict[str, int]] = {wid: {} for wid in worksheet_ids}
-    full_results: Dict[str, Dict[str, Dict[str, Any]]] = {wid: {} for wid in worksheet_ids}
-
-    for wid in worksheet_ids:
-        wtext = worksheets[wid].get("text") or ""
-        wtitle = worksheets[wid].get("title") or ""
-        for s in students:
-            eval_result = iep_alignment_pipeline.evaluate_alignment_for_pair(
-                s, wtext, worksheet_id=wid, worksheet_title=wtitle
-            )
-            results_overall[wid][s.student_name] = int(eval_result["overall_alignment"])
-            full_results[wid][s.student_name] = eval_result
+    results_overall, full_results, fallbacks, reused = _evaluate_and_record(
+        worksheets, worksheet_ids, students, scores_only, explanation_store, cancel, job, checkpoint,
+        reuse_max_age_s,
+    )
 
     matrix_json = iep_alignment_pipeline.assemble_score_matrix(
         results_overall, student_labels, worksheet_ids
@@ -171,6 +308,11 @@ def run_iep_alignment_selected(
         "matrix": matrix_json,
         "details": full_results,
     }
+    if fallbacks:
+        # {"cached": n, "neutral": m}: pairs answered without the LLM
+        payload["meta"]["fallback"] = fallbacks
+    if reused:
+        payload["meta"]["reused"] = reused  # pairs served from the verdict store
 
     # Averages
     mat = payload["matrix"]["matrix"]
@@ -190,11 +332,19 @@ def run_iep_alignment_selected(
 def run_iep_alignment_by_files(
     student_json_files: List[str],
     worksheet_paths: List[str],
+    scores_only: bool = False,
+    explanation_store: Optional[ExplanationStore] = None,
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
+    checkpoint: Optional[CheckpointLog] = None,
+    reuse_max_age_s: Optional[float] = None,
 ):
     """
     Lower-level variant:
       - student_json_files: explicit list of student .json files
       - worksheet_paths: list of files/dirs to include (merged)
+      - scores_only / explanation_store / cancel / job / checkpoint / reuse_max_age_s:
+        as in run_iep_alignment_selected
 
     Returns the same shape as other functions.
     """
@@ -202,8 +352,7 @@ def run_iep_alignment_by_files(
     students = []
     for p in student_json_files or []:
         try:
-            raw = iep_alignment_pipeline.safe_load_json_file(Path(p))
-            students.append(iep_alignment_pipeline.normalize_iep(raw))
+            students.append(iep_alignment_pipeline.load_student_profile(Path(p)))
         except Exception:
             continue
     if not students:
@@ -228,18 +377,10 @@ def run_iep_alignment_by_files(
         }
 
     # Evaluate
-    results_overall: Dict[str, Dict[str, int]] = {wid: {} for wid in worksheet_ids}
-    full_results: Dict[str, Dict[str, Dict[str, Any]]] = {wid: {} for wid in worksheet_ids}
-
-    for wid in worksheet_ids:
-        wtext = worksheets[wid].get("text") or ""
-        wtitle = worksheets[wid].get("title") or ""
-        for s in students:
-            eval_result = iep_alignment_pipeline.evaluate_alignment_for_pair(
-                s, wtext, worksheet_id=wid, worksheet_title=wtitle
-            )
-            results_overall[wid][s.student_name] = int(eval_result["overall_alignment"])
-            full_results[wid][s.student_name] = eval_result
+    results_overall, full_results, fallbacks, reused = _evaluate_and_record(
+        worksheets, worksheet_ids, students, scores_only, explanation_store, cancel, job, checkpoint,
+        reuse_max_age_s,
+    )
 
     matrix_json = iep_alignment_pipeline.assemble_score_matrix(
         results_overall, student_labels, worksheet_ids
@@ -250,6 +391,11 @@ def run_iep_alignment_by_files(
         "matrix": matrix_json,
         "details": full_results,
     }
+    if fallbacks:
+        # {"cached": n, "neutral": m}: pairs answered without the LLM
+        payload["meta"]["fallback"] = fallbacks
+    if reused:
+        payload["meta"]["reused"] = reused  # pairs served from the verdict store
 
     # Averages
     mat = payload["matrix"]["matrix"]
@@ -264,3 +410,51 @@ def run_iep_alignment_by_files(
     )
 
     return payload
+
+
+def explain_iep_alignment(
+    student_name: str,
+    base_students_dir: str,
+    worksheet_path: str,
+    explanation_store: Optional[ExplanationStore] = None,
+    job: Optional[Job] = None,
+):
+    """
+    Explanation for one worksheet x student pair, generated on first request.
+      - reuses a cached explanation when the store has one for the same inputs
+      - otherwise explains the scores recorded by the last run (scores-only runs),
+        or produces a full verdict if the pair was never scored
+    Returns {"worksheet", "student", "scores", "explanation", "cached"} or None
+    if the student or the worksheet cannot be found.
+    """
+    students = _load_ieps_by_names(Path(base_students_dir), [student_name])
+    worksheets = iep_alignment_pipeline.collect_worksheets_texts(Path(worksheet_path))
+    if not students or not worksheets:
+        return None
+    student = students[0]
+    wid, ws = next(iter(worksheets.items()))
+    wtext = ws.get("text") or ""
+    key = pair_key(student, wtext)
+
+    rec = explanation_store.get(key) if explanation_store is not None else None
+    if rec and rec.get("explanation"):
+        return {
+            "worksheet": wid,
+            "student": student.student_name,
+            "scores": rec.get("scores") or {},
+            "explanation": rec["explanation"],
+            "cached": True,
+        }
+
+    verdict = iep_alignment_pipeline.explain_alignment_for_pair(
+        student, wtext, wid, ws.get("title") or "", scores=(rec or {}).get("scores"), job=job
+    )
+    if explanation_store is not None:
+        explanation_store.record_verdicts([(key, wid, student.student_name, verdict)])
+    return {
+        "worksheet": wid,
+        "student": student.student_name,
+        "scores": {k: v for k, v in verdict.items() if k != "explanation"},
+        "explanation": verdict.get("explanation", ""),
+        "cached": False,
+    }
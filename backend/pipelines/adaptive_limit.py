@@ -0,0 +1,83 @@
+"""
+adaptive_limit.py
+AIMD concurrency limit for one LLM host.
+- additive increase: +1 slot per "window" of successful calls while the host is saturated
+  and latency stays within `tolerance` x its no-load baseline
+- multiplicative decrease: x`latency_backoff` when latency inflates past the tolerance
+  (requests are queueing inside the model server), x`error_backoff` on errors/timeouts
+- at most one decrease per baseline-latency window, so one slow burst does not collapse it
+- baseline: minimum observed latency; calls that ran alone (no queueing) pull it up slowly,
+  so a change in prompt size or model does not pin it forever
+
+Config (env):
+  LLM_ADAPTIVE=1                set to 0 to pin every host at its initial limit
+  LLM_AIMD_TOLERANCE=2.0        latency / baseline ratio treated as congestion
+  LLM_AIMD_LATENCY_BACKOFF=0.9
+  LLM_AIMD_ERROR_BACKOFF=0.5
+"""
+
+import os
+import threading
+import time
+
+LLM_ADAPTIVE = os.environ.get("LLM_ADAPTIVE", "1").lower() not in ("0", "false", "no")
+LLM_AIMD_TOLERANCE = float(os.environ.get("LLM_AIMD_TOLERANCE", "2.0"))
+LLM_AIMD_LATENCY_BACKOFF = float(os.environ.get("LLM_AIMD_LATENCY_BACKOFF", "0.9"))
+LLM_AIMD_ERROR_BACKOFF = float(os.environ.get("LLM_AIMD_ERROR_BACKOFF", "0.5"))
+
+
+class AdaptiveLimit:
+    def __init__(
+        self,
+        initial: int = 1,
+        min_limit: int = 1,
+        max_limit: int = 4,
+        tolerance: float = LLM_AIMD_TOLERANCE,
+        latency_backoff: float = LLM_AIMD_LATENCY_BACKOFF,
+        error_backoff: float = LLM_AIMD_ERROR_BACKOFF,
+        enabled: bool = LLM_ADAPTIVE,
+    ):
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self._limit = float(min(self.max_limit, max(self.min_limit, initial)))
+        self.tolerance = tolerance
+        self.latency_backoff = latency_backoff
+        self.error_backoff = error_backoff
+        self.enabled = enabled
+        self.baseline_s = 0.0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def _decrease(self, factor: float, now: float) -> None:
+        # one decrease per window: the calls already in flight saw the same congestion
+        if now - self._last_decrease < max(self.baseline_s, 0.05):
+            return
+        self._limit = max(float(self.min_limit), self._limit * factor)
+        self._last_decrease = now
+
+    def on_success(self, latency_s: float, inflight: int) -> None:
+        """inflight: calls that were running when this one finished (including itself)."""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self.baseline_s <= 0 or latency_s < self.baseline_s:
+                self.baseline_s = latency_s
+            elif inflight <= 1:
+                # only unloaded calls may raise the baseline; loaded ones include queueing
+                self.baseline_s += (latency_s - self.baseline_s) * 0.05
+            if latency_s > self.baseline_s * self.tolerance:
+                self._decrease(self.latency_backoff, now)
+            elif inflight >= self.limit:
+                # only grow while the current limit is actually used
+                self._limit = min(float(self.max_limit), self._limit + 1.0 / self._limit)
+
+    def on_error(self) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._decrease(self.error_backoff, time.monotonic())
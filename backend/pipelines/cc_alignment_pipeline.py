@@ -21,12 +21,12 @@ import argparse
 import json
 import os
 import re
+import time
 import logging
+import threading
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import Dict, List, Any, Tuple, Optional
-
-from tqdm import tqdm
+from typing import Callable, Dict, List, Any, Tuple, Optional
 
 # PDF & OCR libs
 from PyPDF2 import PdfReader
@@ -34,8 +34,14 @@ from pdf2image import convert_from_path
 import pytesseract
 from PIL import Image
 
-from .llm import run_llm
+from .explanations import ALIGN_REUSE_VERDICTS, ExplanationStore, competency_key
+from .llm import LLM_MAX_ATTEMPTS, VerdictParseError, run_llm, score_schema
+from .llm_pool import POOL
+from .resilience import CancelToken
+from .scheduler import Job
+from .textcache import cached_text
 from logger import SimpleAppLogger
+from metrics import LLM_FALLBACKS, LLM_RETRIES, PDF_EXTRACT_DURATION, PDF_PAGE_DURATION
 
 # ---------- Configuration / Schema ----------
 
@@ -46,7 +52,7 @@ LOG_DIR = BASE_DIR / "logs"
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 logging.getLogger("httpx").setLevel(logging.ERROR)
 logger = SimpleAppLogger(
-    str(LOG_DIR), "cc_alignment_pipeline", logging.INFO
+    str(LOG_DIR), "cc_alignment_pipeline", logging.INFO, rate_limit=5
 ).get_logger()
 
 # Strict response schema expected from model (keys and types)
@@ -54,6 +60,8 @@ CC_EXPECTED_KEYS = [
     "alignment",  # integer 0-100
     "explanation",  # short string
 ]
+# JSON schema passed to the model as `format` (constrained decoding)
+CC_VERDICT_SCHEMA = score_schema(["alignment"], ["explanation"])
 
 
 def safe_load_json_file(path: Path) -> Dict:
@@ -75,10 +83,12 @@ def extract_text_from_searchable_pdf(path: Path) -> str:
     try:
         reader = PdfReader(str(path))
         for p in reader.pages:
+            t0 = time.perf_counter()
             try:
                 txt = p.extract_text() or ""
             except Exception:
                 txt = ""
+            PDF_PAGE_DURATION.observe(time.perf_counter() - t0, method="text")
             text_chunks.append(txt)
     except Exception as e:
         logger.warning(f"PyPDF2 failed for {path}: {e}")
@@ -89,17 +99,23 @@ def ocr_pdf(path: Path, dpi=300, pages_limit=None) -> str:
     """Perform OCR using pdf2image + pytesseract."""
     text_chunks = []
     try:
+        t0 = time.perf_counter()
         images = convert_from_path(str(path), dpi=dpi)
         if pages_limit:
             images = images[:pages_limit]
+        # rasterizing happens for all pages at once; spread it evenly across pages
+        render_per_page = (time.perf_counter() - t0) / max(1, len(images))
         for img in images:
+            t1 = time.perf_counter()
             txt = pytesseract.image_to_string(img)
+            PDF_PAGE_DURATION.observe(render_per_page + time.perf_counter() - t1, method="ocr")
             text_chunks.append(txt)
     except Exception as e:
         logger.warning(f"OCR failed for {path}: {e}")
     return "\n".join(text_chunks).strip()
 
 
+@PDF_EXTRACT_DURATION.time(pipeline="cc")
 def extract_text_from_pdf(path: Path, ocr_if_empty=True, pages_limit=None) -> str:
     text = extract_text_from_searchable_pdf(path)
     if (not text or len(text) < 50) and ocr_if_empty:
@@ -339,28 +355,44 @@ def evaluate_alignment_for_pair(
     worksheet_text: str,
     worksheet_id: str,
     worksheet_title: str = "",
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
 ) -> Dict:
     prompt = compile_alignment_prompt(
         competency, worksheet_text, worksheet_id, worksheet_title
     )
-    raw_output = run_llm(prompt=prompt)
-
-    parsed, raw_json = extract_json_from_text(raw_output or "")
-    if not parsed:
-        logger.warning(
-            f"Failed to extract JSON from LLM for {worksheet_id} x {competency.competency_id}. Raw: {str(raw_output)[:160]}"
+    parsed = None
+    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+        if attempt > 1:
+            LLM_RETRIES.inc(pipeline="cc")
+        raw_output = run_llm(
+            prompt=prompt,
+            format=CC_VERDICT_SCHEMA,
+            tags={
+                "pipeline": "cc",
+                "worksheet": worksheet_id,
+                "competency": competency.competency_id,
+                "attempt": attempt,
+            },
+            cancel=cancel,
+            job=job,
         )
-        parsed = None
-
-    if parsed is None or set(parsed.keys()) != set(CC_EXPECTED_KEYS):
-        normalized = evaluate_alignment_for_pair(
-            competency, worksheet_text, worksheet_id, worksheet_title
+        parsed, raw_json = extract_json_from_text(raw_output or "")
+        if parsed and set(CC_EXPECTED_KEYS) <= set(parsed.keys()):
+            break
+        logger.warning(
+            f"Failed to extract JSON from LLM for {worksheet_id} x {competency.competency_id} "
+            f"(attempt {attempt}/{LLM_MAX_ATTEMPTS}). Raw: {str(raw_output)[:160]}"
         )
     else:
-        normalized = enforce_cc_schema_and_normalize(parsed)
+        raise VerdictParseError(
+            f"No parseable verdict for {worksheet_id} x {competency.competency_id} "
+            f"after {LLM_MAX_ATTEMPTS} attempts"
+        )
+
+    normalized = enforce_cc_schema_and_normalize(parsed)
     logger.info(
-        f"LLM Output [{worksheet_title} x {competency.title}]: "
-        f"{json.dumps(normalized, ensure_ascii=False)}"
+        "LLM Output [%s x %s]: %s", worksheet_title, competency.title, normalized
     )
     return normalized
 
@@ -385,7 +417,7 @@ def collect_worksheets_texts(worksheets_dir: Path) -> Dict[str, Dict]:
         worksheet_id = f"{fname}".strip("_")
         title = fname
         try:
-            text = extract_text_from_file(worksheets_dir)
+            text = cached_text(worksheets_dir, extract_text_from_file)
             if not text:
                 logger.warning(f"No text found in {worksheets_dir}")
         except Exception as e:
@@ -411,7 +443,7 @@ def collect_worksheets_texts(worksheets_dir: Path) -> Dict[str, Dict]:
             worksheet_id = f"{rel.as_posix().replace('/', '_')}_{fname}".strip("_")
             title = fname
             try:
-                text = extract_text_from_file(fpath)
+                text = cached_text(fpath, extract_text_from_file)
                 if not text:
                     logger.warning(f"No text found in {fpath}")
             except Exception as e:
@@ -443,6 +475,130 @@ def assemble_score_matrix(
     return {"competencies": competencies, "worksheets": worksheets, "matrix": matrix}
 
 
+# ---------- Pair evaluation ----------
+
+# fresh verdicts are written to the verdict store every this many pairs
+VERDICT_RECORD_BATCH = 16
+
+
+def neutral_verdict() -> Dict:
+    """Placeholder for a pair the LLM answered but never in a parseable form."""
+    return {"alignment": 50, "explanation": "", "fallback": "neutral"}
+
+
+def evaluate_pairs(
+    worksheets: Dict[str, Dict],
+    worksheet_ids: List[str],
+    competencies: List[Competency],
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
+    verdict_store: Optional[ExplanationStore] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[List[Tuple[str, Competency, Dict]], int]:
+    """
+    Score every (worksheet, competency) pair, worksheet-major, concurrently up to the
+    LLM pool's capacity. Returns ([(worksheet_id, competency, verdict), ...], reused).
+
+    verdict_store: a stored verdict for the same competency + worksheet text is reused
+    (ALIGN_REUSE_VERDICTS); fresh verdicts are recorded there every VERDICT_RECORD_BATCH
+    pairs and once more when the run ends, also when it fails part-way.
+    A pair whose replies never parse gets neutral_verdict(), which is not recorded.
+    progress(done, total): called as pairs finish (from worker threads).
+    """
+    pairs = [(wid, comp) for wid in worksheet_ids for comp in competencies]
+    total = len(pairs)
+    if job is not None:
+        job.add_pairs(total)
+    lock = threading.Lock()
+    counts = {"done": 0, "reused": 0}
+    fresh: List[Tuple[str, str, str, Dict]] = []
+
+    def _flush(min_size: int = 1) -> None:
+        with lock:
+            if len(fresh) < min_size:
+                return
+            batch = fresh[:]
+            del fresh[:]
+        verdict_store.record_verdicts(batch)
+
+    def _one(pair):
+        wid, comp = pair
+        text = worksheets[wid].get("text") or ""
+        try:
+            key = competency_key(comp, text) if verdict_store is not None else None
+            verdict = verdict_store.fresh(key, scores_only=False) if key and ALIGN_REUSE_VERDICTS else None
+            if verdict is not None:
+                with lock:
+                    counts["reused"] += 1
+            else:
+                try:
+                    verdict = evaluate_alignment_for_pair(
+                        comp,
+                        text,
+                        worksheet_id=wid,
+                        worksheet_title=worksheets[wid].get("title") or "",
+                        cancel=cancel,
+                        job=job,
+                    )
+                except VerdictParseError as e:
+                    logger.error(f"{e}; using a neutral placeholder")
+                    LLM_FALLBACKS.inc(pipeline="cc", source="neutral")
+                    return neutral_verdict()
+                if key:
+                    with lock:
+                        fresh.append((key, wid, comp.competency_id, verdict))
+                    _flush(VERDICT_RECORD_BATCH)
+            return verdict
+        finally:
+            if job is not None:
+                job.pair_done()
+            with lock:
+                counts["done"] += 1
+                done = counts["done"]
+            if progress is not None:
+                progress(done, total)
+
+    try:
+        verdicts = POOL.map(_one, pairs, max_workers=job.max_inflight if job is not None else None, cancel=cancel)
+    finally:
+        if verdict_store is not None:
+            _flush()
+    return [(wid, comp, v) for (wid, comp), v in zip(pairs, verdicts)], counts["reused"]
+
+
+def assemble_payload(
+    cc_raw: Dict,
+    competencies: List[Competency],
+    worksheet_ids: List[str],
+    scored: List[Tuple[str, Competency, Dict]],
+) -> Dict:
+    """API/CLI JSON: meta, matrix (worksheets x competencies) and per-pair details."""
+    comp_ids = [c.competency_id for c in competencies]
+    results_alignment: Dict[str, Dict[str, int]] = {wid: {} for wid in worksheet_ids}
+    full_results: Dict[str, Dict[str, Dict[str, Any]]] = {wid: {} for wid in worksheet_ids}
+    fallbacks: Dict[str, int] = {}
+    for wid, comp, eval_result in scored:
+        results_alignment[wid][comp.competency_id] = int(eval_result["alignment"])
+        full_results[wid][comp.competency_id] = eval_result
+        source = eval_result.get("fallback")
+        if source:
+            fallbacks[source] = fallbacks.get(source, 0) + 1
+    payload = {
+        "meta": {
+            "subject": cc_raw.get("subject", "Unknown"),
+            "grade_band": competencies[0].meta.get("grade_band") if competencies else None,
+            "competencies": comp_ids,
+            "worksheets": worksheet_ids,
+        },
+        "matrix": assemble_score_matrix(results_alignment, comp_ids, worksheet_ids),
+        "details": full_results,
+    }
+    if fallbacks:
+        # placeholders, not scores: callers should show but not persist the run
+        payload["meta"]["fallback"] = fallbacks
+    return payload
+
+
 # ---------- High level run ----------
 
 
@@ -451,6 +607,8 @@ def run_pipeline(
     worksheets_dir: str,
     out_path: Optional[str] = None,
     grade_band: Optional[str] = None,
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
 ):
     cc_raw = safe_load_json_file(Path(cc_file))
     competencies = normalize_competencies(cc_raw, grade_band=grade_band)
@@ -465,36 +623,8 @@ def run_pipeline(
     worksheet_ids = list(worksheets.keys())
     logger.info(f"Found {len(worksheets)} worksheet files.")
 
-    # Results map: worksheet_id -> competency_id -> score
-    results_alignment: Dict[str, Dict[str, int]] = {wid: {} for wid in worksheet_ids}
-    # And store per-pair details as well
-    full_results: Dict[str, Dict[str, Dict[str, Any]]] = {
-        wid: {} for wid in worksheet_ids
-    }
-
-    for wid in tqdm(worksheet_ids, desc="Worksheets"):
-        wtext = worksheets[wid]["text"] or ""
-        wtitle = worksheets[wid]["title"]
-        for comp in competencies:
-            eval_result = evaluate_alignment_for_pair(
-                comp, wtext, worksheet_id=wid, worksheet_title=wtitle
-            )
-            results_alignment[wid][comp.competency_id] = int(eval_result["alignment"])
-            full_results[wid][comp.competency_id] = eval_result
-
-    # Build matrix
-    matrix_json = assemble_score_matrix(results_alignment, comp_ids, worksheet_ids)
-    # Save outputs
-    api_payload = {
-        "meta": {
-            "subject": cc_raw.get("subject", "Unknown"),
-            "grade_band": competencies[0].meta.get("grade_band"),
-            "competencies": comp_ids,
-            "worksheets": worksheet_ids,
-        },
-        "matrix": matrix_json,
-        "details": full_results,
-    }
+    scored, _ = evaluate_pairs(worksheets, worksheet_ids, competencies, cancel=cancel, job=job)
+    api_payload = assemble_payload(cc_raw, competencies, worksheet_ids, scored)
 
     if out_path:
         out_p = Path(out_path)
@@ -2,12 +2,36 @@ import argparse
 import json
 import os
 import re
+import shutil
 import sys
 import subprocess
-from typing import List, Optional, Tuple
-
-# Local import of your LLM wrapper
-from llm import run_llm
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Local import of your LLM wrapper. llm.py imports backend-level modules (metrics),
+# so when run as a plain script put backend/ on the path first.
+if __package__:
+    from .llm import run_llm, stream_llm
+    from .resilience import CancelToken, Cancelled
+    from .scheduler import Job
+else:
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from pipelines.llm import run_llm, stream_llm
+    from pipelines.resilience import CancelToken, Cancelled
+    from pipelines.scheduler import Job
+
+# Context kept per session (see ChatSession):
+#   CHAT_WINDOW_MESSAGES=12   recent messages sent verbatim; past that, the oldest are
+#                             folded into a rolling summary, at least CHAT_FOLD_MESSAGES at a time
+#   CHAT_FOLD_MESSAGES=6
+#   CHAT_SUMMARY_CHARS=1200   cap on the rolling summary
+#   CHAT_REPORT_CHARS=4000    report context included once, in the session prefix
+CHAT_WINDOW_MESSAGES = int(os.environ.get("CHAT_WINDOW_MESSAGES", "12"))
+CHAT_FOLD_MESSAGES = max(2, int(os.environ.get("CHAT_FOLD_MESSAGES", "6")))
+CHAT_SUMMARY_CHARS = int(os.environ.get("CHAT_SUMMARY_CHARS", "1200"))
+CHAT_REPORT_CHARS = int(os.environ.get("CHAT_REPORT_CHARS", "4000"))
 
 # Optional colors
 try:
@@ -92,44 +116,160 @@ def is_no(text: str) -> bool:
     return t in NO_SET
 
 
-def build_prompt(
-    user_message: str,
-    confirmed_directives: List[str],
-    recent_transcript: List[Tuple[str, str]],
-    context_report: Optional[str] = None,
-) -> str:
-    directives_section = (
-        "None yet."
-        if not confirmed_directives
-        else "\n".join(f"- {d}" for d in confirmed_directives)
-    )
-
-    transcript_lines = []
-    for role, msg in recent_transcript[-6:]:
-        transcript_lines.append(f"{role.upper()}: {msg}")
+TURN_INSTRUCTIONS = """Respond with:
+- If a new directive is present: one brief paragraph (optional), then a single line starting with EXACTLY 'PROPOSED DIRECTIVE: ' followed by the directive, then a short yes/no confirmation question.
+- If no directive present: a brief helpful response and ask if there are any changes."""
 
-    report_section = ""
-    if context_report:
-        snippet = context_report.strip()
-        if len(snippet) > 4000:
-            snippet = snippet[:4000] + "\n...[truncated]..."
-        report_section = f"\nPrevious Report Context (optional):\n{snippet}\n"
+SUMMARY_PROMPT = """Summarize this part of a conversation between a teacher and an assistant collecting report revision directives.
+Keep: directives proposed, confirmed or rejected, corrections, and open questions. Drop pleasantries.
+At most {words} words, plain text, no preamble.
+
+Summary so far:
+{summary}
+
+Conversation to add:
+{turns}
+
+Summarize the conversation now."""
+
+
+class ChatSession:
+    """
+    The conversation as chat messages, laid out so each turn's prompt extends the last:
+      [system: instructions + report context]   fixed for the session
+      [system: summary of earlier turns]        changes only when turns are folded
+      recent user/assistant messages            appended, never rewritten
+    The model server then re-evaluates only the new tokens (KV-cache prefix reuse) and
+    the prompt stays bounded: once more than `window` messages are kept, all but the
+    newest `window - fold` are summarized in the background and replaced by the summary.
+    """
+
+    def __init__(
+        self,
+        model: str = "phi3",
+        report_text: Optional[str] = None,
+        window: int = CHAT_WINDOW_MESSAGES,
+        fold: int = CHAT_FOLD_MESSAGES,
+        session_id: Optional[str] = None,
+        job: Optional[Job] = None,
+    ):
+        self.model = model
+        self.id = session_id or uuid.uuid4().hex[:12]
+        self.job = job
+        self.window = max(window, fold)
+        self.fold = fold
+        system = LLM_INSTRUCTIONS
+        if report_text and report_text.strip():
+            snippet = report_text.strip()
+            if len(snippet) > CHAT_REPORT_CHARS:
+                snippet = snippet[:CHAT_REPORT_CHARS] + "\n...[truncated]..."
+            system += f"\nPrevious Report Context (optional):\n{snippet}\n"
+        self.system = system
+        self.summary = ""
+        self.messages: List[Dict[str, str]] = []
+        self.last_stats: Dict[str, float] = {}
+        self._folding: Optional[threading.Thread] = None
+        self._folded: Optional[Tuple[int, str]] = None  # (messages folded, new summary)
+
+    # ----- context -----
+
+    def context(self) -> List[Dict[str, str]]:
+        out = [{"role": "system", "content": self.system}]
+        if self.summary:
+            out.append({"role": "system", "content": f"Summary of earlier conversation:\n{self.summary}"})
+        return out + self.messages
+
+    def note(self, role: str, content: str) -> None:
+        """Record an exchange the model did not produce (confirmations, manual edits)."""
+        self.messages.append({"role": role, "content": content})
+
+    def _apply_fold(self, wait: bool = False) -> None:
+        t = self._folding
+        if t is None:
+            return
+        if wait:
+            t.join()
+        if t.is_alive():
+            return
+        self._folding = None
+        if self._folded is not None:
+            n, summary = self._folded
+            self._folded = None
+            self.summary = summary
+            del self.messages[:n]
+
+    def _maybe_fold(self) -> None:
+        if self._folding is not None or len(self.messages) <= self.window:
+            return
+        # fold everything above window - fold, so the context drops well below the window
+        n = len(self.messages) - (self.window - self.fold)
+        old = list(self.messages[:n])
+        prior = self.summary
+
+        def _run():
+            self._folded = (n, summarize_turns(prior, old, self.model))
+
+        self._folding = threading.Thread(target=_run, name=f"chat-fold-{self.id}", daemon=True)
+        self._folding.start()
+
+    # ----- turns -----
+
+    def ask(
+        self,
+        user_message: str,
+        confirmed_directives: List[str],
+        on_token: Optional[Callable[[str], None]] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> str:
+        """One model turn, streamed through on_token; returns the full reply."""
+        # a finished summary is swapped in; a running one only blocks if the window overflowed
+        self._apply_fold(wait=len(self.messages) > 2 * self.window)
+        directives = "\n".join(f"- {d}" for d in confirmed_directives) or "None yet."
+        content = (
+            f"Confirmed directives so far:\n{directives}\n\n"
+            f"User message to process:\n{user_message}\n\n{TURN_INSTRUCTIONS}"
+        )
+        messages = self.context() + [{"role": "user", "content": content}]
+        stats: Dict[str, float] = {}
+        t0 = time.perf_counter()
+        reply = stream_llm(
+            messages, model=self.model, on_token=on_token, affinity=self.id,
+            tags={"pipeline": "chat"}, stats=stats, cancel=cancel, job=self.job,
+        )
+        stats["total_s"] = time.perf_counter() - t0
+        self.last_stats = stats
+        # the exact text sent, so the next turn's prompt starts with this one
+        self.messages.append({"role": "user", "content": content})
+        self.messages.append({"role": "assistant", "content": reply})
+        self._maybe_fold()
+        return reply
+
+
+def summarize_turns(summary: str, messages: List[Dict[str, str]], model: str) -> str:
+    """Fold messages into the rolling summary; without the model, keep a clipped digest."""
+    turns = "\n".join(f"{m['role'].upper()}: {_user_text(m['content'])}" for m in messages)
+    try:
+        out = run_llm(
+            prompt=SUMMARY_PROMPT.format(words=CHAT_SUMMARY_CHARS // 6, summary=summary or "(none)", turns=turns),
+            model=model,
+            tags={"pipeline": "chat-summary"},
+            options={"num_predict": CHAT_SUMMARY_CHARS // 3},
+        ).strip()
+    except Exception:
+        out = ""
+    if not out:
+        out = (summary + "\n" if summary else "") + "\n".join(
+            f"{m['role']}: {_user_text(m['content'])[:160]}" for m in messages
+        )
+    return out[-CHAT_SUMMARY_CHARS:]
 
-    prompt = f"""{LLM_INSTRUCTIONS}
 
-Confirmed directives so far:
-{directives_section}
-{report_section}
-Recent conversation:
-{chr(10).join(transcript_lines)}
-
-User message to process:
-{user_message}
-
-Respond with:
-- If a new directive is present: one brief paragraph (optional), then a single line starting with EXACTLY 'PROPOSED DIRECTIVE: ' followed by the directive, then a short yes/no confirmation question.
-- If no directive present: a brief helpful response and ask if there are any changes."""
-    return prompt
+def _user_text(content: str) -> str:
+    """The user's own words from a turn message (drops the directive list and instructions)."""
+    marker = "User message to process:\n"
+    if marker in content:
+        content = content.split(marker, 1)[1].split("\n\n" + TURN_INSTRUCTIONS, 1)[0]
+    return content.strip()
 
 
 def extract_proposed_directive(text: str) -> Optional[str]:
@@ -155,18 +295,34 @@ def save_directives(path: str, directives: List[str]) -> bool:
         return False
 
 
-def copy_to_clipboard(directives: List[str]) -> None:
-    try:
-        text = "\n".join(directives) if directives else ""
-        subprocess.run(["clip"], input=text, text=True, check=False)
-        print(f"{C_OK}Copied directives to clipboard.{C_RST}")
-    except Exception as e:
-        print(f"{C_ERR}Clipboard copy failed: {e}{C_RST}")
+CLIPBOARD_COMMANDS = (
+    ["clip"],                                   # Windows
+    ["pbcopy"],                                 # macOS
+    ["wl-copy"],                                # Wayland
+    ["xclip", "-selection", "clipboard"],       # X11
+    ["xsel", "--clipboard", "--input"],
+)
 
 
-def print_help():
-    print(
-        f"""{C_INFO}Commands:{C_RST}
+def copy_to_clipboard(directives: List[str]) -> bool:
+    """First clipboard tool found on PATH; prints the directives when there is none."""
+    text = "\n".join(directives) if directives else ""
+    for cmd in CLIPBOARD_COMMANDS:
+        if not shutil.which(cmd[0]):
+            continue
+        try:
+            subprocess.run(cmd, input=text, text=True, check=True, timeout=5)
+            print(f"{C_OK}Copied directives to clipboard.{C_RST}")
+            return True
+        except Exception as e:
+            print(f"{C_ERR}Clipboard copy failed ({cmd[0]}): {e}{C_RST}")
+            return False
+    print(f"{C_WARN}No clipboard tool found (clip, pbcopy, wl-copy, xclip, xsel); copy these instead:{C_RST}")
+    print(text or "(no directives)")
+    return False
+
+
+HELP_TEXT = """Commands:
 - help                    Show this help
 - list                    Show confirmed directives
 - undo                    Remove the last confirmed directive
@@ -177,237 +333,266 @@ def print_help():
 - edit <text>             Replace the pending directive with your text, then confirm
 - retry                   Ask the bot to re-propose the directive for your last message
 - save [path]             Save directives to JSON (default: directives.json)
-- copy                    Copy confirmed directives to clipboard (Windows 'clip')
+- copy                    Copy confirmed directives to clipboard
 - done | exit | quit      Finish and print final directives
 """
-    )
 
 
-def banner():
-    print(INTRO_MESSAGE)
+def print_help():
+    head, _, rest = HELP_TEXT.partition("\n")
+    print(f"{C_INFO}{head}{C_RST}\n{rest}")
 
 
-def chat_loop(
-    model: str, report_path: Optional[str] = None, autosave: Optional[str] = None
-) -> List[str]:
-    confirmed_directives: List[str] = []
-    directive_keys = set()
-    pending_directive: Optional[str] = None
-    awaiting_confirmation = False
-    transcript: List[Tuple[str, str]] = []
-    last_llm_user_message: Optional[str] = None
-
-    report_text = None
-    if report_path and os.path.exists(report_path):
-        try:
-            with open(report_path, "r", encoding="utf-8") as f:
-                report_text = f.read()
-        except Exception:
-            report_text = None
+def banner():
+    print(INTRO_MESSAGE)
 
-    banner()
-    if report_text:
-        print(f"{C_INFO}(Loaded report context from: {report_path}){C_RST}")
 
-    def add_confirmed(d: str):
+Event = Dict[str, Any]
+
+
+class DirectiveIntake:
+    """
+    The directive workflow (propose / confirm / undo / save) as a state machine, so the
+    terminal REPL and the web chat (api.py, /chat/ws) run the same logic. handle() takes
+    one user line and returns events for the front end to render:
+      {"type": "bot", "text", "streamed"}    bot reply (streamed: tokens already went to on_token)
+      {"type": "info" | "warn" | "ok" | "error", "text"}
+      {"type": "proposed", "directive"}      a directive now awaits yes/no
+      {"type": "directives", "items"}        confirmed list changed (autosave hook)
+      {"type": "help"} {"type": "save", "path"} {"type": "copy", "text"} {"type": "end"}
+    Side effects (files, clipboard) are left to the caller.
+    """
+
+    def __init__(
+        self,
+        model: str = "phi3",
+        report_text: Optional[str] = None,
+        session_id: Optional[str] = None,
+        job: Optional[Job] = None,
+        directives: Optional[List[str]] = None,
+    ):
+        self.session = ChatSession(model=model, report_text=report_text, session_id=session_id, job=job)
+        self.confirmed: List[str] = list(directives or [])
+        self.keys = {normalize_directive(d) for d in self.confirmed}
+        self.pending: Optional[str] = None
+        self.awaiting = False
+        self.last_llm_user_message: Optional[str] = None
+
+    @property
+    def id(self) -> str:
+        return self.session.id
+
+    def state(self) -> Dict[str, Any]:
+        return {"directives": list(self.confirmed), "pending": self.pending if self.awaiting else None}
+
+    def _propose(self, directive: str) -> None:
+        self.pending = directive
+        self.awaiting = True
+
+    def _add_confirmed(self, d: str) -> List[Event]:
         key = normalize_directive(d)
-        if key in directive_keys:
-            print(f"{C_WARN}Duplicate directive ignored: {d}{C_RST}")
-            return
-        confirmed_directives.append(d)
-        directive_keys.add(key)
-        print(f"{C_OK}Added directive:{C_RST} {d}")
-        if autosave:
-            save_directives(autosave, confirmed_directives)
-
-    while True:
+        if key in self.keys:
+            return [{"type": "warn", "text": f"Duplicate directive ignored: {d}"}]
+        self.confirmed.append(d)
+        self.keys.add(key)
+        return [
+            {"type": "ok", "text": f"Added directive: {d}"},
+            {"type": "directives", "items": list(self.confirmed)},
+        ]
+
+    def _ask(self, message: str, on_token, cancel) -> List[Event]:
         try:
-            user_msg = input(f"\n{C_USER}You:{C_RST} ").strip()
-        except (EOFError, KeyboardInterrupt):
-            print("\nExiting...")
-            break
-
+            reply = self.session.ask(message, self.confirmed, on_token=on_token, cancel=cancel)
+            events: List[Event] = [{"type": "bot", "text": reply, "streamed": on_token is not None}]
+        except Cancelled as e:
+            # nothing is added to the session; the user can resend or rephrase
+            return [{"type": "warn", "text": f"Reply stopped: {e.reason}"}]
+        except Exception as e:
+            reply = "I couldn't reach the language model. Please try again or check your Ollama server."
+            events = [{"type": "error", "text": f"Error calling LLM: {e}"}, {"type": "bot", "text": reply, "streamed": False}]
+        proposed = extract_proposed_directive(reply)
+        if proposed:
+            self._propose(proposed)
+            events.append({"type": "proposed", "directive": proposed})
+            if not re.search(r"(?i)\b(yes|no)\b", reply):
+                events.append({
+                    "type": "bot",
+                    "text": "Did I understand that directive correctly? Please reply yes/no, or 'edit <text>'.",
+                    "streamed": False,
+                })
+        else:
+            self.awaiting = False
+            self.pending = None
+        return events
+
+    def handle(
+        self,
+        user_msg: str,
+        on_token: Optional[Callable[[str], None]] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> List[Event]:
+        user_msg = (user_msg or "").strip()
         if not user_msg:
-            continue
-
+            return []
         lower = user_msg.lower()
 
         # Exits
         if lower in ("quit", "exit", "done"):
-            break
+            return [{"type": "end"}]
 
         # Built-in commands
         if lower == "help":
-            print_help()
-            continue
+            return [{"type": "help"}]
 
         if lower == "list":
-            if confirmed_directives:
-                print(f"\n{C_INFO}Confirmed directives:{C_RST}")
-                for i, d in enumerate(confirmed_directives, 1):
-                    print(f"{i}. {d}")
-            else:
-                print(f"\n{C_WARN}No confirmed directives yet.{C_RST}")
-            continue
+            if not self.confirmed:
+                return [{"type": "warn", "text": "No confirmed directives yet."}]
+            lines = "\n".join(f"{i}. {d}" for i, d in enumerate(self.confirmed, 1))
+            return [{"type": "info", "text": f"Confirmed directives:\n{lines}"}]
 
         if lower == "undo":
-            if confirmed_directives:
-                removed = confirmed_directives.pop()
-                directive_keys.discard(normalize_directive(removed))
-                print(f"{C_WARN}Removed:{C_RST} {removed}")
-                if autosave:
-                    save_directives(autosave, confirmed_directives)
-            else:
-                print(f"{C_WARN}Nothing to undo.{C_RST}")
-            continue
+            if not self.confirmed:
+                return [{"type": "warn", "text": "Nothing to undo."}]
+            removed = self.confirmed.pop()
+            self.keys.discard(normalize_directive(removed))
+            return [
+                {"type": "warn", "text": f"Removed: {removed}"},
+                {"type": "directives", "items": list(self.confirmed)},
+            ]
 
         if lower == "review":
-            if pending_directive:
-                print(
-                    f"{C_INFO}Pending directive:{C_RST} {pending_directive}\n"
-                    f"{C_INFO}Reply 'yes' to accept, 'no' to reject, or 'edit <text>'.{C_RST}"
-                )
-            else:
-                print(f"{C_WARN}No pending directive right now.{C_RST}")
-            continue
+            if self.pending:
+                return [{
+                    "type": "info",
+                    "text": f"Pending directive: {self.pending}\nReply 'yes' to accept, 'no' to reject, or 'edit <text>'.",
+                }]
+            return [{"type": "warn", "text": "No pending directive right now."}]
 
         if lower.startswith("save"):
             parts = user_msg.split(maxsplit=1)
-            path = parts[1] if len(parts) > 1 else "directives.json"
-            save_directives(path, confirmed_directives)
-            continue
+            return [{"type": "save", "path": parts[1] if len(parts) > 1 else "directives.json"}]
 
         if lower == "copy":
-            copy_to_clipboard(confirmed_directives)
-            continue
+            return [{"type": "copy", "text": "\n".join(self.confirmed)}]
 
         if lower == "retry":
-            if last_llm_user_message:
-                # Force a re-proposal using last user message
-                prompt = build_prompt(
-                    user_message=last_llm_user_message
-                    + "\nPlease rephrase the directive more precisely.",
-                    confirmed_directives=confirmed_directives,
-                    recent_transcript=transcript,
-                    context_report=report_text,
-                )
-                try:
-                    bot_reply = run_llm(prompt=prompt, model=model)
-                except Exception as e:
-                    print(f"{C_ERR}[Error calling LLM: {e}]{C_RST}")
-                    bot_reply = "I couldn't reach the language model. Please try again or check your Ollama server."
-                transcript.append(("user", "[retry]"))
-                transcript.append(("assistant", bot_reply))
-                print(f"\n{C_BOT}Bot:{C_RST} {bot_reply}")
-                proposed = extract_proposed_directive(bot_reply)
-                if proposed:
-                    pending_directive = proposed
-                    awaiting_confirmation = True
-                    if not re.search(r"(?i)\b(yes|no)\b", bot_reply):
-                        print(
-                            f"\n{C_BOT}Bot:{C_RST} Did I understand that directive correctly? Reply yes/no, or 'edit <text>'."
-                        )
-                else:
-                    awaiting_confirmation = False
-                    pending_directive = None
-            else:
-                print(f"{C_WARN}No previous message to retry.{C_RST}")
-            continue
-
-        # Direct accept/reject
-        if (
-            awaiting_confirmation
-            and pending_directive
-            and (is_yes(lower) or lower in ("accept",))
-        ):
-            add_confirmed(pending_directive)
-            pending_directive = None
-            awaiting_confirmation = False
-            print(f"{C_BOT}Bot:{C_RST} Any other changes to the report?")
-            transcript.append(("user", user_msg))
-            transcript.append(
-                ("assistant", "Confirmed. Any other changes to the report?")
+            if not self.last_llm_user_message:
+                return [{"type": "warn", "text": "No previous message to retry."}]
+            # Force a re-proposal using last user message
+            return self._ask(
+                self.last_llm_user_message + "\nPlease rephrase the directive more precisely.", on_token, cancel
             )
-            continue
 
-        if (
-            awaiting_confirmation
-            and pending_directive
-            and (is_no(lower) or lower in ("reject",))
-        ):
-            print(
-                f"{C_INFO}Okay. You can:{C_RST} 'edit <your directive>' or type 'retry' to get a new proposal."
-            )
-            transcript.append(("user", user_msg))
+        # Direct accept/reject
+        if self.awaiting and self.pending and (is_yes(lower) or lower in ("accept",)):
+            events = self._add_confirmed(self.pending)
+            self.pending = None
+            self.awaiting = False
+            self.session.note("user", user_msg)
+            self.session.note("assistant", "Confirmed. Any other changes to the report?")
+            return events + [{"type": "bot", "text": "Any other changes to the report?", "streamed": False}]
+
+        if self.awaiting and self.pending and (is_no(lower) or lower in ("reject",)):
+            self.session.note("user", user_msg)
             # keep awaiting; user can edit or retry
-            continue
+            return [{"type": "info", "text": "Okay. You can: 'edit <your directive>' or type 'retry' to get a new proposal."}]
 
         # Manual add or edit commands
         if lower.startswith("add "):
             directive = user_msg[4:].strip()
-            if directive:
-                # Confirm quickly
-                print(f"{C_INFO}Add this directive?{C_RST} {directive} (yes/no)")
-                pending_directive = directive
-                awaiting_confirmation = True
-            else:
-                print(f"{C_WARN}Nothing to add. Usage: add <directive>{C_RST}")
-            continue
+            if not directive:
+                return [{"type": "warn", "text": "Nothing to add. Usage: add <directive>"}]
+            self._propose(directive)
+            return [{"type": "info", "text": f"Add this directive? {directive} (yes/no)"},
+                    {"type": "proposed", "directive": directive}]
 
         if lower.startswith("edit "):
             new_text = user_msg[5:].strip()
             if not new_text:
-                print(f"{C_WARN}Usage: edit <directive text>{C_RST}")
-                continue
-            pending_directive = new_text
-            awaiting_confirmation = True
-            print(
-                f"{C_INFO}Updated pending directive:{C_RST} {pending_directive}\nConfirm? (yes/no)"
-            )
-            continue
+                return [{"type": "warn", "text": "Usage: edit <directive text>"}]
+            self._propose(new_text)
+            return [{"type": "info", "text": f"Updated pending directive: {new_text}\nConfirm? (yes/no)"},
+                    {"type": "proposed", "directive": new_text}]
 
         # If awaiting confirmation and user provided free-form text,
         # treat it as a corrected directive to be confirmed.
-        if awaiting_confirmation and pending_directive:
-            # User typed something other than simple yes/no/commands; treat as correction
-            pending_directive = user_msg.strip()
-            print(
-                f"{C_INFO}Got it. Confirm this directive?{C_RST} {pending_directive} (yes/no)"
-            )
-            continue
+        if self.awaiting and self.pending:
+            self._propose(user_msg)
+            return [{"type": "info", "text": f"Got it. Confirm this directive? {user_msg} (yes/no)"},
+                    {"type": "proposed", "directive": user_msg}]
 
-        # Regular flow: build prompt and call LLM
-        prompt = build_prompt(
-            user_message=user_msg,
-            confirmed_directives=confirmed_directives,
-            recent_transcript=transcript,
-            context_report=report_text,
-        )
+        # Regular flow: stream the reply; the session carries the context
+        self.last_llm_user_message = user_msg
+        return self._ask(user_msg, on_token, cancel)
+
+
+def chat_loop(
+    model: str,
+    report_path: Optional[str] = None,
+    autosave: Optional[str] = None,
+    show_stats: bool = False,
+) -> List[str]:
+    report_text = None
+    if report_path and os.path.exists(report_path):
         try:
-            bot_reply = run_llm(prompt=prompt, model=model)
-        except Exception as e:
-            print(f"{C_ERR}[Error calling LLM: {e}]{C_RST}")
-            bot_reply = "I couldn't reach the language model. Please try again or check your Ollama server."
+            with open(report_path, "r", encoding="utf-8") as f:
+                report_text = f.read()
+        except Exception:
+            report_text = None
 
-        transcript.append(("user", user_msg))
-        transcript.append(("assistant", bot_reply))
-        last_llm_user_message = user_msg
+    intake = DirectiveIntake(model=model, report_text=report_text)
+    colors = {"info": C_INFO, "warn": C_WARN, "ok": C_OK, "error": C_ERR}
 
-        print(f"\n{C_BOT}Bot:{C_RST} {bot_reply}")
+    banner()
+    if report_text:
+        print(f"{C_INFO}(Loaded report context from: {report_path}){C_RST}")
 
-        proposed = extract_proposed_directive(bot_reply)
-        if proposed:
-            pending_directive = proposed
-            awaiting_confirmation = True
-            if not re.search(r"(?i)\b(yes|no)\b", bot_reply):
-                print(
-                    f"\n{C_BOT}Bot:{C_RST} Did I understand that directive correctly? Please reply yes/no, or 'edit <text>'."
-                )
-        else:
-            awaiting_confirmation = False
-            pending_directive = None
+    while True:
+        try:
+            user_msg = input(f"\n{C_USER}You:{C_RST} ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print("\nExiting...")
+            break
+
+        started = []
+
+        def on_token(piece: str) -> None:
+            if not started:
+                started.append(True)
+                print(f"\n{C_BOT}Bot:{C_RST} ", end="", flush=True)
+            print(piece, end="", flush=True)
+
+        events = intake.handle(user_msg, on_token=on_token)
+        if started:
+            print()
+        if any(ev["type"] == "end" for ev in events):
+            break
+        for ev in events:
+            kind = ev["type"]
+            if kind == "bot":
+                if not ev["streamed"]:
+                    print(f"\n{C_BOT}Bot:{C_RST} {ev['text']}")
+                elif show_stats:
+                    st = intake.session.last_stats
+                    print(
+                        f"{C_INFO}[ttft {st.get('ttft_s', 0):.2f}s, total {st.get('total_s', 0):.2f}s, "
+                        f"prompt tokens evaluated {st.get('prompt_eval_count', '?')}, "
+                        f"context messages {len(intake.session.context())}]{C_RST}"
+                    )
+            elif kind in colors:
+                head, _, rest = ev["text"].partition(":")
+                print(f"{colors[kind]}{head}:{C_RST}{rest}" if rest else f"{colors[kind]}{head}{C_RST}")
+            elif kind == "help":
+                print_help()
+            elif kind == "save":
+                save_directives(ev["path"], intake.confirmed)
+            elif kind == "copy":
+                copy_to_clipboard(intake.confirmed)
+            elif kind == "directives" and autosave:
+                save_directives(autosave, intake.confirmed)
 
     # End of conversation
+    confirmed_directives = intake.confirmed
     if confirmed_directives:
         print(f"\n{C_INFO}Final confirmed directives:{C_RST}")
         for i, d in enumerate(confirmed_directives, 1):
@@ -438,10 +623,18 @@ def main(argv: Optional[List[str]] = None) -> int:
         dest="autosave_path",
         help="Autosave to JSON after each confirmation",
     )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print time to first token and prompt tokens evaluated after each reply",
+    )
     args = parser.parse_args(argv)
 
     directives = chat_loop(
-        model=args.model, report_path=args.report_path, autosave=args.autosave_path
+        model=args.model,
+        report_path=args.report_path,
+        autosave=args.autosave_path,
+        show_stats=args.stats,
     )
 
     if args.out_path:
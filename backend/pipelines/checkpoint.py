@@ -0,0 +1,140 @@
+"""
+checkpoint.py
+Durable per-run log of finished pair verdicts, so a long alignment run survives a
+crash, restart or --reload and only the missing pairs are recomputed.
+- one JSONL file per run: a header line (the run's request, for resuming) followed by
+  one line per finished pair, flushed as it is written
+- pairs are keyed by pair_key (student profile + worksheet text), so an edited IEP or
+  worksheet simply misses its old entries
+- a full verdict satisfies a later scores-only run; not the other way around
+- the file is removed once the caller has persisted the result (complete());
+  mark("cancelled") keeps it for a re-submission but opts it out of startup resume
+
+Config (env):
+  ALIGN_CHECKPOINT_FSYNC=1       fsync after each pair (0 = flush only; faster, survives
+                                 process crashes but not power loss)
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from metrics import STORE_IO
+from .timeutil import iso_utc
+
+ALIGN_CHECKPOINT_FSYNC = os.environ.get("ALIGN_CHECKPOINT_FSYNC", "1").lower() not in ("0", "false", "no")
+
+
+def run_id(kind: str, selection: Dict[str, Iterable[str]], students: Iterable[str], scores_only: bool) -> str:
+    """Stable id for 'the same selection': re-submitting it finds the same checkpoint."""
+    spec = {
+        "kind": kind,
+        "selection": {c: sorted(set(u)) for c, u in sorted((selection or {}).items())},
+        "students": sorted(set(students)),
+        "scores_only": bool(scores_only),
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+
+
+@STORE_IO.time(store="checkpoint", op="read")
+def _read(path: Path) -> Tuple[Dict[str, Any], Optional[str], Dict[str, Dict]]:
+    """(header, last status or None while running, {pair_key: entry})"""
+    meta: Dict[str, Any] = {}
+    status: Optional[str] = None
+    entries: Dict[str, Dict] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue  # torn last line after a crash
+            if "header" in rec:
+                meta = rec["header"] or {}
+            elif "status" in rec:
+                status = None if rec["status"] == "running" else rec["status"]
+            elif rec.get("key"):
+                entries[rec["key"]] = rec
+    return meta, status, entries
+
+
+class CheckpointLog:
+    def __init__(self, path: Path, meta: Optional[Dict[str, Any]] = None):
+        """Opens (resuming) or creates the log at path; meta is written as the header of a new log."""
+        self.path = Path(path)
+        self.resumed = self.path.exists()
+        self.meta, self.status, self._entries = _read(self.path) if self.resumed else ({}, None, {})
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.path, "a", encoding="utf-8")
+        if self.resumed and self.path.stat().st_size:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._f.write("\n")  # finish a torn line so the next record parses
+        if not self.resumed:
+            self.meta = dict(meta or {}, created_at=iso_utc(time.time()))
+            self._write({"header": self.meta})
+        elif self.status is not None:
+            self.status = None
+            self._write({"status": "running"})  # re-submitted: resumable again
+
+    def _write(self, rec: Dict) -> None:
+        self._f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self._f.flush()
+        if ALIGN_CHECKPOINT_FSYNC:
+            os.fsync(self._f.fileno())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str, scores_only: bool) -> Optional[Dict]:
+        rec = self._entries.get(key)
+        if rec is None or (rec.get("scores_only") and not scores_only):
+            return None
+        return dict(rec["verdict"])
+
+    @STORE_IO.time(store="checkpoint", op="write")
+    def append(self, key: str, wid: str, student: str, verdict: Dict, scores_only: bool) -> None:
+        rec = {"key": key, "worksheet": wid, "student": student, "scores_only": scores_only, "verdict": verdict}
+        with self._lock:
+            self._write(rec)
+            self._entries[key] = rec
+
+    def mark(self, status: str) -> None:
+        with self._lock:
+            self.status = status
+            self._write({"status": status, "at": iso_utc(time.time())})
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+
+    def complete(self) -> None:
+        """The run's result is persisted elsewhere; drop the log."""
+        self.close()
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def pending(directory: Path, max_age_s: float) -> List[Dict[str, Any]]:
+    """
+    Headers of logs left by runs that died mid-way (no status line), newest first.
+    Logs older than max_age_s are deleted instead.
+    """
+    out = []
+    now = time.time()
+    for p in sorted(Path(directory).glob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True):
+        if now - p.stat().st_mtime > max_age_s:
+            p.unlink(missing_ok=True)
+            continue
+        meta, status, entries = _read(p)
+        if status is None and meta:
+            out.append(dict(meta, run_id=p.stem, pairs_done=len(entries)))
+    return out
@@ -0,0 +1,139 @@
+"""
+explanations.py
+Verdict/explanation store for two-phase scoring.
+- alignment runs record each pair's scores (and explanation, if generated)
+- /align/explain generates a missing explanation once and caches it
+- keyed by a hash of the prompt inputs (student profile + bounded worksheet text),
+  so editing a worksheet or an IEP naturally invalidates its entries
+- alignment runs reuse a stored verdict instead of calling the LLM (see fresh()), so
+  pairs warmed by precompute.py are cache reads during the day
+
+Config (env):
+  ALIGN_REUSE_VERDICTS=1         reuse stored verdicts in alignment runs (0 = always re-score)
+  ALIGN_VERDICT_MAX_AGE_H=0      only reuse verdicts younger than this (0 = no limit; edited
+                                 inputs already miss, since they change the key)
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from jsonstore import read_json, transaction, write_json
+from metrics import STORE_IO
+from .timeutil import iso_utc, to_epoch
+
+ALIGN_REUSE_VERDICTS = os.environ.get("ALIGN_REUSE_VERDICTS", "1").lower() not in ("0", "false", "no")
+ALIGN_VERDICT_MAX_AGE_H = float(os.environ.get("ALIGN_VERDICT_MAX_AGE_H", "0"))
+
+
+def profile_key_prefix(student: Any):
+    """pair_key's hash state after the student part; StudentProfile keeps one (key_prefix)."""
+    profile = {
+        "student_name": student.student_name,
+        "grade": student.grade,
+        "designation": student.designation,
+        "strengths": student.strengths,
+        "challenges": student.challenges,
+        "education_goals": student.education_goals,
+        "accommodations": student.accommodations,
+    }
+    h = hashlib.sha256()
+    h.update(json.dumps(profile, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(b"\0")
+    return h
+
+
+def pair_key(student: Any, worksheet_text: str) -> str:
+    """Stable key for one (student profile, worksheet text) pair."""
+    prefix = getattr(student, "key_prefix", None)
+    h = prefix.copy() if prefix is not None else profile_key_prefix(student)
+    h.update((worksheet_text or "")[:2500].encode("utf-8"))  # same bound as the prompt
+    return h.hexdigest()
+
+
+def competency_key(competency: Any, worksheet_text: str) -> str:
+    """Stable key for one (core competency, worksheet text) pair of the CC pipeline."""
+    spec = {
+        "competency_id": competency.competency_id,
+        "title": competency.title,
+        "description": competency.description,
+        "indicators": list(competency.indicators[:8]),  # what the prompt shows
+        "grade_band": (competency.meta or {}).get("grade_band"),
+    }
+    h = hashlib.sha256()
+    h.update(json.dumps(spec, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(b"\0")
+    h.update((worksheet_text or "")[:2500].encode("utf-8"))
+    return h.hexdigest()
+
+
+class ExplanationStore:
+    """
+    JSON file: { "<pair_key>": {
+        "worksheet": id, "student": name, "scores": {...}, "explanation": str, "updated_at": ISO
+    }}
+    Read through jsonstore, so entries written by another process (precompute.py,
+    another worker) are seen on the next read; batches merge into the file on disk
+    inside a transaction.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @STORE_IO.time(store="explanations", op="read")
+    def _load(self, shared: bool) -> Dict[str, Dict]:
+        try:
+            obj = read_json(self.path, {}, store="explanations", shared=shared)
+            if isinstance(obj, dict):
+                return obj
+        except Exception:
+            pass
+        return {}
+
+    @STORE_IO.time(store="explanations", op="write")
+    def _save(self, data: Dict[str, Dict]) -> None:
+        write_json(self.path, data, store="explanations")
+
+    def get(self, key: str) -> Optional[Dict]:
+        rec = self._load(shared=True).get(key)
+        return dict(rec) if rec else None
+
+    def fresh(self, key: str, scores_only: bool, max_age_s: Optional[float] = None) -> Optional[Dict]:
+        """
+        Stored verdict usable in place of an LLM call: has scores, has an explanation
+        unless scores_only, and (max_age_s > 0) was recorded within max_age_s.
+        """
+        rec = self.get(key)
+        if not rec or not rec.get("scores"):
+            return None
+        if not scores_only and not rec.get("explanation"):
+            return None
+        if max_age_s:
+            try:
+                at = to_epoch(rec.get("updated_at"))
+            except ValueError:
+                return None
+            if at is None or time.time() - at > max_age_s:
+                return None
+        return dict(rec["scores"], explanation=rec.get("explanation") or "")
+
+    def record_verdicts(self, items: Iterable[Tuple[str, str, str, Dict]]) -> None:
+        """items: (pair_key, worksheet_id, student_name, verdict). One write per batch."""
+        now = iso_utc(time.time())
+        with transaction():
+            data = self._load(shared=False)
+            for key, wid, student, verdict in items:
+                scores = {k: v for k, v in verdict.items() if k != "explanation"}
+                rec = data.get(key) or {}
+                # a scores-only rerun with unchanged scores keeps an explanation made earlier
+                if verdict.get("explanation") or rec.get("scores") != scores:
+                    rec["explanation"] = verdict.get("explanation") or ""
+                rec.update({"worksheet": wid, "student": student, "scores": scores, "updated_at": now})
+                data[key] = rec
+            self._save(data)
+
+    def put_explanation(self, key: str, wid: str, student: str, scores: Dict, explanation: str) -> None:
+        self.record_verdicts([(key, wid, student, dict(scores, explanation=explanation))])
@@ -0,0 +1,316 @@
+"""
+history.py
+Append-only alignment history: student / course / worksheet snapshots over time.
+- data/history/alignment.jsonl: one compact JSON line per snapshot, never rewritten
+- data/history/alignment.idx: one line per snapshot (key, ts, byte offset, the five
+  scores), appended right after the data line; loaded once into per-key arrays
+- trend series are computed from the index alone; time-range queries seek straight to
+  the matching data lines, so neither reads the whole history
+- appends from another process (precompute.py) are picked up by tailing the index
+- a crash between the two appends is repaired on open by indexing the data file's tail
+
+Keys are opaque strings chosen by the caller, e.g. "student:<id>", "student:<id>@<course>",
+"course:<course>", "worksheet:<course>/<filename>".
+"""
+
+import json
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from metrics import STORE_IO
+from .timeutil import iso_utc, to_epoch
+
+try:  # serializes appends across processes (API + precompute); POSIX only
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+SCORE_FIELDS = ("overall", "understanding", "accessibility", "accommodation", "engagement")
+_MISSING = -1
+
+
+def _scores(snap: Dict[str, Any]) -> Tuple[int, ...]:
+    metrics = snap.get("metrics") or {}
+    out = []
+    for f in SCORE_FIELDS:
+        v = snap.get(f) if f == "overall" else metrics.get(f)
+        out.append(int(round(v)) if isinstance(v, (int, float)) else _MISSING)
+    return tuple(out)
+
+
+def _terminate(path: Path) -> None:
+    """Finish a torn last line (crash mid-append) so the next record starts on its own line."""
+    try:
+        if path.stat().st_size == 0:
+            return
+    except FileNotFoundError:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+class _Series:
+    """One key's snapshots in append order: parallel arrays, scores flattened 5 per snapshot."""
+
+    __slots__ = ("ts", "off", "scores")
+
+    def __init__(self):
+        self.ts = array("d")
+        self.off = array("q")
+        self.scores = array("h")
+
+    def add(self, ts: float, off: int, scores: Tuple[int, ...]) -> None:
+        self.ts.append(ts)
+        self.off.append(off)
+        self.scores.extend(scores)
+
+    def window(self, since: Optional[float], until: Optional[float]) -> Tuple[int, int]:
+        lo = 0 if since is None else bisect_left(self.ts, since)
+        hi = len(self.ts) if until is None else bisect_right(self.ts, until)
+        return lo, hi
+
+
+class HistoryStore:
+    def __init__(self, directory: Path, name: str = "alignment"):
+        self.dir = Path(directory)
+        self.data_path = self.dir / f"{name}.jsonl"
+        self.index_path = self.dir / f"{name}.idx"
+        self._lock = threading.Lock()
+        self._series: Dict[str, _Series] = {}
+        self._idx_pos = 0  # bytes of the index file already loaded
+        self._loaded = False
+
+    # ----- index -----
+
+    def _tail_index(self) -> None:
+        """Load index lines appended since the last call (ours or another process's)."""
+        try:
+            size = self.index_path.stat().st_size
+        except FileNotFoundError:
+            return
+        if size <= self._idx_pos:
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(self._idx_pos)
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # being written; picked up next time
+                self._idx_pos += len(raw)
+                try:
+                    key, ts, off, scores = raw.decode("utf-8").rstrip("\n").split("\t")
+                    vals = tuple(int(v) for v in scores.split(","))
+                    self._series.setdefault(key, _Series()).add(float(ts), int(off), vals)
+                except ValueError:
+                    continue
+
+    def _repair(self) -> None:
+        """Index data lines a crash left unindexed (data is appended before the index)."""
+        if not self.data_path.exists():
+            return
+        last = max((s.off[-1] for s in self._series.values() if len(s.off)), default=-1)
+        lines = []
+        with open(self.data_path, "rb") as f:
+            if last >= 0:
+                f.seek(last)
+                f.readline()
+            while True:
+                off = f.tell()
+                raw = f.readline()
+                if not raw:
+                    break
+                try:
+                    snap = json.loads(raw)
+                except ValueError:
+                    continue
+                lines.append(self._index_line(snap["key"], snap["ts"], off, _scores(snap)))
+        if lines:
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(lines))
+
+    @staticmethod
+    def _index_line(key: str, ts: float, off: int, scores: Tuple[int, ...]) -> bytes:
+        return f"{key}\t{ts:.3f}\t{off}\t{','.join(map(str, scores))}\n".encode("utf-8")
+
+    def _ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with self._file_lock():
+                _terminate(self.index_path)
+                _terminate(self.data_path)
+                self._tail_index()
+                self._repair()
+            self._loaded = True
+        self._tail_index()
+
+    def _file_lock(self):
+        return _FileLock(self.dir / ".lock")
+
+    # ----- write -----
+
+    @STORE_IO.time(store="history", op="append")
+    def append(self, snapshots: Iterable[Dict[str, Any]]) -> int:
+        """
+        Append snapshots ({"key": ..., "overall": int, "metrics": {...}, ...extra}); ts is
+        added when missing. One data write and one index write per batch.
+        """
+        now = round(time.time(), 3)
+        snaps = []
+        for s in snapshots:
+            key = str(s.get("key") or "").replace("\t", " ").replace("\n", " ")
+            if key:
+                snaps.append(dict(s, key=key, ts=float(s.get("ts") or now)))
+        if not snaps:
+            return 0
+        with self._lock:
+            self._ensure_loaded()
+            with self._file_lock():
+                with open(self.data_path, "ab") as f:
+                    f.seek(0, os.SEEK_END)
+                    off = f.tell()
+                    data, index = [], []
+                    for s in snaps:
+                        line = (json.dumps(s, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+                        data.append(line)
+                        index.append(self._index_line(s["key"], s["ts"], off, _scores(s)))
+                        off += len(line)
+                    f.write(b"".join(data))
+                with open(self.index_path, "ab") as f:
+                    f.write(b"".join(index))
+            self._tail_index()
+        return len(snaps)
+
+    # ----- read -----
+
+    def keys(self, prefix: str = "") -> List[str]:
+        with self._lock:
+            self._ensure_loaded()
+            return sorted(k for k in self._series if k.startswith(prefix))
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            s = self._series.get(key)
+            return len(s.ts) if s else 0
+
+    def _read_at(self, offsets: Iterable[int]) -> List[Dict[str, Any]]:
+        out = []
+        with open(self.data_path, "rb") as f:
+            for off in offsets:
+                f.seek(off)
+                try:
+                    out.append(json.loads(f.readline()))
+                except ValueError:
+                    continue
+        return out
+
+    @STORE_IO.time(store="history", op="read")
+    def query(
+        self,
+        key: str,
+        since: Union[str, float, None] = None,
+        until: Union[str, float, None] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Snapshots for key within [since, until] (epoch seconds or ISO), oldest first;
+        only the newest `limit`. Raises ValueError for an unparseable time.
+        """
+        since, until = to_epoch(since), to_epoch(until)
+        with self._lock:
+            self._ensure_loaded()
+            s = self._series.get(key)
+            if s is None:
+                return []
+            lo, hi = s.window(since, until)
+            if limit is not None:
+                lo = max(lo, hi - limit)
+            offsets = list(s.off[lo:hi])
+        return self._read_at(offsets)
+
+    def latest(self, key: str) -> Optional[Dict[str, Any]]:
+        snaps = self.query(key, limit=1)
+        return snaps[0] if snaps else None
+
+    def trend(
+        self,
+        key: str,
+        since: Union[str, float, None] = None,
+        until: Union[str, float, None] = None,
+        bucket_s: Optional[float] = None,
+        points: int = 60,
+    ) -> List[Dict[str, Any]]:
+        """
+        Downsampled series from the index alone: snapshots grouped into fixed buckets
+        (bucket_s, default span / points) with per-field means plus min/max of overall.
+        """
+        since, until = to_epoch(since), to_epoch(until)
+        with self._lock:
+            self._ensure_loaded()
+            s = self._series.get(key)
+            if s is None:
+                return []
+            lo, hi = s.window(since, until)
+            if lo >= hi:
+                return []
+            ts = s.ts[lo:hi]
+            scores = s.scores[lo * len(SCORE_FIELDS):hi * len(SCORE_FIELDS)]
+        start = ts[0] if since is None else since
+        span = max((ts[-1] if until is None else until) - start, 1.0)
+        width = bucket_s or span / max(1, points)
+        width = max(width, 1.0)
+
+        nf = len(SCORE_FIELDS)
+        buckets: Dict[int, Dict[str, Any]] = {}
+        for i, t in enumerate(ts):
+            b = int((t - start) // width)
+            acc = buckets.get(b)
+            if acc is None:
+                acc = buckets[b] = {"n": 0, "sum": [0] * nf, "cnt": [0] * nf, "min": None, "max": None}
+            acc["n"] += 1
+            row = scores[i * nf:(i + 1) * nf]
+            for j, v in enumerate(row):
+                if v != _MISSING:
+                    acc["sum"][j] += v
+                    acc["cnt"][j] += 1
+            o = row[0]
+            if o != _MISSING:
+                acc["min"] = o if acc["min"] is None else min(acc["min"], o)
+                acc["max"] = o if acc["max"] is None else max(acc["max"], o)
+
+        out = []
+        for b in sorted(buckets):
+            acc = buckets[b]
+            t0 = start + b * width
+            point: Dict[str, Any] = {"ts": round(t0, 3), "at": iso_utc(t0), "n": acc["n"]}
+            for j, f in enumerate(SCORE_FIELDS):
+                point[f] = round(acc["sum"][j] / acc["cnt"][j], 1) if acc["cnt"][j] else None
+            point["overall_min"], point["overall_max"] = acc["min"], acc["max"]
+            out.append(point)
+        return out
+
+
+class _FileLock:
+    """Exclusive advisory lock on a sidecar file (no-op where fcntl is unavailable)."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._f = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self._f = open(self.path, "a")
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._f is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+            self._f.close()
+            self._f = None
@@ -18,16 +18,20 @@ Usage:
 """
 
 import argparse
+import hashlib
 import json
 import os
 import re
+import threading
+import time
 import sys
 import tempfile
 import logging
+from collections import OrderedDict
 from dataclasses import dataclass, asdict
+from string import Formatter
 from pathlib import Path
-from typing import Dict, List, Any, Tuple
-from tqdm import tqdm
+from typing import Callable, Dict, List, Any, Optional, Tuple
 
 # PDF & OCR libs
 from PyPDF2 import PdfReader
@@ -36,8 +40,16 @@ import pytesseract
 from PIL import Image
 
 
-from .llm import run_llm
+from .llm import LLM_MAX_ATTEMPTS, LLM_UNAVAILABLE, VerdictParseError, run_llm, score_schema
+from .llm_pool import POOL
+from .checkpoint import CheckpointLog
+from .explanations import pair_key, profile_key_prefix
+from .resilience import CancelToken, Cancelled
+from .scheduler import Job
+from .singleflight import SingleFlight
+from .textcache import cached_text
 from logger import SimpleAppLogger
+from metrics import ALIGN_COALESCED, LLM_FALLBACKS, LLM_RETRIES, PDF_EXTRACT_DURATION, PDF_PAGE_DURATION, record_cache
 
 # LLM bindings
 # from llama_cpp import Llama
@@ -58,13 +70,28 @@ EXPECTED_KEYS = [
     "overall_alignment",
     "explanation",
 ]
+SCORE_KEYS = [k for k in EXPECTED_KEYS if k != "explanation"]
+# JSON schemas passed to the model as `format` (constrained decoding)
+VERDICT_SCHEMA = score_schema(SCORE_KEYS, ["explanation"])
+SCORES_ONLY_SCHEMA = score_schema(SCORE_KEYS)
+EXPLANATION_SCHEMA = score_schema([], ["explanation"])
+# Generation cap for scores-only calls: five small ints in JSON need well under this.
+SCORES_ONLY_NUM_PREDICT = int(os.environ.get("IEP_SCORES_NUM_PREDICT", "128"))
+
+# Prompt layout:
+#   worksheet_first: instructions + worksheet text first, student block last. Consecutive
+#                    prompts for one worksheet share a long prefix, so the backend's KV /
+#                    prefix cache serves most of prompt eval for the 2nd..Nth student.
+#   student_first:   original layout (student profile before the worksheet).
+PROMPT_LAYOUTS = ("worksheet_first", "student_first")
+PROMPT_LAYOUT = os.environ.get("IEP_PROMPT_LAYOUT", "worksheet_first").lower()
 
 # ---------- Helpers ----------
 
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 logging.getLogger("httpx").setLevel(logging.ERROR)
 logger = SimpleAppLogger(
-    str(LOG_DIR), "iep_alignment_pipeline", logging.INFO
+    str(LOG_DIR), "iep_alignment_pipeline", logging.INFO, rate_limit=5
 ).get_logger()
 
 
@@ -87,10 +114,12 @@ def extract_text_from_searchable_pdf(path: Path) -> str:
     try:
         reader = PdfReader(str(path))
         for p in reader.pages:
+            t0 = time.perf_counter()
             try:
                 txt = p.extract_text() or ""
             except Exception:
                 txt = ""
+            PDF_PAGE_DURATION.observe(time.perf_counter() - t0, method="text")
             text_chunks.append(txt)
     except Exception as e:
         logger.warning(f"PyPDF2 failed for {path}: {e}")
@@ -101,17 +130,23 @@ def ocr_pdf(path: Path, dpi=300, pages_limit=None) -> str:
     """Perform OCR using pdf2image + pytesseract."""
     text_chunks = []
     try:
+        t0 = time.perf_counter()
         images = convert_from_path(str(path), dpi=dpi)
         if pages_limit:
             images = images[:pages_limit]
+        # rasterizing happens for all pages at once; spread it evenly across pages
+        render_per_page = (time.perf_counter() - t0) / max(1, len(images))
         for img in images:
+            t1 = time.perf_counter()
             txt = pytesseract.image_to_string(img)
+            PDF_PAGE_DURATION.observe(render_per_page + time.perf_counter() - t1, method="ocr")
             text_chunks.append(txt)
     except Exception as e:
         logger.warning(f"OCR failed for {path}: {e}")
     return "\n".join(text_chunks).strip()
 
 
+@PDF_EXTRACT_DURATION.time(pipeline="iep")
 def extract_text_from_pdf(path: Path, ocr_if_empty=True, pages_limit=None) -> str:
     text = extract_text_from_searchable_pdf(path)
     if (not text or len(text) < 50) and ocr_if_empty:
@@ -134,9 +169,23 @@ def extract_text_from_file(path: Path) -> str:
 
 # ---------- IEP Normalization ----------
 
+# normalized profiles kept per IEP content hash (see load_student_profile)
+STUDENT_PROFILE_CACHE_ITEMS = int(os.environ.get("STUDENT_PROFILE_CACHE_ITEMS", "1024"))
+
 
 @dataclass
 class StudentProfile:
+    """
+    A normalized IEP. Treat as immutable: the prompt block and key prefix below are
+    rendered once in __post_init__ and reused for every pair the student is in.
+    """
+
+    __slots__ = (
+        "student_name", "grade", "designation", "strengths", "challenges",
+        "education_goals", "accommodations", "meta",
+        "profile_block", "key_prefix",
+    )
+
     student_name: str
     grade: str
     designation: str
@@ -146,6 +195,23 @@ class StudentProfile:
     accommodations: Dict[str, str]
     meta: Dict[str, Any]
 
+    def __post_init__(self):
+        top_goals = "; ".join(f"{k}: {v}" for k, v in list(self.education_goals.items())[:3])
+        key_accommodations = "; ".join(f"{k}: {v}" for k, v in list(self.accommodations.items())[:3])
+        # the STUDENT PROFILE lines of every prompt template
+        self.profile_block = (
+            f"Name: {self.student_name}\n"
+            f"Grade: {self.grade}\n"
+            f"Designation: {self.designation}\n"
+            f"Strengths: {self.strengths or 'N/A'}\n"
+            f"Challenges: {self.challenges or 'N/A'}\n"
+            f"Top goals: {top_goals or 'N/A'}\n"
+            f"Key accommodations: {key_accommodations or 'N/A'}"
+        )
+        # explanations.pair_key hashes the profile before the worksheet text; this is that
+        # hash state, copied per pair instead of re-serializing the profile every time
+        self.key_prefix = profile_key_prefix(self)
+
 
 def normalize_iep(raw: Dict) -> StudentProfile:
     # Extract fields robustly
@@ -157,34 +223,25 @@ def normalize_iep(raw: Dict) -> StudentProfile:
     strengths = []
     challenges = []
     perf = performance or ""
+    low = perf.lower()
     # crude heuristics: look for words
     # If you want better extraction, add an NLP step
-    (
-        strengths.append(
-            "demonstrates strengths in pattern recognition and problem-solving"
-        )
-        if "problem" in perf.lower() or "pattern" in perf.lower()
-        else None
-    )
-    (
-        strengths.append(
-            "strong understanding in math and science when instructions are broken down"
-        )
-        if "math" in perf.lower() or "science" in perf.lower()
-        else None
-    )
-    if "overwhelm" in perf.lower() or "noise" in perf.lower():
+    if "problem" in low or "pattern" in low:
+        strengths.append("demonstrates strengths in pattern recognition and problem-solving")
+    if "math" in low or "science" in low:
+        strengths.append("strong understanding in math and science when instructions are broken down")
+    if "overwhelm" in low or "noise" in low:
         challenges.append(
             "sensitivity to sensory input and difficulty with unexpected changes"
         )
-    if "impulsivity" in perf.lower() or "attention" in perf.lower():
+    if "impulsivity" in low or "attention" in low:
         challenges.append("challenges with attention and impulsivity")
     # fallback: put the raw performance as either strengths or challenges depending on keywords
     if not strengths and perf:
         strengths.append(perf.strip().split(".")[0])
     if not challenges and perf:
         # if it contains 'struggles' or 'challenges' put it as challenge
-        if "strug" in perf.lower() or "challeng" in perf.lower():
+        if "strug" in low or "challeng" in low:
             challenges.append(perf.strip().split(".")[0])
     strengths_text = " ; ".join([s for s in strengths if s])
     challenges_text = " ; ".join([c for c in challenges if c]) or perf.strip()
@@ -200,31 +257,35 @@ def normalize_iep(raw: Dict) -> StudentProfile:
     )
 
 
-# ---------- Prompt Compiler ----------
+_profile_lock = threading.Lock()
+_profiles: "OrderedDict[str, StudentProfile]" = OrderedDict()
 
-ALIGNMENT_PROMPT_TEMPLATE = """
-You are an expert special education analyst. You will evaluate how well a specific worksheet aligns with a specific student's IEP.
-Follow instructions exactly and return only valid JSON.
-
-STUDENT PROFILE (concise summary):
-Name: {student_name}
-Grade: {grade}
-Designation: {designation}
-Strengths: {strengths}
-Challenges: {challenges}
-Top goals: {top_goals}
-Key accommodations: {key_accommodations}
 
-WORKSHEET METADATA:
-Worksheet ID: {worksheet_id}
-Worksheet Title: {worksheet_title}
+def load_student_profile(path: Path) -> StudentProfile:
+    """
+    normalize_iep of a student JSON file, cached by a hash of the file's bytes: an
+    unchanged IEP is parsed and normalized once per process, an edited one misses.
+    Raises like safe_load_json_file for unreadable / invalid files.
+    """
+    data = Path(path).read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    with _profile_lock:
+        profile = _profiles.get(digest)
+        if profile is not None:
+            _profiles.move_to_end(digest)
+    record_cache("student_profile", profile is not None)
+    if profile is None:
+        profile = normalize_iep(json.loads(data.decode("utf-8")))
+        with _profile_lock:
+            _profiles[digest] = profile
+            while len(_profiles) > STUDENT_PROFILE_CACHE_ITEMS:
+                _profiles.popitem(last=False)
+    return profile
 
-WORKSHEET FULL TEXT:
-{worksheet_text}
 
-TASK:
-Evaluate alignment between this worksheet and the student's needs.
+# ---------- Prompt Compiler ----------
 
+OUTPUT_SPEC = """
 You must RETURN a JSON object only with these keys:
 - understanding_fit: integer 0-100 (how well the worksheet supports student's academic understanding goals)
 - accessibility_fit: integer 0-100 (how accessible is the worksheet given student's challenges)
@@ -239,38 +300,131 @@ SCORING RULES:
 - explanation must be concise.
 - Do not output ANY extra text outside the JSON.
 - Do not add ANY comments on individual JSON entries.
+""".strip()
+
+# Scores-only: same numeric keys, no explanation (generated later on demand)
+OUTPUT_SPEC_SCORES_ONLY = """
+You must RETURN a JSON object only with these keys:
+- understanding_fit: integer 0-100 (how well the worksheet supports student's academic understanding goals)
+- accessibility_fit: integer 0-100 (how accessible is the worksheet given student's challenges)
+- accommodation_fit: integer 0-100 (how well accommodations listed would allow success)
+- engagement_fit: integer 0-100 (how engaging / motivating the worksheet is for the student)
+- overall_alignment: integer 0-100 (summary alignment)
+
+SCORING RULES:
+- Use 0-100 integer values.
+- overall_alignment should be close to the average of the four numeric scores (allow 5 points tolerance).
+- Do not output ANY extra text outside the JSON.
+- Do not add ANY comments on individual JSON entries.
+""".strip()
+
+# Explanation for scores that were already assigned by a scores-only run
+OUTPUT_SPEC_EXPLAIN = """
+These scores were already assigned for this worksheet and student:
+{scores}
+
+You must RETURN a JSON object only with this key:
+- explanation: short string (1-3 brief sentences explaining top reasons behind the scores)
+
+RULES:
+- Do not change or restate the scores.
+- explanation must be concise.
+- Do not output ANY extra text outside the JSON.
+""".strip()
+
+ALIGNMENT_PROMPT_TEMPLATE = """
+You are an expert special education analyst. You will evaluate how well a specific worksheet aligns with a specific student's IEP.
+Follow instructions exactly and return only valid JSON.
+
+STUDENT PROFILE (concise summary):
+{student_profile}
+
+WORKSHEET METADATA:
+Worksheet ID: {worksheet_id}
+Worksheet Title: {worksheet_title}
+
+WORKSHEET FULL TEXT:
+{worksheet_text}
+
+TASK:
+Evaluate alignment between this worksheet and the student's needs.
+
+{output_spec}
+
+Produce the JSON now.
+"""
+
+
+WORKSHEET_FIRST_PROMPT_TEMPLATE = """
+You are an expert special education analyst. You will evaluate how well a specific worksheet aligns with a specific student's IEP.
+Follow instructions exactly and return only valid JSON.
+
+{output_spec}
+
+WORKSHEET METADATA:
+Worksheet ID: {worksheet_id}
+Worksheet Title: {worksheet_title}
+
+WORKSHEET FULL TEXT:
+{worksheet_text}
+
+STUDENT PROFILE (concise summary):
+{student_profile}
+
+TASK:
+Evaluate alignment between the worksheet above and this student's needs.
 
 Produce the JSON now.
 """
 
+PROMPT_TEMPLATES = {
+    "worksheet_first": WORKSHEET_FIRST_PROMPT_TEMPLATE,
+    "student_first": ALIGNMENT_PROMPT_TEMPLATE,
+}
+
+
+def _template_parts(layout: str, output_spec: str) -> List[str]:
+    """
+    The layout's template split at its placeholders, with output_spec already filled in:
+    literal text at even indexes, field names at odd ones. Cached per (layout, spec).
+    """
+    key = (layout, output_spec)
+    parts = _TEMPLATE_PARTS.get(key)
+    if parts is None:
+        parts = [""]
+        for literal, field_name, _, _ in Formatter().parse(PROMPT_TEMPLATES[layout]):
+            parts[-1] += literal
+            if field_name == "output_spec":
+                parts[-1] += output_spec
+            elif field_name is not None:
+                parts += [field_name, ""]
+        if len(_TEMPLATE_PARTS) < 64:  # a handful of layouts x specs; explain specs vary
+            _TEMPLATE_PARTS[key] = parts
+    return parts
+
+
+_TEMPLATE_PARTS: Dict[Tuple[str, str], List[str]] = {}
+
 
 def compile_alignment_prompt(
     student: StudentProfile,
     worksheet_text: str,
     worksheet_id: str,
     worksheet_title: str = "",
+    layout: str = None,
+    output_spec: str = OUTPUT_SPEC,
 ) -> str:
-    # Prepare concise pieces
-    top_goals = "; ".join(
-        [f"{k}: {v}" for k, v in list(student.education_goals.items())[:3]]
-    )
-    key_accommodations = "; ".join(
-        [f"{k}: {v}" for k, v in list(student.accommodations.items())[:3]]
-    )
-
-    prompt = ALIGNMENT_PROMPT_TEMPLATE.format(
-        student_name=student.student_name,
-        grade=student.grade,
-        designation=student.designation,
-        strengths=student.strengths or "N/A",
-        challenges=student.challenges or "N/A",
-        top_goals=top_goals or "N/A",
-        key_accommodations=key_accommodations or "N/A",
-        worksheet_id=worksheet_id,
-        worksheet_title=worksheet_title or "N/A",
-        worksheet_text=worksheet_text[:2500],  # keep prompt size bounded
-    )
-    return prompt
+    layout = (layout or PROMPT_LAYOUT).lower()
+    if layout not in PROMPT_TEMPLATES:
+        raise ValueError(f"Unknown prompt layout {layout!r}; expected one of {PROMPT_LAYOUTS}")
+    values = {
+        "student_profile": student.profile_block,
+        "worksheet_id": worksheet_id,
+        "worksheet_title": worksheet_title or "N/A",
+        "worksheet_text": worksheet_text[:2500],  # keep prompt size bounded
+    }
+    parts = _template_parts(layout, output_spec)
+    return "".join(p if i % 2 == 0 else values[p] for i, p in enumerate(parts))
 
 
 # ---------- Response Parsing & Normalization ----------
@@ -320,34 +474,240 @@ def enforce_schema_and_normalize(raw: Dict) -> Dict:
 # ---------- Pipeline: single worksheet x single student ----------
 
 
+def parse_llm_json(raw_output: str) -> Dict:
+    """Parse a verdict; tolerates the ```json fences free-form (unconstrained) output adds."""
+    cleaned_output = (raw_output or "").strip().strip("`").strip()
+    if cleaned_output.startswith("json"):
+        cleaned_output = cleaned_output[4:]
+    parsed = json.loads(cleaned_output)
+    if not isinstance(parsed, dict):
+        raise ValueError(f"expected a JSON object, got {type(parsed).__name__}")
+    return parsed
+
+
 def evaluate_alignment_for_pair(
     student: StudentProfile,
     worksheet_text: str,
     worksheet_id: str,
     worksheet_title: str = "",
+    scores_only: bool = False,
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
 ) -> Dict:
+    """
+    One verdict for a worksheet x student pair.
+    scores_only skips the explanation (schema + prompt) and caps generation at
+    SCORES_ONLY_NUM_PREDICT tokens; the returned explanation is "".
+    cancel is checked before every attempt (raises Cancelled); job places the calls in
+    the LLM pool's queue (see scheduler.py).
+    Raises VerdictParseError when every attempt fails to parse: there is no score to return.
+    """
     prompt = compile_alignment_prompt(
-        student, worksheet_text, worksheet_id, worksheet_title
+        student,
+        worksheet_text,
+        worksheet_id,
+        worksheet_title,
+        output_spec=OUTPUT_SPEC_SCORES_ONLY if scores_only else OUTPUT_SPEC,
     )
-    raw_output = run_llm(prompt=prompt)
-    cleaned_output = raw_output.strip("```json").strip().replace("\n", "")
-    # print(raw_output)
-    logger.info(
-        f"LLM Output for {student.student_name}, {worksheet_title}: {cleaned_output[:150]}"
+    required = SCORE_KEYS if scores_only else EXPECTED_KEYS
+    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+        if attempt > 1:
+            LLM_RETRIES.inc(pipeline="iep")
+        raw_output = run_llm(
+            prompt=prompt,
+            format=SCORES_ONLY_SCHEMA if scores_only else VERDICT_SCHEMA,
+            options={"num_predict": SCORES_ONLY_NUM_PREDICT} if scores_only else None,
+            tags={
+                "pipeline": "iep",
+                "worksheet": worksheet_id,
+                "student": student.student_name,
+                "attempt": attempt,
+            },
+            cancel=cancel,
+            job=job,
+        )
+        logger.info(
+            "LLM Output for %s, %s: %s", student.student_name, worksheet_title, raw_output[:150]
+        )
+        try:
+            parsed_json = parse_llm_json(raw_output)
+        except Exception as e:
+            logger.warning(
+                f"Failed to parse JSON from LLM (attempt {attempt}/{LLM_MAX_ATTEMPTS}): {e}"
+            )
+            continue
+        if set(required) <= set(parsed_json.keys()):
+            return enforce_schema_and_normalize(parsed_json)
+    logger.error(
+        f"Giving up on {worksheet_id} x {student.student_name} after {LLM_MAX_ATTEMPTS} attempts"
     )
-    try:
-        parsed_json = json.loads(cleaned_output)
-    except Exception as e:
-        logger.warning(f"Failed to parse JSON from LLM: {e}")
-        parsed_json = None
+    raise VerdictParseError(f"no parseable verdict for {worksheet_id} x {student.student_name}")
+
 
-    if parsed_json is None or set(parsed_json.keys()) != set(EXPECTED_KEYS):
-        normalized = evaluate_alignment_for_pair(
-            student, worksheet_text, worksheet_id, worksheet_title
+def explain_alignment_for_pair(
+    student: StudentProfile,
+    worksheet_text: str,
+    worksheet_id: str,
+    worksheet_title: str = "",
+    scores: Dict = None,
+    job: Optional[Job] = None,
+) -> Dict:
+    """
+    Second phase of two-phase scoring: the explanation for a pair.
+    With known scores the model only writes the explanation for them; without
+    scores this is a full verdict (scores + explanation).
+    """
+    if not scores:
+        return evaluate_alignment_for_pair(student, worksheet_text, worksheet_id, worksheet_title, job=job)
+
+    scores_block = "\n".join(f"{k}: {int(scores.get(k, 0))}" for k in SCORE_KEYS)
+    prompt = compile_alignment_prompt(
+        student,
+        worksheet_text,
+        worksheet_id,
+        worksheet_title,
+        output_spec=OUTPUT_SPEC_EXPLAIN.format(scores=scores_block),
+    )
+    explanation = ""
+    for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+        raw_output = run_llm(
+            prompt=prompt,
+            format=EXPLANATION_SCHEMA,
+            tags={
+                "pipeline": "iep-explain",
+                "worksheet": worksheet_id,
+                "student": student.student_name,
+                "attempt": attempt,
+            },
+            job=job,
         )
-    else:
-        normalized = enforce_schema_and_normalize(parsed_json)
-    return normalized
+        try:
+            explanation = str(parse_llm_json(raw_output).get("explanation", "")).strip()
+        except Exception as e:
+            logger.warning(
+                f"Failed to parse explanation (attempt {attempt}/{LLM_MAX_ATTEMPTS}): {e}"
+            )
+            continue
+        if explanation:
+            break
+    verdict = enforce_schema_and_normalize(dict(scores, explanation=explanation))
+    return verdict
+
+
+# ---------- Pair evaluation ----------
+
+
+# identical pairs from concurrent runs (two requests overlapping on a worksheet x student)
+# share one LLM call
+PAIR_FLIGHTS = SingleFlight()
+
+
+def neutral_verdict() -> Dict:
+    """Placeholder for a pair the LLM could not score and nothing was cached for."""
+    out = {k: 50 for k in SCORE_KEYS}
+    out.update({"explanation": "", "fallback": "neutral"})
+    return out
+
+
+def evaluate_pairs(
+    worksheets: Dict[str, Dict],
+    worksheet_ids: List[str],
+    students: List[StudentProfile],
+    scores_only: bool = False,
+    cancel: Optional[CancelToken] = None,
+    fallback: Optional[Callable[[str, StudentProfile, str], Optional[Dict]]] = None,
+    job: Optional[Job] = None,
+    checkpoint: Optional[CheckpointLog] = None,
+    reuse: Optional[Callable[[str, bool], Optional[Dict]]] = None,
+) -> List[Tuple[str, StudentProfile, Dict]]:
+    """
+    Score every (worksheet, student) pair, worksheet-major. Pairs run concurrently up to
+    the LLM pool's capacity (sum of per-host limits), so a rollup spreads across hosts;
+    the pool keeps each worksheet's pairs on one host while it has a free slot (affinity
+    on the worksheet tag), where the worksheet_first prompt prefix is cached.
+    Returns [(worksheet_id, student, verdict), ...] in that order.
+
+    cancel: stops the run between pairs/attempts (raises Cancelled).
+    fallback(worksheet_id, student, text): when given, a pair whose LLM call fails with
+    an LLM_UNAVAILABLE error gets this verdict (or neutral_verdict() if it returns None)
+    instead of failing the run. A pair whose output never parsed (VerdictParseError) is
+    handled the same way even without one. Fallback verdicts carry a "fallback" key and
+    are never checkpointed.
+    A pair already being scored by another run (same inputs, same scores_only, same
+    priority class) waits for that run's verdict instead of calling the LLM again
+    (PAIR_FLIGHTS). Keying on the class keeps an interactive run from queueing behind
+    a bulk rollup's pair.
+    job: the run's scheduling identity; its outstanding pair count drives
+    shortest-job-first in the pool queue, and job.max_inflight caps the run's concurrency.
+    checkpoint: pairs already in the log are not re-scored; every fresh (non-fallback)
+    verdict is appended as soon as it lands, so a crashed run resumes where it stopped.
+    reuse(pair_key, scores_only): a previously stored verdict to use instead of scoring
+    the pair, or None (see ExplanationStore.fresh).
+    """
+    pairs = [(wid, s) for wid in worksheet_ids for s in students]
+    if checkpoint is not None and len(checkpoint):
+        logger.info("Resuming from checkpoint %s (%d pairs done)", checkpoint.path.name, len(checkpoint))
+    if job is not None:
+        job.add_pairs(len(pairs))
+
+    def _score(s: StudentProfile, text: str, wid: str) -> Dict:
+        pkey = pair_key(s, text)
+        if checkpoint is not None:
+            done = checkpoint.get(pkey, scores_only)
+            if done is not None:
+                return done
+        if reuse is not None:
+            stored = reuse(pkey, scores_only)
+            if stored is not None:
+                return stored
+        key = (pkey, scores_only, job.priority if job is not None else None)
+        while True:
+            try:
+                verdict, shared = PAIR_FLIGHTS.do(
+                    key,
+                    lambda: evaluate_alignment_for_pair(
+                        s,
+                        text,
+                        worksheet_id=wid,
+                        worksheet_title=worksheets[wid].get("title") or "",
+                        scores_only=scores_only,
+                        cancel=cancel,
+                        job=job,
+                    ),
+                )
+            except Cancelled:
+                if cancel is not None and cancel.cancelled:
+                    raise
+                continue  # the run we attached to was cancelled, not ours: score it ourselves
+            if shared:
+                ALIGN_COALESCED.inc(scope="pair")
+                verdict = dict(verdict)
+            if checkpoint is not None:
+                checkpoint.append(pkey, wid, s.student_name, verdict, scores_only)
+            return verdict
+
+    def _one(pair: Tuple[str, StudentProfile]) -> Tuple[str, StudentProfile, Dict]:
+        wid, s = pair
+        text = worksheets[wid].get("text") or ""
+        try:
+            verdict = _score(s, text, wid)
+        except LLM_UNAVAILABLE + (VerdictParseError,) as e:
+            if fallback is None and not isinstance(e, VerdictParseError):
+                raise
+            verdict = (fallback(wid, s, text) if fallback is not None else None) or neutral_verdict()
+            LLM_FALLBACKS.inc(pipeline="iep", source=verdict.get("fallback", "cached"))
+            logger.warning("No verdict for %s x %s (%s); using %s verdict",
+                           wid, s.student_name, e, verdict.get("fallback"))
+        return wid, s, verdict
+
+    def _tracked(pair: Tuple[str, StudentProfile]) -> Tuple[str, StudentProfile, Dict]:
+        try:
+            return _one(pair)
+        finally:
+            if job is not None:
+                job.pair_done()
+
+    return POOL.map(_tracked, pairs, max_workers=job.max_inflight if job is not None else None, cancel=cancel)
 
 
 # ---------- Assemble score table ----------
@@ -388,11 +748,11 @@ def collect_worksheets_texts(worksheets_dir: Path) -> Dict[str, Dict]:
         worksheet_id = f"{fname}".strip("_")
         title = fname
         try:
-            text = extract_text_from_file(fpath)
+            text = cached_text(worksheets_dir, extract_text_from_file)
             if not text:
-                logger.warning(f"No text found in {fpath}")
+                logger.warning(f"No text found in {worksheets_dir}")
         except Exception as e:
-            logger.warning(f"Failed to extract text from {fpath}: {e}")
+            logger.warning(f"Failed to extract text from {worksheets_dir}: {e}")
             text = ""
         worksheets[worksheet_id] = {
             "text": text,
@@ -414,7 +774,7 @@ def collect_worksheets_texts(worksheets_dir: Path) -> Dict[str, Dict]:
             worksheet_id = f"{rel.as_posix().replace('/', '_')}_{fname}".strip("_")
             title = fname
             try:
-                text = extract_text_from_file(fpath)
+                text = cached_text(fpath, extract_text_from_file)
                 if not text:
                     logger.warning(f"No text found in {fpath}")
             except Exception as e:
@@ -435,13 +795,11 @@ def load_ieps_from_dir(iep_dir: Path) -> List[StudentProfile]:
             # print(p.name)
             if p.suffix.lower() != ".json" or p.name == "index.json":
                 continue
-            raw = safe_load_json_file(p)
-            profiles.append(normalize_iep(raw))
+            profiles.append(load_student_profile(p))
     elif iep_dir.is_file():
         p = iep_dir
         if p.suffix.lower() == ".json" and p.name != "index.json":
-            raw = safe_load_json_file(p)
-            profiles.append(normalize_iep(raw))
+            profiles.append(load_student_profile(p))
     return profiles
 
 
@@ -467,16 +825,10 @@ def run_pipeline(iep_dir: str, worksheets_dir: str):
     full_results = {wid: {} for wid in worksheet_ids}
 
     # For each worksheet and each student
-    for wid in worksheet_ids:  # tqdm(worksheet_ids, desc="Worksheets")
-        wtext = worksheets[wid]["text"] or ""
-        wtitle = worksheets[wid]["title"]
-        for s in students:
-            eval_result = evaluate_alignment_for_pair(
-                s, wtext, worksheet_id=wid, worksheet_title=wtitle
-            )
-            # store overall
-            results_overall[wid][s.student_name] = int(eval_result["overall_alignment"])
-            full_results[wid][s.student_name] = eval_result
+    for wid, s, eval_result in evaluate_pairs(worksheets, worksheet_ids, students):
+        # store overall
+        results_overall[wid][s.student_name] = int(eval_result["overall_alignment"])
+        full_results[wid][s.student_name] = eval_result
 
     # Build matrix
     matrix_json = assemble_score_matrix(results_overall, student_names, worksheet_ids)
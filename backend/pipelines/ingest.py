@@ -0,0 +1,355 @@
+"""
+ingest.py
+Bulk IEP onboarding: many PDFs (or zips of them) -> validated student JSONs.
+- PDFs are parsed with readpdf.parse_iep_pdf in a process pool (pdfplumber is CPU bound
+  and holds the GIL, so threads would not help)
+- every parse is checked against what normalize_iep (and the UI) expect before it is
+  written; invalid files are reported and skipped, never half-written
+- upsert: a parsed IEP replaces the IEP sections of the existing student with the same
+  PEN (or, without a PEN, the same name); keys the parser does not produce
+  (alignment_pct, ...) are kept. New students get an id from the PDF's file name.
+- writes happen in the calling process, one at a time, atomically (tmp + replace)
+- progress(done, total, item) is called once per file as results arrive
+
+Config (env):
+  IEP_INGEST_WORKERS=0            parser processes (0 = min(cpu count, 8))
+  IEP_INGEST_MAX_FILE_MB=50       larger PDFs (and zip members) are rejected unparsed
+  IEP_INGEST_MAX_FILES=2000       PDFs (zip members included) taken from one batch
+  IEP_INGEST_MAX_UPLOAD_MB=1024   total upload size the API accepts for one batch
+"""
+
+import json
+import logging
+import os
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from jsonstore import bump_rev, read_json, transaction, write_json
+from logger import SimpleAppLogger
+from .readpdf import parse_iep_pdf
+from .resilience import CancelToken
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STU_DIR = BASE_DIR / "data" / "students"
+LOG_DIR = BASE_DIR / "logs"
+
+IEP_INGEST_WORKERS = int(os.environ.get("IEP_INGEST_WORKERS", "0"))
+IEP_INGEST_MAX_FILE_MB = float(os.environ.get("IEP_INGEST_MAX_FILE_MB", "50"))
+IEP_INGEST_MAX_FILES = int(os.environ.get("IEP_INGEST_MAX_FILES", "2000"))
+IEP_INGEST_MAX_UPLOAD_MB = float(os.environ.get("IEP_INGEST_MAX_UPLOAD_MB", "1024"))
+
+# sections readpdf produces; everything else in a student JSON belongs to the app
+IEP_SECTIONS = (
+    "student", "performance_progress", "education_goals", "accommodations",
+    "assessments", "transition_goals", "participants",
+)
+_NON_STUDENT = {"index", "reports"}
+
+logger = SimpleAppLogger(str(LOG_DIR), "ingest", logging.INFO).get_logger()
+
+
+# ---------- Inputs ----------
+
+def _safe_stem(name: str) -> str:
+    stem = Path(name).stem
+    return "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in stem).strip("_") or "iep"
+
+
+def count_pdfs(name: str, src: Union[Path, IO[bytes]]) -> int:
+    """PDFs an input contributes: 1 for a .pdf, its PDF members for a .zip (0 if unreadable)."""
+    suffix = Path(name).suffix.lower()
+    if suffix == ".pdf":
+        return 1
+    if suffix != ".zip":
+        return 0
+    try:
+        with zipfile.ZipFile(src) as zf:
+            return sum(1 for i in zf.infolist() if not i.is_dir() and i.filename.lower().endswith(".pdf"))
+    except zipfile.BadZipFile:
+        return 0
+
+
+class _TooLarge(Exception):
+    pass
+
+
+def _copy_capped(src: IO[bytes], dst: IO[bytes], limit: int) -> None:
+    # the size in a zip header is the archive's claim; count what actually inflates
+    copied = 0
+    while True:
+        chunk = src.read(1024 * 1024)
+        if not chunk:
+            return
+        copied += len(chunk)
+        if copied > limit:
+            raise _TooLarge()
+        dst.write(chunk)
+
+
+def expand_inputs(
+    paths: Iterable[Path], scratch: Path, labels: Optional[Dict[Path, str]] = None
+) -> Tuple[List[Path], List[Dict[str, Any]], Dict[Path, str]]:
+    """
+    PDFs as given; zips are unpacked into scratch (PDF members only, flattened names).
+    PDFs past the first IEP_INGEST_MAX_FILES are rejected without being unpacked.
+    labels maps an input to the name reported for it (default: its file name).
+    Returns (pdfs, rejected, names): rejected items are already-final results, names is
+    the label of every PDF ("<zip>:<member>" for zip members), to pass to ingest_pdfs.
+    """
+    limit = int(IEP_INGEST_MAX_FILE_MB * 1024 * 1024)
+    labels = labels or {}
+    pdfs: List[Path] = []
+    rejected: List[Dict[str, Any]] = []
+    names: Dict[Path, str] = {}
+    too_many = [f"over the {IEP_INGEST_MAX_FILES}-file limit for one batch"]
+    for p in paths:
+        p = Path(p)
+        name = labels.get(p, p.name)
+        suffix = p.suffix.lower()
+        if suffix == ".pdf":
+            if len(pdfs) >= IEP_INGEST_MAX_FILES:
+                rejected.append(_result(name, "failed", errors=too_many))
+            elif p.stat().st_size > limit:
+                rejected.append(_result(name, "failed", errors=[f"larger than {IEP_INGEST_MAX_FILE_MB:g} MB"]))
+            else:
+                pdfs.append(p)
+                names[p] = name
+        elif suffix == ".zip":
+            try:
+                with zipfile.ZipFile(p) as zf:
+                    for info in zf.infolist():
+                        if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                            continue
+                        label = f"{name}:{info.filename}"
+                        if len(pdfs) >= IEP_INGEST_MAX_FILES:
+                            rejected.append(_result(label, "failed", errors=too_many))
+                            continue
+                        if info.file_size > limit:
+                            rejected.append(_result(label, "failed", errors=[f"larger than {IEP_INGEST_MAX_FILE_MB:g} MB"]))
+                            continue
+                        # flatten member paths: no traversal out of scratch, no name clashes
+                        out = scratch / f"{len(pdfs):05d}_{_safe_stem(info.filename)}.pdf"
+                        out.parent.mkdir(parents=True, exist_ok=True)
+                        try:
+                            with zf.open(info) as src, open(out, "wb") as dst:
+                                _copy_capped(src, dst, limit)
+                        except _TooLarge:
+                            out.unlink(missing_ok=True)
+                            rejected.append(_result(label, "failed", errors=[f"larger than {IEP_INGEST_MAX_FILE_MB:g} MB"]))
+                            continue
+                        pdfs.append(out)
+                        names[out] = label
+            except zipfile.BadZipFile as e:
+                rejected.append(_result(name, "failed", errors=[f"bad zip: {e}"]))
+        else:
+            rejected.append(_result(name, "failed", errors=["not a .pdf or .zip"]))
+    return pdfs, rejected, names
+
+
+def _result(file: str, status: str, **extra) -> Dict[str, Any]:
+    out = {"file": file, "status": status, "id": None, "student_name": None, "errors": [], "warnings": []}
+    out.update(extra)
+    return out
+
+
+# ---------- Parse (worker process) ----------
+
+def _parse_worker(path: str) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+    t0 = time.perf_counter()
+    try:
+        return parse_iep_pdf(path), None, time.perf_counter() - t0
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", time.perf_counter() - t0
+
+
+# ---------- Validate ----------
+
+def _looks_like_label(v: Any) -> bool:
+    """'GRADE:' picked up as a value: the field was blank and the parser read the next label."""
+    v = str(v or "").strip()
+    return v.endswith(":") and v.upper() == v
+
+
+def validate_iep(raw: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """(errors, warnings) for a parsed IEP; errors mean it must not be stored."""
+    from .iep_alignment_pipeline import normalize_iep
+
+    errors: List[str] = []
+    warnings: List[str] = []
+    stu = raw.get("student")
+    if not isinstance(stu, dict):
+        return ["missing student section"], warnings
+    if not str(stu.get("student_name") or "").strip() or _looks_like_label(stu.get("student_name")):
+        errors.append("no STUDENT NAME found")
+    for key in ("education_goals", "accommodations"):
+        val = raw.get(key)
+        if not isinstance(val, dict) or not all(isinstance(v, str) for v in val.values()):
+            errors.append(f"{key} is not a mapping of text fields")
+        elif not any(v.strip() for v in val.values()):
+            warnings.append(f"{key} is empty")
+    for key in ("performance_progress", "assessments", "transition_goals"):
+        if not isinstance(raw.get(key, ""), str):
+            errors.append(f"{key} is not text")
+    if not isinstance(raw.get("participants", []), list):
+        errors.append("participants is not a list")
+    for key in ("grade", "pen", "iep_date"):
+        if not str(stu.get(key) or "").strip() or _looks_like_label(stu.get(key)):
+            warnings.append(f"no {key.upper().replace('_', ' ')} found")
+    if not errors:
+        try:
+            normalize_iep(raw)
+        except Exception as e:
+            errors.append(f"normalize_iep failed: {e}")
+    return errors, warnings
+
+
+# ---------- Upsert ----------
+
+def _norm(s: Any) -> str:
+    return " ".join(str(s or "").split()).lower()
+
+
+class StudentIndex:
+    """Existing student files by PEN and by name, kept current as the batch upserts."""
+
+    def __init__(self, students_dir: Path):
+        self.dir = Path(students_dir)
+        self.by_pen: Dict[str, str] = {}
+        self.by_name: Dict[str, str] = {}
+        self.pen_of: Dict[str, str] = {}
+        self.ids = set()
+        self.dir.mkdir(parents=True, exist_ok=True)
+        for p in sorted(self.dir.glob("*.json")):
+            if p.stem.lower() in _NON_STUDENT or p.name.startswith(("_", ".")):
+                continue
+            try:
+                with open(p, "r", encoding="utf-8") as f:
+                    self.add(p.stem, json.load(f))
+            except Exception as e:
+                logger.warning(f"Skipping student file {p.name}: {e}")
+
+    def add(self, sid: str, data: Dict[str, Any]) -> None:
+        stu = data.get("student") or {}
+        self.ids.add(sid)
+        self.pen_of[sid] = _norm(stu.get("pen"))
+        if self.pen_of[sid]:
+            self.by_pen[self.pen_of[sid]] = sid
+        if _norm(stu.get("student_name")):
+            self.by_name[_norm(stu.get("student_name"))] = sid
+
+    def match(self, raw: Dict[str, Any]) -> Optional[str]:
+        stu = raw.get("student") or {}
+        pen = _norm(stu.get("pen"))
+        if pen in self.by_pen:
+            return self.by_pen[pen]
+        sid = self.by_name.get(_norm(stu.get("student_name")))
+        # same name but a different PEN on file is a different student
+        if sid is not None and pen and self.pen_of.get(sid):
+            return None
+        return sid
+
+    def new_id(self, source_name: str) -> str:
+        base = _safe_stem(source_name)
+        sid, n = base, 2
+        while sid in self.ids or sid.lower() in _NON_STUDENT:
+            sid, n = f"{base}-{n}", n + 1
+        return sid
+
+
+def upsert_student(index: StudentIndex, raw: Dict[str, Any], source_name: str, dry_run: bool = False) -> Tuple[str, str]:
+    """Write raw into the students store; returns (id, "created" | "updated")."""
+    with transaction():  # read-merge-write under the store lock, so app-side edits aren't lost
+        sid = index.match(raw)
+        path = index.dir / f"{sid}.json" if sid else None
+        data: Dict[str, Any] = {}
+        if path is not None and path.exists():
+            try:
+                data = read_json(path, {}, store="student")
+            except Exception as e:
+                logger.warning(f"Replacing unreadable student file {path.name}: {e}")
+        action = "updated" if sid else "created"
+        if not sid:
+            sid = index.new_id(source_name)
+            path = index.dir / f"{sid}.json"
+        for key in IEP_SECTIONS:
+            data[key] = raw.get(key, data.get(key))
+        if not dry_run:
+            bump_rev(data)
+            write_json(path, data, store="student")
+    index.add(sid, data)
+    return sid, action
+
+
+# ---------- Driver ----------
+
+def ingest_pdfs(
+    pdfs: List[Path],
+    students_dir: Path = STU_DIR,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[int, int, Dict[str, Any]], None]] = None,
+    cancel: Optional[CancelToken] = None,
+    dry_run: bool = False,
+    names: Optional[Dict[Path, str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Parse, validate and upsert every PDF; one result per file:
+      {file, status: created|updated|invalid|failed, id, student_name, errors, warnings, seconds}
+    names maps a path to the label reported for it (e.g. the uploaded file name).
+    Raises Cancelled if cancel fires; files already written stay written.
+    """
+    names = names or {}
+    total = len(pdfs)
+    results: List[Dict[str, Any]] = []
+    if not pdfs:
+        return results
+    index = StudentIndex(students_dir)
+    n_workers = max(1, min(workers or IEP_INGEST_WORKERS or min(os.cpu_count() or 1, 8), total))
+
+    def _collect(fut, p: Path) -> None:
+        label = names.get(p, p.name)
+        raw, err, seconds = fut.result()
+        if err is not None:
+            item = _result(label, "failed", errors=[err])
+        else:
+            errors, warnings = validate_iep(raw)
+            name = str((raw.get("student") or {}).get("student_name") or "").strip() or None
+            if errors:
+                item = _result(label, "invalid", student_name=name, errors=errors, warnings=warnings)
+            else:
+                try:
+                    sid, action = upsert_student(index, raw, label.rsplit(":", 1)[-1], dry_run=dry_run)
+                    item = _result(label, action, id=sid, student_name=name, warnings=warnings)
+                except OSError as e:
+                    item = _result(label, "failed", student_name=name, errors=[f"write failed: {e}"])
+        item["seconds"] = round(seconds, 3)
+        results.append(item)
+        if progress is not None:
+            progress(len(results), total, item)
+
+    with ProcessPoolExecutor(max_workers=n_workers) as ex:
+        futures = {ex.submit(_parse_worker, str(p)): p for p in pdfs}
+        pending = set(futures)
+        try:
+            while pending:
+                done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                if cancel is not None:
+                    cancel.raise_if_cancelled()
+                for fut in done:
+                    _collect(fut, futures[fut])
+        except BaseException:
+            ex.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    counts = summarize(results)
+    logger.info(f"IEP ingest{' (dry run)' if dry_run else ''}: {total} files with {n_workers} workers: {counts}")
+    return results
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, int]:
+    out = {"created": 0, "updated": 0, "invalid": 0, "failed": 0}
+    for r in results:
+        out[r["status"]] = out.get(r["status"], 0) + 1
+    return out
@@ -1,20 +1,207 @@
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+import httpx
 import ollama
 
+from metrics import LLM_LATENCY
+from .llm_pool import POOL, NoHealthyHostError
+from .resilience import BREAKER, CancelToken, Cancelled, CircuitOpenError
+from .scheduler import Job
+from .telemetry import record_llm_call
+
+# How long Ollama keeps the model (and its prompt cache) resident after a call.
+# Unloading between pairs throws away the cached worksheet prefix; "" = server default.
+LLM_KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")
+
+# Constrained decoding: pass a JSON schema as Ollama's `format` so the sampler can only
+# emit schema-valid JSON. Set LLM_STRUCTURED_OUTPUT=0 for servers that predate it.
+LLM_STRUCTURED_OUTPUT = os.environ.get("LLM_STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+# Upper bound on calls per pair when the output still fails to parse (free-form mode).
+LLM_MAX_ATTEMPTS = max(1, int(os.environ.get("LLM_MAX_ATTEMPTS", "3")))
+
+# "The model server cannot answer right now" (timeouts, refused connections, open breaker),
+# as opposed to bugs; callers may fall back to cached verdicts on these.
+LLM_UNAVAILABLE = (
+    CircuitOpenError,
+    NoHealthyHostError,
+    TimeoutError,
+    ConnectionError,
+    httpx.HTTPError,
+    ollama.RequestError,
+    ollama.ResponseError,
+)
+
+
+class VerdictParseError(RuntimeError):
+    """The model answered, but no attempt (LLM_MAX_ATTEMPTS) parsed into a complete verdict."""
+
 
-def run_llm(prompt: str, model: str = "phi3") -> str:
+def score_schema(int_keys: Iterable[str], text_keys: Iterable[str] = ()) -> Dict[str, Any]:
+    """JSON schema for a flat verdict: 0-100 integers plus short strings, all required."""
+    props: Dict[str, Any] = {k: {"type": "integer", "minimum": 0, "maximum": 100} for k in int_keys}
+    props.update({k: {"type": "string"} for k in text_keys})
+    return {
+        "type": "object",
+        "properties": props,
+        "required": list(props),
+        "additionalProperties": False,
+    }
+
+
+def run_llm(
+    prompt: str,
+    model: str = "phi3",
+    tags: Optional[Dict[str, Any]] = None,
+    keep_alive: Optional[Union[str, float]] = None,
+    format: Optional[Union[str, Dict[str, Any]]] = None,
+    options: Optional[Dict[str, Any]] = None,
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
+) -> str:
     """
     Use ollama Python client if installed. API may change; this is a best-effort wrapper.
+    tags (pipeline / worksheet / student / competency / attempt) are stored with the
+    call's token counts and timings in the telemetry log.
+    keep_alive defaults to LLM_KEEP_ALIVE.
+    format: "json" or a JSON schema dict (see score_schema); ignored when
+    LLM_STRUCTURED_OUTPUT is off.
+    options: Ollama model options for this call, e.g. {"num_predict": 128}.
+    cancel: raises Cancelled instead of waiting for a host slot once it fires.
+    job: scheduling class / user / size for the pool's queue (default: batch).
+    Raises CircuitOpenError without calling out while the breaker is open.
     """
-    response = ollama.chat(
-        model=model,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt,
-            },
-        ],
-    )
+    keep_alive = LLM_KEEP_ALIVE if keep_alive is None else keep_alive
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+    BREAKER.allow()
+    t0 = time.perf_counter()
+    response = None
+    host = None
+    error = None
+    try:
+        # a worksheet's pairs stick to one host while it has a free slot, so its prompt
+        # prefix stays cached there
+        response, host = POOL.chat(
+            affinity=(tags or {}).get("worksheet"),
+            cancel=cancel,
+            job=job,
+            model=model,
+            messages=[
+                {
+                    "role": "user",
+                    "content": prompt,
+                },
+            ],
+            keep_alive=keep_alive or None,
+            format=format if LLM_STRUCTURED_OUTPUT else None,
+            options=options,
+        )
+    except Cancelled as e:
+        error = f"Cancelled: {e}"
+        BREAKER.abandon()
+        raise
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        BREAKER.record(False, error)
+        raise
+    else:
+        BREAKER.record(True)
+    finally:
+        latency = time.perf_counter() - t0
+        LLM_LATENCY.observe(latency, model=model, outcome="ok" if error is None else "error")
+        if host is not None:
+            tags = dict(tags or {}, host=host.name)
+        record_llm_call(response, model, latency, tags=tags, prompt_chars=len(prompt), error=error)
     # ensure it's string
     # print(response)
 
     return response.message.content
+
+
+def stream_llm(
+    messages: List[Dict[str, str]],
+    model: str = "phi3",
+    on_token: Optional[Callable[[str], None]] = None,
+    tags: Optional[Dict[str, Any]] = None,
+    affinity: Optional[str] = None,
+    keep_alive: Optional[Union[str, float]] = None,
+    options: Optional[Dict[str, Any]] = None,
+    cancel: Optional[CancelToken] = None,
+    job: Optional[Job] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    Streaming chat call for interactive use: on_token(piece) as the reply is generated;
+    returns the whole reply. The host slot is held until the stream ends.
+    Ollama reuses its KV cache for the part of a prompt that matches the previous one on
+    the same host, so callers should keep earlier messages byte-identical between turns
+    and pass a stable affinity (e.g. a session id) to stay on that host.
+    Another host is tried only if the first fails before producing any output.
+    Cancelling stops the stream between chunks and raises Cancelled.
+    stats, if given, receives ttft_s, prompt_eval_count and eval_count.
+    """
+    keep_alive = LLM_KEEP_ALIVE if keep_alive is None else keep_alive
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+    BREAKER.allow()
+    t0 = time.perf_counter()
+    parts: List[str] = []
+    last = None
+    host = None
+    error = None
+    tried = []
+    try:
+        while True:
+            host = POOL.acquire(affinity=affinity, exclude=tried, cancel=cancel, job=job)
+            h0 = time.perf_counter()
+            try:
+                for chunk in host.client.chat(
+                    model=model,
+                    messages=messages,
+                    stream=True,
+                    keep_alive=keep_alive or None,
+                    options=options,
+                ):
+                    last = chunk
+                    piece = chunk.message.content or ""
+                    if piece:
+                        if not parts and stats is not None:
+                            stats["ttft_s"] = time.perf_counter() - t0
+                        parts.append(piece)
+                        if on_token is not None:
+                            on_token(piece)
+                    if cancel is not None and cancel.cancelled:
+                        break
+            except Exception as e:
+                POOL.release(host, ok=False, error=f"{type(e).__name__}: {e}")
+                tried.append(host)
+                if parts or len(tried) >= len(POOL.hosts):
+                    raise
+                continue
+            POOL.release(host, ok=True, latency_s=time.perf_counter() - h0)
+            if cancel is not None:
+                cancel.raise_if_cancelled()  # stopped mid-reply: don't pass a partial off as the answer
+            break
+    except Cancelled as e:
+        error = f"Cancelled: {e}"
+        BREAKER.abandon()
+        raise
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        BREAKER.record(False, error)
+        raise
+    else:
+        BREAKER.record(True)
+    finally:
+        latency = time.perf_counter() - t0
+        LLM_LATENCY.observe(latency, model=model, outcome="ok" if error is None else "error")
+        if host is not None:
+            tags = dict(tags or {}, host=host.name)
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        record_llm_call(last, model, latency, tags=tags, prompt_chars=prompt_chars, error=error)
+        if stats is not None and last is not None:
+            stats["prompt_eval_count"] = getattr(last, "prompt_eval_count", None)
+            stats["eval_count"] = getattr(last, "eval_count", None)
+    return "".join(parts)
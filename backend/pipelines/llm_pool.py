@@ -0,0 +1,386 @@
+"""
+llm_pool.py
+Multi-host Ollama pool used by run_llm.
+- hosts + weights from LLM_HOSTS, one ollama.Client per host
+- routing: least outstanding requests per unit of weight, except that a cache-affinity
+  key (a worksheet, a chat session) stays on the host it was first routed to while that
+  host is healthy and has a free slot, so its prompts keep hitting a warm prefix; calls
+  beyond that host's limit spill over to the least loaded one
+- per-host concurrency limit, adapted by an AIMD controller (adaptive_limit.py) between
+  1 and the host's max_inflight; callers wait for a free slot instead of piling onto a box
+- passive ejection after consecutive failures (exponential cool-down), active health
+  probes (ps) readmit hosts, and a failed call fails over to another host
+- map(): run pair evaluations concurrently up to the pool's total capacity
+- every client has an HTTP timeout (LLM_TIMEOUT_S); a CancelToken stops waits for a slot,
+  failover and map() (see resilience.py)
+- waiting callers are granted free slots in scheduler order: priority class, fair share
+  per user, shortest job (see scheduler.py)
+
+Config (env):
+  LLM_HOSTS="http://box1:11434=2,http://box2:11434=1:2"   url[=weight[:max_inflight]]
+                                  default: OLLAMA_HOST or http://127.0.0.1:11434
+  LLM_HOST_CONCURRENCY=1          starting in-flight limit per host
+  LLM_HOST_MAX_INFLIGHT=4         default ceiling for the adaptive limit
+  LLM_EJECT_AFTER=3               consecutive failures before a host is ejected
+  LLM_EJECT_S=30                  first ejection cool-down (doubles, max 10 min)
+  LLM_HEALTH_INTERVAL_S=10        active probe period for ejected hosts (0 = off)
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+import ollama
+
+from metrics import (
+    LLM_HOST_HEALTHY,
+    LLM_HOST_INFLIGHT,
+    LLM_HOST_LIMIT,
+    LLM_HOST_REQUESTS,
+    LLM_QUEUE_DEPTH,
+    LLM_QUEUE_WAIT,
+)
+from .adaptive_limit import AdaptiveLimit
+from .resilience import LLM_TIMEOUT_S, CancelToken
+from .scheduler import PRIORITIES, FairScheduler, Job, Ticket
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+LLM_HOST_CONCURRENCY = max(1, int(os.environ.get("LLM_HOST_CONCURRENCY", "1")))
+LLM_HOST_MAX_INFLIGHT = max(1, int(os.environ.get("LLM_HOST_MAX_INFLIGHT", "4")))
+LLM_EJECT_AFTER = max(1, int(os.environ.get("LLM_EJECT_AFTER", "3")))
+LLM_EJECT_S = float(os.environ.get("LLM_EJECT_S", "30"))
+LLM_HEALTH_INTERVAL_S = float(os.environ.get("LLM_HEALTH_INTERVAL_S", "10"))
+MAX_EJECT_S = 600.0
+
+
+class NoHealthyHostError(RuntimeError):
+    """Every host in the pool has already failed this call."""
+
+
+def parse_hosts(spec: str) -> List[Tuple[str, float, int]]:
+    """'url=weight:limit, url2' -> [(url, weight, limit), ...]"""
+    out = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        url, _, rest = part.partition("=")
+        weight_s, _, limit_s = rest.partition(":")
+        weight = float(weight_s) if weight_s else 1.0
+        limit = int(limit_s) if limit_s else LLM_HOST_MAX_INFLIGHT
+        if weight <= 0 or limit <= 0:
+            raise ValueError(f"LLM_HOSTS entry {part!r}: weight and limit must be positive")
+        out.append((url.strip().rstrip("/"), weight, limit))
+    return out
+
+
+class Host:
+    def __init__(self, url: str, weight: float = 1.0, max_inflight: int = 1, client: Any = None):
+        self.url = url
+        self.name = url.split("://", 1)[-1]
+        self.weight = weight
+        self.max_inflight = max_inflight
+        self.limiter = AdaptiveLimit(initial=LLM_HOST_CONCURRENCY, max_limit=max_inflight)
+        self.client = client if client is not None else ollama.Client(host=url, timeout=LLM_TIMEOUT_S)
+        self.inflight = 0
+        self.failures = 0  # consecutive
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.last_error: Optional[str] = None
+        self.served = 0
+
+    def healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def load(self) -> float:
+        return (self.inflight + 1) / self.weight
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "max_inflight": self.max_inflight,
+            "limit": self.limiter.limit,
+            "baseline_ms": int(round(self.limiter.baseline_s * 1000)),
+            "inflight": self.inflight,
+            "healthy": self.healthy(now),
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+            "consecutive_failures": self.failures,
+            "served": self.served,
+            "last_error": self.last_error,
+        }
+
+
+class LLMPool:
+    def __init__(self, hosts: List[Host], health_interval_s: float = LLM_HEALTH_INTERVAL_S):
+        if not hosts:
+            raise ValueError("LLMPool needs at least one host")
+        self.hosts = hosts
+        self.health_interval_s = health_interval_s
+        self._cond = threading.Condition()
+        self._affinity: Dict[str, Host] = {}
+        self.scheduler = FairScheduler()
+        self._waiting: List[Ticket] = []  # callers blocked in acquire()
+        self._probe_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @classmethod
+    def from_env(cls) -> "LLMPool":
+        spec = os.environ.get("LLM_HOSTS") or os.environ.get("OLLAMA_HOST") or "http://127.0.0.1:11434"
+        if "://" not in spec.split(",")[0]:
+            spec = "http://" + spec
+        return cls([Host(url, w, n) for url, w, n in parse_hosts(spec)])
+
+    def capacity(self) -> int:
+        """Upper bound on concurrent calls (adaptive limits never exceed max_inflight)."""
+        return sum(h.max_inflight for h in self.hosts)
+
+    # ----- routing -----
+
+    def _pick(self, affinity: Optional[str], exclude: Iterable[Host]) -> Optional[Host]:
+        now = time.monotonic()
+        excluded = set(id(h) for h in exclude)
+        allowed = [h for h in self.hosts if id(h) not in excluded]
+        if not allowed:
+            raise NoHealthyHostError("no healthy LLM host available")
+        candidates = [h for h in allowed if h.healthy(now)]
+        if not candidates:
+            # everything is ejected: fail open on the host whose cool-down ends first
+            # rather than refusing work (a single-host setup must keep trying)
+            candidates = [min(allowed, key=lambda h: h.ejected_until)]
+        free = [h for h in candidates if h.inflight < h.limiter.limit]
+        if not free:
+            return None
+        preferred = self._affinity.get(affinity) if affinity else None
+        if preferred is not None and preferred in free:
+            return preferred
+        return min(free, key=lambda h: (h.load(), h.inflight, -h.weight))
+
+    def acquire(
+        self,
+        affinity: Optional[str] = None,
+        exclude: Iterable[Host] = (),
+        timeout: Optional[float] = None,
+        cancel: Optional[CancelToken] = None,
+        job: Optional[Job] = None,
+    ) -> Host:
+        """
+        Block until a slot is granted to this caller; returns the host with the slot taken.
+        When several callers wait, free slots go out in scheduler order (job's priority
+        class, then the user's fair share, then the job with the fewest pairs left).
+        """
+        if cancel is not None and cancel.remaining() is not None:
+            timeout = cancel.remaining() if timeout is None else min(timeout, cancel.remaining())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ticket = Ticket(job, affinity, list(exclude))
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                self._dispatch()
+                while ticket.host is None:
+                    if ticket.error is not None:
+                        raise ticket.error
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        if cancel is not None:
+                            cancel.raise_if_cancelled()
+                        raise TimeoutError("timed out waiting for an LLM host slot")
+                    # woken by a grant; the periodic timeout lets ejection cool-downs expire
+                    if not self._cond.wait(timeout=1.0 if remaining is None else min(1.0, remaining)):
+                        self._dispatch()
+            finally:
+                if ticket.host is None and ticket in self._waiting:
+                    self._waiting.remove(ticket)
+        LLM_QUEUE_WAIT.observe(time.perf_counter() - ticket.enqueued, priority=ticket.job.priority)
+        return ticket.host
+
+    def _dispatch(self) -> None:
+        """Hand free slots to waiting tickets in scheduler order. Call with the lock held."""
+        granted = False
+        for ticket in self.scheduler.order(self._waiting):
+            try:
+                host = self._pick(ticket.affinity, ticket.exclude)
+            except NoHealthyHostError as e:
+                ticket.error = e
+                self._waiting.remove(ticket)
+                granted = True  # wake it so it can raise
+                continue
+            if host is None:
+                # this ticket's hosts are full; a lower one may be allowed elsewhere
+                continue
+            host.inflight += 1
+            if ticket.affinity:
+                # bind on first use; a spill-over doesn't move the key, an ejection does
+                bound = self._affinity.get(ticket.affinity)
+                if bound is None or bound not in self.hosts or not bound.healthy(time.monotonic()):
+                    self._affinity[ticket.affinity] = host
+            ticket.host = host
+            self.scheduler.charge(ticket)
+            self._waiting.remove(ticket)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def release(self, host: Host, ok: bool, error: Optional[str] = None, latency_s: Optional[float] = None) -> None:
+        with self._cond:
+            if ok and latency_s is not None:
+                host.limiter.on_success(latency_s, host.inflight)
+            elif not ok:
+                host.limiter.on_error()
+            host.inflight -= 1
+            if ok:
+                host.failures = 0
+                host.ejections = 0
+                host.ejected_until = 0.0  # a fail-open trial call that succeeded readmits the host
+                host.served += 1
+            else:
+                host.failures += 1
+                host.last_error = (error or "")[:200]
+                if host.failures >= LLM_EJECT_AFTER:
+                    self._eject(host)
+            self._dispatch()
+        LLM_HOST_REQUESTS.inc(host=host.name, outcome="ok" if ok else "error")
+
+    def _eject(self, host: Host) -> None:
+        host.ejections += 1
+        cool_down = min(MAX_EJECT_S, LLM_EJECT_S * (2 ** (host.ejections - 1)))
+        host.ejected_until = time.monotonic() + cool_down
+        host.failures = 0
+        self._ensure_prober()
+
+    # ----- calls -----
+
+    def call(
+        self,
+        method: str,
+        affinity: Optional[str] = None,
+        cancel: Optional[CancelToken] = None,
+        job: Optional[Job] = None,
+        **kwargs,
+    ) -> Tuple[Any, Host]:
+        """
+        Invoke client.<method>(**kwargs) on the best host. On failure, retry once on every
+        other healthy host before re-raising the last error.
+        """
+        tried: List[Host] = []
+        last_exc: Optional[BaseException] = None
+        for _ in range(len(self.hosts)):
+            try:
+                host = self.acquire(affinity=affinity, exclude=tried, cancel=cancel, job=job)
+            except NoHealthyHostError:
+                if last_exc is not None:
+                    raise last_exc
+                raise
+            t0 = time.perf_counter()
+            try:
+                result = getattr(host.client, method)(**kwargs)
+            except Exception as e:
+                self.release(host, ok=False, error=f"{type(e).__name__}: {e}")
+                tried.append(host)
+                last_exc = e
+                continue
+            self.release(host, ok=True, latency_s=time.perf_counter() - t0)
+            return result, host
+        raise last_exc  # every host failed once
+
+    def chat(
+        self, affinity: Optional[str] = None, cancel: Optional[CancelToken] = None, job: Optional[Job] = None, **kwargs
+    ) -> Tuple[Any, Host]:
+        return self.call("chat", affinity=affinity, cancel=cancel, job=job, **kwargs)
+
+    def map(
+        self,
+        fn: Callable[[T], R],
+        items: Iterable[T],
+        max_workers: Optional[int] = None,
+        cancel: Optional[CancelToken] = None,
+    ) -> List[R]:
+        """
+        Ordered concurrent map sized to the pool; sequential for a single slot.
+        With a cancel token, items not yet started are dropped once it fires and
+        Cancelled is raised after the running ones return.
+        """
+        items = list(items)
+
+        def _guarded(x: T) -> R:
+            if cancel is not None:
+                cancel.raise_if_cancelled()
+            return fn(x)
+
+        workers = min(len(items), max_workers or self.capacity())
+        if workers <= 1:
+            return [_guarded(x) for x in items]
+        ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-pool")
+        try:
+            return list(ex.map(_guarded, items))
+        finally:
+            # on error/cancel, don't leave queued pairs running for nobody
+            ex.shutdown(wait=True, cancel_futures=True)
+
+    # ----- health -----
+
+    def probe(self) -> None:
+        """Active check of ejected hosts: a successful ps() readmits the host."""
+        now = time.monotonic()
+        for host in [h for h in self.hosts if not h.healthy(now)]:
+            try:
+                host.client.ps()
+            except Exception as e:
+                host.last_error = f"probe: {type(e).__name__}: {e}"[:200]
+                continue
+            with self._cond:
+                host.ejected_until = 0.0
+                host.failures = 0
+                self._dispatch()
+
+    def _probe_loop(self) -> None:
+        while not self._stop.wait(self.health_interval_s):
+            self.probe()
+
+    def _ensure_prober(self) -> None:
+        if self.health_interval_s <= 0:
+            return
+        if self._probe_thread is None or not self._probe_thread.is_alive():
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="llm-pool-probe", daemon=True)
+            self._probe_thread.start()
+
+    def status(self) -> List[Dict[str, Any]]:
+        with self._cond:
+            return [h.snapshot() for h in self.hosts]
+
+
+POOL = LLMPool.from_env()
+
+
+def _host_values(field: str):
+    def fn():
+        now = time.monotonic()
+        values = {
+            "inflight": lambda h: h.inflight,
+            "healthy": lambda h: h.healthy(now),
+            "limit": lambda h: h.limiter.limit,
+        }[field]
+        return {(h.name,): float(values(h)) for h in POOL.hosts}
+
+    return fn
+
+
+LLM_HOST_INFLIGHT.set_function(_host_values("inflight"))
+LLM_HOST_HEALTHY.set_function(_host_values("healthy"))
+LLM_HOST_LIMIT.set_function(_host_values("limit"))
+def _queue_depth():
+    with POOL._cond:
+        depth = {(p,): 0.0 for p in PRIORITIES}
+        for t in POOL._waiting:
+            depth[(t.job.priority,)] += 1
+    return depth
+
+
+LLM_QUEUE_DEPTH.set_function(_queue_depth)
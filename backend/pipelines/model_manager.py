@@ -0,0 +1,196 @@
+"""
+model_manager.py
+Model lifecycle for the Ollama backend.
+- warm: load each configured model once at API startup (empty-prompt generate)
+- pin: every warm / heartbeat passes keep_alive so the model stays resident
+- heartbeat: background thread re-checks residency (ollama ps) and re-warms
+  anything that was evicted, so the first teacher request never pays a cold load
+- status(): per-model readiness for /health and the metrics endpoint
+- ModelFleet: one ModelManager per LLM pool host (see llm_pool.py)
+
+Config (env):
+  LLM_WARM_MODELS=phi3          comma-separated models to keep warm
+  LLM_HEARTBEAT_S=120           heartbeat period in seconds (0 disables the thread)
+  LLM_WARMUP=1                  set to 0 to skip warm-up entirely (tests, offline dev)
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import ollama
+
+from metrics import LLM_MODEL_LOAD, LLM_MODEL_READY
+from .llm import LLM_KEEP_ALIVE
+from .llm_pool import POOL
+
+LLM_WARM_MODELS = [m.strip() for m in os.environ.get("LLM_WARM_MODELS", "phi3").split(",") if m.strip()]
+LLM_HEARTBEAT_S = float(os.environ.get("LLM_HEARTBEAT_S", "120"))
+LLM_WARMUP = os.environ.get("LLM_WARMUP", "1").lower() not in ("0", "false", "no")
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class ModelManager:
+    """
+    Keeps `models` loaded on one Ollama host.
+    client is anything with generate()/ps() (the ollama module or an ollama.Client).
+    """
+
+    def __init__(
+        self,
+        models: Optional[List[str]] = None,
+        client: Any = ollama,
+        keep_alive: Optional[str] = None,
+        heartbeat_s: Optional[float] = None,
+        host: str = "default",
+    ):
+        self.models = list(models if models is not None else LLM_WARM_MODELS)
+        self.client = client
+        self.keep_alive = keep_alive or LLM_KEEP_ALIVE or "30m"
+        self.heartbeat_s = LLM_HEARTBEAT_S if heartbeat_s is None else heartbeat_s
+        self.host = host
+        self._state: Dict[str, Dict[str, Any]] = {m: {"state": "cold"} for m in self.models}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ----- lifecycle -----
+
+    def warm(self, model: str) -> bool:
+        """Load (or re-pin) one model. Returns True when the model answered."""
+        with self._lock:
+            st = self._state.setdefault(model, {})
+            if st.get("state") != "ready":
+                st["state"] = "warming"
+        t0 = time.perf_counter()
+        try:
+            resp = self.client.generate(model=model, prompt="", keep_alive=self.keep_alive)
+        except Exception as e:
+            with self._lock:
+                self._state[model].update(
+                    {"state": "error", "error": f"{type(e).__name__}: {e}"[:200], "checked_at": _now_iso()}
+                )
+            LLM_MODEL_LOAD.observe(time.perf_counter() - t0, host=self.host, model=model, outcome="error")
+            return False
+        load_s = (getattr(resp, "load_duration", None) or 0) / 1e9
+        LLM_MODEL_LOAD.observe(time.perf_counter() - t0, host=self.host, model=model, outcome="ok")
+        with self._lock:
+            self._state[model].update(
+                {
+                    "state": "ready",
+                    "error": None,
+                    "warmed_at": _now_iso(),
+                    "checked_at": _now_iso(),
+                    "load_ms": int(round(load_s * 1000)),
+                }
+            )
+        return True
+
+    def warm_all(self) -> Dict[str, bool]:
+        return {m: self.warm(m) for m in self.models}
+
+    def heartbeat(self) -> None:
+        """One heartbeat: refresh residency from `ps`, re-warm evicted or failed models."""
+        resident: Dict[str, Any] = {}
+        try:
+            for m in getattr(self.client.ps(), "models", None) or []:
+                resident[(m.model or m.name or "").split(":latest")[0]] = m.expires_at
+        except Exception as e:
+            with self._lock:
+                for st in self._state.values():
+                    st.update({"state": "error", "error": f"ps failed: {e}"[:200], "checked_at": _now_iso()})
+            return
+        for model in self.models:
+            expires = resident.get(model.split(":latest")[0])
+            with self._lock:
+                self._state[model]["resident"] = expires is not None
+                self._state[model]["expires_at"] = expires.isoformat() if hasattr(expires, "isoformat") else expires
+            # an empty-prompt generate both reloads an evicted model and resets keep_alive
+            self.warm(model)
+
+    def _run(self) -> None:
+        self.warm_all()
+        while self.heartbeat_s > 0:
+            # retry quickly while the server is down or still loading, then settle
+            wait = self.heartbeat_s if self.ready() else min(self.heartbeat_s, 15.0)
+            if self._stop.wait(wait):
+                break
+            self.heartbeat()
+
+    def start(self) -> None:
+        """Warm in the background (startup must not block on the model) then heartbeat."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f"model-manager-{self.host}", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ----- readiness -----
+
+    def ready(self) -> bool:
+        with self._lock:
+            return bool(self._state) and all(st.get("state") == "ready" for st in self._state.values())
+
+    def wait_ready(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.ready():
+                return True
+            time.sleep(0.1)
+        return self.ready()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {m: dict(st) for m, st in self._state.items()}
+
+
+class ModelFleet:
+    """Same start/stop/ready/status surface as ModelManager, across every pool host."""
+
+    def __init__(self, managers: List[ModelManager]):
+        self.managers = managers
+
+    def start(self) -> None:
+        for m in self.managers:
+            m.start()
+
+    def stop(self) -> None:
+        for m in self.managers:
+            m.stop()
+
+    def ready(self) -> bool:
+        """At least one host can serve every configured model (the pool routes around the rest)."""
+        return any(m.ready() for m in self.managers)
+
+    def wait_ready(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.ready():
+                return True
+            time.sleep(0.1)
+        return self.ready()
+
+    def status(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        return {m.host: m.status() for m in self.managers}
+
+
+MANAGER = ModelFleet([ModelManager(client=h.client, host=h.name) for h in POOL.hosts])
+
+
+def _ready_values():
+    return {
+        (host, model): 1.0 if st.get("state") == "ready" else 0.0
+        for host, models in MANAGER.status().items()
+        for model, st in models.items()
+    }
+
+
+LLM_MODEL_READY.set_function(_ready_values)
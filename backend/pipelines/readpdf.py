@@ -1,8 +1,7 @@
-import re
 import json
 import os
 import sys
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import pdfplumber 
 
 def extract_text_from_pdf(path: str) -> str:
@@ -20,15 +19,19 @@ def normalize_lines(text: str) -> List[str]:
     Normalize whitespace & drop empty lines.
     Keeps things robust to wrapping and extra spaces.
     """
+    # split()/join collapses the same (Unicode) whitespace as re.sub(r"\s+", " ") + strip
     lines = []
     for raw in text.splitlines():
-        line = re.sub(r"\s+", " ", raw).strip()
+        line = " ".join(raw.split())
         if line:
             lines.append(line)
     return lines
 
 
 # ------------ FIELD EXTRACTORS ------------
+# One field per call, each a scan of the whole document. parse_iep_text does all of
+# them in one sweep instead; these stay for one-off lookups and as the reference that
+# scripts/bench_iep_parser.py checks the single-pass parser against.
 
 def extract_scalar(lines: List[str], key: str, used_idxs=None) -> str:
     """
@@ -151,94 +154,120 @@ def parse_participants(block_text: str) -> List[Dict[str, str]]:
 
 # ------------ MAIN PARSE LOGIC ------------
 
-def parse_iep_text(text: str) -> Dict[str, Any]:
-    lines = normalize_lines(text)
+SCALAR_FIELDS = (
+    ("student_name", "STUDENT NAME"),
+    ("grade", "GRADE"),
+    ("date_of_birth", "DATE OF BIRTH"),
+    ("teacher", "TEACHER"),
+    ("pen", "PEN"),
+    ("school", "SCHOOL"),
+    ("designation", "DESIGNATION"),
+    ("iep_date", "IEP DATE"),
+)
+_SCALAR_KEYS = {key for _, key in SCALAR_FIELDS}
+
+MAJOR_HEADERS = (
+    "PERFORMANCE_PROGRESS",
+    "EDUCATION_GOALS",
+    "ACCOMMODATIONS",
+    "ASSESSMENTS",
+    "TRANSITION_GOALS",
+    "PARTICIPANTS",
+)
+# headers are matched ignoring spaces, as extract_block does
+_HEADERS = {h.replace(" ", "").upper() for h in MAJOR_HEADERS}
+
+EDUCATION_GOAL_LABELS = ["ACADEMIC", "SOCIAL", "BEHAVIOURAL", "COMMUNICATIVE", "PHYSICAL"]
+ACCOMMODATION_LABELS = ["INSTRUCTIONAL", "ENVIRONMENTAL", "ASSESSMENT", "TECHNOLOGY"]
+
+
+def _scan(lines: List[str]) -> Tuple[Dict[str, List[Tuple[int, str]]], List[Tuple[int, str]]]:
+    """
+    The one pass over the document: every line that starts a scalar key ("KEY: value",
+    case-insensitive) and every major header line, in document order.
+    Returns ({key: [(line_no, value_on_line), ...]}, [(line_no, header), ...]).
+    """
+    scalars: Dict[str, List[Tuple[int, str]]] = {}
+    headers: List[Tuple[int, str]] = []
+    for i, line in enumerate(lines):
+        colon = line.find(":")
+        if colon > 0:
+            # line.upper().startswith(KEY + ":") <=> the text before the first colon is KEY
+            key = line[:colon].upper()
+            if key in _SCALAR_KEYS:
+                scalars.setdefault(key, []).append((i, line[colon + 1:].strip()))
+                continue
+        norm = line.replace(" ", "").upper()
+        if norm in _HEADERS:
+            headers.append((i, norm))
+    return scalars, headers
+
+
+def _resolve_scalars(lines: List[str], scalars: Dict[str, List[Tuple[int, str]]]) -> Dict[str, str]:
+    """
+    Same picks as calling extract_scalar for each field in SCALAR_FIELDS order with a
+    shared used-set: the first unused occurrence wins, and a key with an empty value
+    takes (and uses up) the next line.
+    """
     used = set()
+    out: Dict[str, str] = {}
+    for field, key in SCALAR_FIELDS:
+        value = ""
+        for i, on_line in scalars.get(key, ()):
+            if i in used:
+                continue
+            if on_line:
+                used.add(i)
+                value = on_line
+                break
+            if i + 1 < len(lines):
+                used.add(i)
+                used.add(i + 1)
+                value = lines[i + 1].strip()
+                break
+        out[field] = value
+    return out
+
+
+def _blocks(lines: List[str], headers: List[Tuple[int, str]]) -> Dict[str, str]:
+    """
+    Each header's text: from its first occurrence to the next line holding a *different*
+    major header (a repeat of the same header is content), as extract_block does.
+    """
+    out: Dict[str, str] = {}
+    for pos, (start, name) in enumerate(headers):
+        if name in out:
+            continue
+        end = len(lines)
+        for nxt, other in headers[pos + 1:]:
+            if other != name:
+                end = nxt
+                break
+        out[name] = "\n".join(lines[start + 1:end]).strip()
+    return out
 
-    # Student fields
-    student = {
-        "student_name": extract_scalar(lines, "STUDENT NAME", used),
-        "grade": extract_scalar(lines, "GRADE", used),
-        "date_of_birth": extract_scalar(lines, "DATE OF BIRTH", used),
-        "teacher": extract_scalar(lines, "TEACHER", used),
-        "pen": extract_scalar(lines, "PEN", used),
-        "school": extract_scalar(lines, "SCHOOL", used),
-        "designation": extract_scalar(lines, "DESIGNATION", used),
-        "iep_date": extract_scalar(lines, "IEP DATE", used),
-    }
 
-    major_headers = [
-        "PERFORMANCE_PROGRESS",
-        "EDUCATION_GOALS",
-        "ACCOMMODATIONS",
-        "ASSESSMENTS",
-        "TRANSITION_GOALS",
-        "PARTICIPANTS",
-    ]
-
-    # PERFORMANCE_PROGRESS
-    performance_progress = extract_block(
-        lines,
-        "PERFORMANCE_PROGRESS",
-        [h for h in major_headers if h != "PERFORMANCE_PROGRESS"],
-    )
-
-    # EDUCATION_GOALS
-    edu_block = extract_block(
-        lines,
-        "EDUCATION_GOALS",
-        [h for h in major_headers if h != "EDUCATION_GOALS"],
-    )
-    education_goals = extract_labeled_subfields(
-        edu_block,
-        ["ACADEMIC", "SOCIAL", "BEHAVIOURAL", "COMMUNICATIVE", "PHYSICAL"],
-    )
-
-    # ACCOMMODATIONS
-    accom_block = extract_block(
-        lines,
-        "ACCOMMODATIONS",
-        [h for h in major_headers if h != "ACCOMMODATIONS"],
-    )
-    accommodations = extract_labeled_subfields(
-        accom_block,
-        ["INSTRUCTIONAL", "ENVIRONMENTAL", "ASSESSMENT", "TECHNOLOGY"],
-    )
-
-    # ASSESSMENTS
-    assessments = extract_block(
-        lines,
-        "ASSESSMENTS",
-        [h for h in major_headers if h != "ASSESSMENTS"],
-    )
-
-    # TRANSITION_GOALS
-    transition_goals = extract_block(
-        lines,
-        "TRANSITION_GOALS",
-        [h for h in major_headers if h != "TRANSITION_GOALS"],
-    )
-
-    # PARTICIPANTS
-    participants_block = extract_block(
-        lines,
-        "PARTICIPANTS",
-        [h for h in major_headers if h != "PARTICIPANTS"],
-    )
-    participants = parse_participants(participants_block)
-
-    iep = {
+def parse_iep_text(text: str) -> Dict[str, Any]:
+    """
+    Text of an IEP -> structured dict. One sweep finds every scalar key and section
+    header; fields and sections are then cut out by line number, so the cost is linear
+    in the document's length. Output is identical to the field-at-a-time extractors.
+    """
+    lines = normalize_lines(text)
+    scalars, headers = _scan(lines)
+    student = _resolve_scalars(lines, scalars)
+    blocks = _blocks(lines, headers)
+
+    return {
         "student": student,
-        "performance_progress": performance_progress,
-        "education_goals": education_goals,
-        "accommodations": accommodations,
-        "assessments": assessments,
-        "transition_goals": transition_goals,
-        "participants": participants,
+        "performance_progress": blocks.get("PERFORMANCE_PROGRESS", ""),
+        "education_goals": extract_labeled_subfields(blocks.get("EDUCATION_GOALS", ""), EDUCATION_GOAL_LABELS),
+        "accommodations": extract_labeled_subfields(blocks.get("ACCOMMODATIONS", ""), ACCOMMODATION_LABELS),
+        "assessments": blocks.get("ASSESSMENTS", ""),
+        "transition_goals": blocks.get("TRANSITION_GOALS", ""),
+        "participants": parse_participants(blocks.get("PARTICIPANTS", "")),
     }
 
-    return iep
-
 
 def parse_iep_pdf(path: str) -> Dict[str, Any]:
     """Public entry: PDF path -> structured IEP dict."""
@@ -250,14 +279,14 @@ def parse_iep_pdf(path: str) -> Dict[str, Any]:
 # This section is safe to delete in production and is only for hackathon / local use.
 
 if __name__ == "__main__":
-    # Usage:
-    #   python iep_parser.py sample_iep_input.pdf
+    # Usage (one file; for many, see ingest_ieps.py):
+    #   python pipelines/readpdf.py sample_iep_input.pdf
     #
     # Outputs:
     #   ./output_json/<basename>.json
 
     if len(sys.argv) < 2:
-        print("Usage: python iep_parser.py <pdf_path>")
+        print("Usage: python pipelines/readpdf.py <pdf_path>")
         sys.exit(1)
 
     pdf_path = sys.argv[1]
@@ -0,0 +1,131 @@
+"""
+resilience.py
+Failure handling for LLM calls.
+- CancelToken: cooperative cancellation + an optional deadline, passed from the API
+  request down through the pair loop; checked before every pair, every attempt and
+  every wait for a host slot (an HTTP call already sent finishes or hits LLM_TIMEOUT_S)
+- CircuitBreaker: after LLM_BREAKER_FAILURES consecutive failed calls the whole pool is
+  treated as down and calls fail fast for LLM_BREAKER_COOLDOWN_S; then one trial call is
+  let through (half-open) and its outcome closes or re-opens the breaker
+
+Config (env):
+  LLM_TIMEOUT_S=120               per-call HTTP timeout on every pool host
+  LLM_BREAKER_FAILURES=5          consecutive failed calls that open the breaker (0 = off)
+  LLM_BREAKER_COOLDOWN_S=30       how long an open breaker fails fast
+  LLM_FALLBACK=1                  alignment pairs the LLM cannot score reuse the last cached
+                                  verdict (else a neutral placeholder); 0 = fail the run
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from metrics import LLM_BREAKER_STATE
+
+LLM_TIMEOUT_S = float(os.environ.get("LLM_TIMEOUT_S", "120"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_S = float(os.environ.get("LLM_BREAKER_COOLDOWN_S", "30"))
+LLM_FALLBACK = os.environ.get("LLM_FALLBACK", "1").lower() not in ("0", "false", "no")
+
+
+class Cancelled(Exception):
+    """The run was cancelled (client went away) or ran past its deadline."""
+
+    def __init__(self, reason: str = "cancelled"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CircuitOpenError(RuntimeError):
+    """The LLM backend is considered down; the call was not attempted."""
+
+
+class CancelToken:
+    def __init__(self, deadline_s: Optional[float] = None):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self.deadline = None if deadline_s is None else time.monotonic() + deadline_s
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds to the deadline (None = no deadline)."""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+    def raise_if_cancelled(self) -> None:
+        if self.cancelled:
+            raise Cancelled(self.reason or "cancelled")
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown_s: float = LLM_BREAKER_COOLDOWN_S):
+        self.failures = failures
+        self.cooldown_s = cooldown_s
+        self.state = self.CLOSED
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self._trial = False  # a half-open trial call is in flight
+        self._lock = threading.Lock()
+
+    def allow(self) -> None:
+        """Raise CircuitOpenError unless a call may go out now."""
+        if self.failures <= 0:
+            return
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown_s:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return
+            retry_in = max(0.0, self.cooldown_s - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(
+                f"LLM backend unavailable (circuit open, retry in {retry_in:.0f}s): {self.last_error}"
+            )
+
+    def record(self, ok: bool, error: Optional[str] = None) -> None:
+        if self.failures <= 0:
+            return
+        with self._lock:
+            self._trial = False
+            if ok:
+                self.state = self.CLOSED
+                self.consecutive = 0
+                return
+            self.consecutive += 1
+            self.last_error = (error or "")[:200]
+            if self.state == self.HALF_OPEN or self.consecutive >= self.failures:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def abandon(self) -> None:
+        """The call never reached a verdict on the backend (cancelled): free the trial slot."""
+        with self._lock:
+            self._trial = False
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive,
+                "last_error": self.last_error,
+            }
+
+
+BREAKER = CircuitBreaker()
+
+LLM_BREAKER_STATE.set_function(lambda: {(): {"closed": 0.0, "half_open": 0.5, "open": 1.0}[BREAKER.state]})
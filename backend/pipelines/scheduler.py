@@ -0,0 +1,103 @@
+"""
+scheduler.py
+Who gets the next free LLM slot (see LLMPool.acquire).
+- priority classes, strictly ordered: interactive > batch > background
+- within a class: start-time fair queuing across users, so two teachers' rollups
+  alternate slots instead of the first one draining its whole matrix
+- within a user's share: shortest job first (fewest pairs left), then arrival order
+- a slot already handed out is never preempted; a waiting pair of a higher class just
+  gets the next one, so small interactive runs finish in a few pair-latencies
+
+Config (env):
+  LLM_USER_WEIGHTS="alice@school.ca=2,bob@school.ca=1"   fair-share weights (default 1)
+"""
+
+import itertools
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+PRIORITIES = ("interactive", "batch", "background")
+DEFAULT_PRIORITY = "batch"
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """'user=2,user2=0.5' -> {user: weight}"""
+    out: Dict[str, float] = {}
+    for part in (spec or "").split(","):
+        user, _, w = part.strip().rpartition("=")
+        if user and w:
+            out[user.strip()] = max(0.01, float(w))
+    return out
+
+
+LLM_USER_WEIGHTS = parse_weights(os.environ.get("LLM_USER_WEIGHTS", ""))
+
+
+@dataclass
+class Job:
+    """One alignment run as the scheduler sees it. Shared by all of the run's pair calls."""
+
+    priority: str = DEFAULT_PRIORITY
+    user: str = "-"
+    outstanding: int = 0  # pairs added and not finished yet
+    max_inflight: Optional[int] = None  # cap on this job's concurrent pairs (None = pool capacity)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.priority not in PRIORITIES:
+            raise ValueError(f"unknown priority {self.priority!r}; expected one of {PRIORITIES}")
+
+    def add_pairs(self, n: int) -> None:
+        with self._lock:
+            self.outstanding += n
+
+    def pair_done(self) -> None:
+        with self._lock:
+            self.outstanding = max(0, self.outstanding - 1)
+
+
+DEFAULT_JOB = Job()
+
+
+class Ticket:
+    """A caller waiting in LLMPool.acquire."""
+
+    _seq = itertools.count()
+
+    def __init__(self, job: Optional[Job], affinity: Optional[str], exclude: List):
+        self.job = job or DEFAULT_JOB
+        self.affinity = affinity
+        self.exclude = exclude
+        self.seq = next(self._seq)
+        self.enqueued = time.perf_counter()
+        self.host = None  # set when granted
+        self.error: Optional[BaseException] = None
+
+
+class FairScheduler:
+    """Orders tickets; call under the pool's lock."""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None):
+        self.weights = dict(LLM_USER_WEIGHTS if weights is None else weights)
+        self._vtime: Dict[str, float] = {p: 0.0 for p in PRIORITIES}
+        self._finish: Dict[Tuple[str, str], float] = {}
+
+    def _start_tag(self, job: Job) -> float:
+        return max(self._vtime[job.priority], self._finish.get((job.priority, job.user), 0.0))
+
+    def key(self, ticket: Ticket) -> Tuple:
+        job = ticket.job
+        return (PRIORITIES.index(job.priority), self._start_tag(job), job.outstanding, ticket.seq)
+
+    def order(self, tickets: List[Ticket]) -> List[Ticket]:
+        return sorted(tickets, key=self.key)
+
+    def charge(self, ticket: Ticket) -> None:
+        """Account one granted slot to the ticket's user."""
+        job = ticket.job
+        start = self._start_tag(job)
+        self._finish[(job.priority, job.user)] = start + 1.0 / self.weights.get(job.user, 1.0)
+        self._vtime[job.priority] = start
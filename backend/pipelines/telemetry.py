@@ -0,0 +1,183 @@
+"""
+telemetry.py
+Append-only per-call LLM telemetry.
+- one compact JSON line per run_llm call in data/telemetry/llm_calls.jsonl
+- token counts and Ollama timings (ns in the response, stored here as ms)
+- tags: pipeline, worksheet, student / competency, attempt, serving host
+- streaming query + summary helpers for the /telemetry/llm endpoint
+- size-based rotation: the file is renamed to llm_calls.jsonl.1 (older ones shift
+  to .2, ...) once it passes LLM_TELEMETRY_MAX_MB; queries read the kept files too
+
+Config (env):
+  LLM_TELEMETRY_MAX_MB=64        rotate the log past this size (0 = never rotate)
+  LLM_TELEMETRY_KEEP=3           rotated files kept; older ones are deleted
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .timeutil import to_epoch
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DATA_DIR = BASE_DIR / "data"
+TELEMETRY_DIR = DATA_DIR / "telemetry"
+TELEMETRY_PATH = TELEMETRY_DIR / "llm_calls.jsonl"
+TELEMETRY_MAX_BYTES = int(float(os.environ.get("LLM_TELEMETRY_MAX_MB", "64")) * 1024 * 1024)
+TELEMETRY_KEEP = max(0, int(os.environ.get("LLM_TELEMETRY_KEEP", "3")))
+
+# ollama response field -> compact record key (durations are converted ns -> ms)
+_COUNT_FIELDS = {"prompt_eval_count": "prompt_tokens", "eval_count": "eval_tokens"}
+_DURATION_FIELDS = {
+    "prompt_eval_duration": "prompt_eval_ms",
+    "eval_duration": "eval_ms",
+    "load_duration": "load_ms",
+    "total_duration": "total_ms",
+}
+_TAG_KEYS = ("pipeline", "worksheet", "student", "competency", "attempt", "host")
+
+_write_lock = threading.Lock()
+
+
+def build_record(
+    response: Any,
+    model: str,
+    latency_s: float,
+    tags: Optional[Dict[str, Any]] = None,
+    prompt_chars: int = 0,
+    error: Optional[str] = None,
+) -> Dict[str, Any]:
+    rec: Dict[str, Any] = {
+        "ts": round(time.time(), 3),
+        "model": model,
+        "ok": error is None,
+        "latency_ms": int(round(latency_s * 1000)),
+        "prompt_chars": prompt_chars,
+    }
+    for k in _TAG_KEYS:
+        v = (tags or {}).get(k)
+        if v not in (None, ""):
+            rec[k] = v
+    if response is not None:
+        for src, dst in _COUNT_FIELDS.items():
+            v = getattr(response, src, None)
+            if v is not None:
+                rec[dst] = int(v)
+        for src, dst in _DURATION_FIELDS.items():
+            v = getattr(response, src, None)
+            if v is not None:
+                rec[dst] = int(round(v / 1e6))
+    if error:
+        rec["error"] = error[:200]
+    return rec
+
+
+def _rotated(path: Path, n: int) -> Path:
+    return path.with_name(f"{path.name}.{n}")
+
+
+def _rotate(path: Path) -> None:
+    # called with _write_lock held; path.N is older than path.N-1
+    if TELEMETRY_KEEP == 0:
+        path.unlink(missing_ok=True)
+        return
+    _rotated(path, TELEMETRY_KEEP).unlink(missing_ok=True)
+    for n in range(TELEMETRY_KEEP - 1, 0, -1):
+        if _rotated(path, n).exists():
+            os.replace(_rotated(path, n), _rotated(path, n + 1))
+    os.replace(path, _rotated(path, 1))
+
+
+def append_record(rec: Dict[str, Any], path: Optional[Path] = None) -> None:
+    path = path or TELEMETRY_PATH
+    line = json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n"
+    with _write_lock:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+            size = f.tell()
+        if TELEMETRY_MAX_BYTES and size >= TELEMETRY_MAX_BYTES:
+            _rotate(path)
+
+
+def record_llm_call(response, model, latency_s, tags=None, prompt_chars=0, error=None) -> None:
+    """Best-effort: telemetry must never break an LLM call."""
+    try:
+        append_record(build_record(response, model, latency_s, tags, prompt_chars, error))
+    except Exception:
+        pass
+
+
+# ---------- Query ----------
+
+
+def iter_records(path: Optional[Path] = None) -> Iterator[Dict[str, Any]]:
+    """Records oldest first, across the rotated files and the live one."""
+    path = path or TELEMETRY_PATH
+    files: List[Path] = [_rotated(path, n) for n in range(TELEMETRY_KEEP, 0, -1)] + [path]
+    for p in files:
+        try:
+            f = open(p, "r", encoding="utf-8")
+        except FileNotFoundError:
+            continue  # not written yet, or rotated away since the list was made
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+
+
+def query_llm_calls(
+    pipeline: Optional[str] = None,
+    worksheet: Optional[str] = None,
+    student: Optional[str] = None,
+    competency: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    path: Optional[Path] = None,
+) -> Iterator[Dict[str, Any]]:
+    t_from, t_to = to_epoch(since), to_epoch(until)
+    want = {"pipeline": pipeline, "worksheet": worksheet, "student": student, "competency": competency}
+    for rec in iter_records(path):
+        ts = rec.get("ts", 0)
+        if t_from is not None and ts < t_from:
+            continue
+        if t_to is not None and ts > t_to:
+            continue
+        if any(v is not None and rec.get(k) != v for k, v in want.items()):
+            continue
+        yield rec
+
+
+def summarize(records: Iterator[Dict[str, Any]], keep_last: int = 100) -> Dict[str, Any]:
+    """Single pass: totals per pipeline plus the last `keep_last` matching records."""
+    totals: Dict[str, Dict[str, float]] = {}
+    last: deque = deque(maxlen=max(0, keep_last))
+    for rec in records:
+        last.append(rec)
+        t = totals.setdefault(
+            rec.get("pipeline", "unknown"),
+            {"calls": 0, "errors": 0, "retries": 0, "prompt_tokens": 0, "eval_tokens": 0,
+             "prompt_eval_ms": 0, "eval_ms": 0, "load_ms": 0, "latency_ms": 0},
+        )
+        t["calls"] += 1
+        t["errors"] += 0 if rec.get("ok", True) else 1
+        t["retries"] += 1 if int(rec.get("attempt", 1) or 1) > 1 else 0
+        for k in ("prompt_tokens", "eval_tokens", "prompt_eval_ms", "eval_ms", "load_ms", "latency_ms"):
+            t[k] += rec.get(k, 0) or 0
+
+    for t in totals.values():
+        calls = max(1, t["calls"])
+        t["avg_latency_ms"] = round(t["latency_ms"] / calls, 1)
+        t["avg_prompt_tokens"] = round(t["prompt_tokens"] / calls, 1)
+        t["avg_eval_tokens"] = round(t["eval_tokens"] / calls, 1)
+        t["eval_tokens_per_s"] = round(t["eval_tokens"] / (t["eval_ms"] / 1000), 2) if t["eval_ms"] else 0.0
+        t["prompt_tokens_per_s"] = (
+            round(t["prompt_tokens"] / (t["prompt_eval_ms"] / 1000), 2) if t["prompt_eval_ms"] else 0.0
+        )
+    return {"totals": totals, "calls": list(last)}
@@ -0,0 +1,95 @@
+"""
+textcache.py
+Extracted worksheet text, cached so repeated runs (IEP, CC, precompute) skip PDF
+parsing and OCR.
+- keyed by a hash of the file's bytes, so a copy of the same PDF in another unit hits,
+  and an edited file misses; (path, size, mtime) -> hash is memoized per process
+- in-memory LRU in front of one .txt per content hash under data/cache/text, which
+  survives restarts
+- empty extractions are not cached (OCR tooling may simply be missing right now)
+
+Config (env):
+  WORKSHEET_TEXT_CACHE=1          0 = always extract
+  WORKSHEET_TEXT_CACHE_ITEMS=512  texts kept in memory
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import record_cache
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+TEXT_CACHE_DIR = BASE_DIR / "data" / "cache" / "text"
+
+WORKSHEET_TEXT_CACHE = os.environ.get("WORKSHEET_TEXT_CACHE", "1").lower() not in ("0", "false", "no")
+WORKSHEET_TEXT_CACHE_ITEMS = int(os.environ.get("WORKSHEET_TEXT_CACHE_ITEMS", "512"))
+
+_lock = threading.Lock()
+_digests: Dict[Tuple[str, int, int], str] = {}
+_texts: "OrderedDict[str, str]" = OrderedDict()
+
+
+def _digest(path: Path) -> str:
+    st = path.stat()
+    sig = (str(path.resolve()), st.st_size, st.st_mtime_ns)
+    with _lock:
+        d = _digests.get(sig)
+    if d is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        d = h.hexdigest()
+        with _lock:
+            _digests[sig] = d
+    return d
+
+
+def _remember(digest: str, text: str) -> None:
+    with _lock:
+        _texts[digest] = text
+        _texts.move_to_end(digest)
+        while len(_texts) > WORKSHEET_TEXT_CACHE_ITEMS:
+            _texts.popitem(last=False)
+
+
+def cached_text(path: Path, extract: Callable[[Path], str], cache_dir: Optional[Path] = None) -> str:
+    """extract(path), or the text extracted earlier from a file with the same bytes."""
+    if not WORKSHEET_TEXT_CACHE:
+        return extract(path)
+    path = Path(path)
+    digest = _digest(path)
+    with _lock:
+        text = _texts.get(digest)
+        if text is not None:
+            _texts.move_to_end(digest)
+    if text is not None:
+        record_cache("worksheet_text", True)
+        return text
+
+    disk = (cache_dir or TEXT_CACHE_DIR) / f"{digest}.txt"
+    try:
+        text = disk.read_text(encoding="utf-8")
+    except (FileNotFoundError, UnicodeDecodeError):
+        text = None
+    if text is not None:
+        record_cache("worksheet_text", True)
+        _remember(digest, text)
+        return text
+
+    record_cache("worksheet_text", False)
+    text = extract(path)
+    if text:
+        _remember(digest, text)
+        try:
+            disk.parent.mkdir(parents=True, exist_ok=True)
+            tmp = disk.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, disk)
+        except OSError:
+            pass  # cache only
+    return text
@@ -0,0 +1,28 @@
+"""
+timeutil.py
+Time parsing shared by the telemetry and history queries.
+- to_epoch: epoch seconds or an ISO timestamp -> epoch seconds; no offset means UTC
+- iso_utc: epoch seconds -> "YYYY-MM-DDTHH:MM:SSZ"
+"""
+
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+
+def to_epoch(v: Union[str, float, None]) -> Optional[float]:
+    """None/"" -> None. Raises ValueError for anything else that does not parse."""
+    if v in (None, ""):
+        return None
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        pass
+    s = str(v).strip()
+    dt = datetime.fromisoformat(s[:-1] + "+00:00" if s.endswith("Z") else s)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def iso_utc(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
@@ -0,0 +1,200 @@
+# precompute.py
+"""
+Nightly batch: score every course x student pair that is missing from (or stale in)
+the verdict store, then refresh the rollups the UI reads, so daytime alignment
+requests are served from the store instead of waiting on the model.
+
+- enumerates every course/unit under data/curriculum and every student in data/students
+- one background-priority run per course (all units x all students); pairs with a stored
+  verdict are reused, the rest are scored and recorded (see pipelines/explanations.py)
+- each course's rollup goes to curriculum/reports.json as it finishes; once every course
+  is done, students/reports.json (and each student's alignment_pct) is refreshed too
+- stops cleanly when the window closes; finished pairs are checkpointed, so the next run
+  picks up where this one stopped
+
+Usage (from backend/, e.g. from cron at 01:00):
+  python precompute.py --until 06:30 --concurrency 4
+  python precompute.py --courses engl6 math8 --max-minutes 90
+  python precompute.py --full --max-age-h 168     # explanations too; re-score week-old pairs
+"""
+
+import argparse
+import logging
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import api
+from logger import SimpleAppLogger
+from pipelines import CancelToken, Cancelled, Job, run_iep_alignment_selected
+from pipelines.llm import LLM_UNAVAILABLE
+
+# ============================================================
+# ======================= CONFIG =============================
+# ============================================================
+
+PRECOMPUTE_USER = {"sub": "precompute", "email": None}
+
+logger = SimpleAppLogger(str(api.LOG_DIR), "precompute", logging.INFO).get_logger()
+logger.addHandler(logging.StreamHandler(sys.stdout))  # progress on the console / in cron mail too
+
+
+# ============================================================
+# ======================= HELPERS ============================
+# ============================================================
+
+def window_seconds(until: Optional[str], max_minutes: Optional[float], now: Optional[datetime] = None) -> Optional[float]:
+    """Seconds left in the run window: until a local HH:MM (tomorrow if already past) and/or max_minutes."""
+    now = now or datetime.now()
+    limits: List[float] = []
+    if until:
+        hh, mm = (int(x) for x in until.split(":", 1))
+        end = now.replace(hour=hh, minute=mm, second=0, microsecond=0)
+        if end <= now:
+            end += timedelta(days=1)
+        limits.append((end - now).total_seconds())
+    if max_minutes:
+        limits.append(max_minutes * 60)
+    return min(limits) if limits else None
+
+
+def curriculum_units(only: Optional[List[str]] = None) -> Dict[str, List[str]]:
+    """{course: [unit, ...]} for every course dir under data/curriculum that has units."""
+    out: Dict[str, List[str]] = {}
+    if not api.CUR_DIR.exists():
+        return out
+    for course_dir in sorted(p for p in api.CUR_DIR.iterdir() if p.is_dir()):
+        if only and course_dir.name not in only:
+            continue
+        units = sorted(u.name for u in course_dir.iterdir() if u.is_dir())
+        if units:
+            out[course_dir.name] = units
+    return out
+
+
+def all_students() -> Tuple[List[str], List[str]]:
+    """Parallel (ids, names) of every student JSON with a student_name."""
+    by_id = api._student_names_by_id()
+    return list(by_id), list(by_id.values())
+
+
+def _neutral(result: Dict) -> int:
+    return int(((result.get("meta") or {}).get("fallback") or {}).get("neutral", 0))
+
+
+# ============================================================
+# ======================= PRECOMPUTE =========================
+# ============================================================
+
+def precompute(
+    courses: Dict[str, List[str]],
+    student_ids: List[str],
+    student_names: List[str],
+    token: CancelToken,
+    job: Job,
+    scores_only: bool = True,
+    max_age_h: Optional[float] = None,
+    pdf: bool = False,
+) -> bool:
+    """Returns True when every course and the student rollups were refreshed."""
+    reuse_max_age_s = max_age_h * 3600 if max_age_h is not None else None
+
+    def _run(selection: Dict[str, List[str]], ckpt=None) -> Dict:
+        return run_iep_alignment_selected(
+            student_names,
+            str(api.STU_DIR),
+            selection,
+            str(api.CUR_DIR),
+            scores_only=scores_only,
+            explanation_store=api.EXPLANATIONS,
+            cancel=token,
+            job=job,
+            checkpoint=ckpt,
+            reuse_max_age_s=reuse_max_age_s,
+        )
+
+    failed: List[str] = []
+    for course, units in courses.items():
+        selection = {course: units}
+        payload = api.CourseAlignRequest(course=course, units=units, scores_only=scores_only)
+        t0 = time.perf_counter()
+        try:
+            with api._checkpointed("precompute", selection, student_names, payload, PRECOMPUTE_USER) as ckpt:
+                result = _run(selection, ckpt)
+                if _neutral(result):
+                    ckpt.mark("partial")
+                    logger.warning(f"{course}: LLM unavailable ({_neutral(result)} neutral verdicts); stopping")
+                    return False
+                api._persist_course_rollup(result, course, units, selection, student_names, pdf=pdf)
+                ckpt.complete()
+        except Cancelled as e:
+            logger.info(f"{course}: stopped ({e.reason}); finished pairs are checkpointed for the next run")
+            return False
+        except LLM_UNAVAILABLE as e:
+            logger.warning(f"{course}: LLM unavailable ({e}); stopping")
+            return False
+        except Exception:
+            logger.exception(f"{course}: precompute failed; continuing with the next course")
+            failed.append(course)
+            continue
+        meta = result.get("meta") or {}
+        pairs = len(meta.get("worksheets") or []) * len(meta.get("students") or [])
+        reused = int(meta.get("reused", 0))
+        logger.info(
+            f"{course}: {pairs} pairs ({reused} reused, {pairs - reused} scored) "
+            f"in {time.perf_counter() - t0:.1f}s"
+        )
+
+    if failed:
+        logger.warning(f"Student rollups skipped: {len(failed)} course(s) failed ({', '.join(failed)})")
+        return False
+    # every pair is in the store now, so this run is store reads only
+    try:
+        result = _run(courses)
+    except Cancelled as e:
+        logger.info(f"Student rollups skipped ({e.reason})")
+        return False
+    all_units = sorted({u for units in courses.values() for u in units})
+    api._persist_iep_selected(result, student_names, student_ids, list(courses), all_units, pdf=pdf)
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Warm the verdict store and rollups for all courses x students.")
+    ap.add_argument("--until", help="stop at this local time (HH:MM; tomorrow if already past)")
+    ap.add_argument("--max-minutes", type=float, help="stop after this many minutes")
+    ap.add_argument("--concurrency", type=int, help="max pairs in flight (default: LLM pool capacity)")
+    ap.add_argument("--courses", nargs="*", help="only these courses (default: all)")
+    ap.add_argument("--priority", default="background", choices=["interactive", "batch", "background"])
+    ap.add_argument("--full", action="store_true", help="generate explanations too (default: scores only)")
+    ap.add_argument("--max-age-h", type=float,
+                    help="re-score stored verdicts older than this (default: ALIGN_VERDICT_MAX_AGE_H)")
+    ap.add_argument("--pdf", action="store_true", help="also emit the usual PDF reports")
+    args = ap.parse_args(argv)
+
+    courses = curriculum_units(args.courses)
+    student_ids, student_names = all_students()
+    if not courses or not student_names:
+        logger.info(f"Nothing to precompute: {len(courses)} courses, {len(student_names)} students")
+        return 0
+
+    window = window_seconds(args.until, args.max_minutes)
+    token = CancelToken(deadline_s=window)
+    job = Job(args.priority, PRECOMPUTE_USER["sub"], max_inflight=args.concurrency)
+    logger.info(
+        f"Precompute: {len(courses)} courses x {len(student_names)} students; "
+        f"window {'unbounded' if window is None else f'{window / 60:.0f} min'}, "
+        f"concurrency {args.concurrency or 'pool'}"
+    )
+    t0 = time.perf_counter()
+    done = precompute(
+        courses, student_ids, student_names, token, job,
+        scores_only=not args.full, max_age_h=args.max_age_h, pdf=args.pdf,
+    )
+    logger.info(f"Precompute {'finished' if done else 'stopped early'} in {time.perf_counter() - t0:.1f}s")
+    return 0 if done else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+bench_iep_parser.py
+Benchmark for readpdf.parse_iep_text, the single-pass IEP parser.
+- extracts the text of every sample IEP PDF once (pdfplumber time reported separately)
+- checks the parser against the field-at-a-time reference (extract_scalar x8 +
+  extract_block x6, the previous implementation) and against sample_data/IEP/output_json
+- times both on the sample texts and on synthetic IEPs padded to growing line counts,
+  reporting microseconds per line, so linear (single-pass) vs. quadratic-ish scaling shows
+- prints (or writes) one machine-readable JSON report
+
+Usage (from backend/):
+  python scripts/bench_iep_parser.py
+  python scripts/bench_iep_parser.py --sizes 1000 10000 100000 --repeat 5 --out parser.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+BASE = Path(__file__).resolve().parents[1]  # backend/
+ROOT = BASE.parent  # repo root
+sys.path.insert(0, str(BASE))
+
+from pipelines import readpdf  # noqa: E402
+
+IEP_DIR = ROOT / "sample_data" / "IEP"
+PDF_DIR = IEP_DIR / "sample_inputs"
+JSON_DIR = IEP_DIR / "output_json"
+
+
+# ---------- Reference parser ----------
+
+
+def reference_parse(text: str) -> Dict[str, Any]:
+    """The previous parse_iep_text: one whole-document scan per field and per section."""
+    lines = readpdf.normalize_lines(text)
+    used = set()
+    student = {field: readpdf.extract_scalar(lines, key, used) for field, key in readpdf.SCALAR_FIELDS}
+    headers = list(readpdf.MAJOR_HEADERS)
+
+    def block(h: str) -> str:
+        return readpdf.extract_block(lines, h, [x for x in headers if x != h])
+
+    return {
+        "student": student,
+        "performance_progress": block("PERFORMANCE_PROGRESS"),
+        "education_goals": readpdf.extract_labeled_subfields(block("EDUCATION_GOALS"), readpdf.EDUCATION_GOAL_LABELS),
+        "accommodations": readpdf.extract_labeled_subfields(block("ACCOMMODATIONS"), readpdf.ACCOMMODATION_LABELS),
+        "assessments": block("ASSESSMENTS"),
+        "transition_goals": block("TRANSITION_GOALS"),
+        "participants": readpdf.parse_participants(block("PARTICIPANTS")),
+    }
+
+
+# ---------- Inputs ----------
+
+
+def sample_texts() -> Dict[str, str]:
+    return {p.stem: readpdf.extract_text_from_pdf(str(p)) for p in sorted(PDF_DIR.glob("*.pdf"))}
+
+
+def synthetic(base: str, target_lines: int) -> str:
+    """
+    A sample IEP grown to ~target_lines: each section body repeated, plus extra
+    participants, keeping every header and scalar key where the real forms have them.
+    """
+    lines = base.splitlines()
+    headers = {h.replace(" ", "").upper() for h in readpdf.MAJOR_HEADERS}
+    sections: List[List[str]] = [[]]
+    for line in lines:
+        if line.replace(" ", "").upper() in headers:
+            sections.append([line])
+        else:
+            sections[-1].append(line)
+    out = list(sections[0])
+    bodies = sum(max(0, len(s) - 1) for s in sections[1:]) or 1
+    reps = max(1, (target_lines - len(sections[0])) // bodies)
+    for sec in sections[1:]:
+        out.append(sec[0])
+        for r in range(reps):
+            out.extend(sec[1:] if r == 0 else (ln for ln in sec[1:] if ln.strip()))
+    return "\n".join(out)
+
+
+# ---------- Measurement ----------
+
+
+def best_of(fn: Callable[[str], Any], text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench(texts: Dict[str, str], sizes: List[int], repeat: int, reference_max: int) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"samples": {}, "scaling": []}
+    mismatches: List[str] = []
+
+    for name, text in texts.items():
+        new = readpdf.parse_iep_text(text)
+        if new != reference_parse(text):
+            mismatches.append(f"{name}: differs from reference")
+        expected = JSON_DIR / f"{name}.json"
+        if expected.exists() and new != json.loads(expected.read_text(encoding="utf-8")):
+            mismatches.append(f"{name}: differs from {expected.name}")
+        n = len(readpdf.normalize_lines(text))
+        report["samples"][name] = {
+            "lines": n,
+            "single_pass_us": round(best_of(readpdf.parse_iep_text, text, repeat) * 1e6, 1),
+            "reference_us": round(best_of(reference_parse, text, repeat) * 1e6, 1),
+        }
+
+    base = max(texts.values(), key=len)
+    for size in sizes:
+        text = synthetic(base, size)
+        n = len(readpdf.normalize_lines(text))
+        row: Dict[str, Any] = {"lines": n}
+        t = best_of(readpdf.parse_iep_text, text, repeat)
+        row["single_pass_ms"] = round(t * 1e3, 3)
+        row["single_pass_us_per_line"] = round(t * 1e6 / n, 3)
+        if n <= reference_max:
+            if readpdf.parse_iep_text(text) != reference_parse(text):
+                mismatches.append(f"synthetic {n} lines: differs from reference")
+            tr = best_of(reference_parse, text, repeat)
+            row["reference_ms"] = round(tr * 1e3, 3)
+            row["reference_us_per_line"] = round(tr * 1e6 / n, 3)
+            row["speedup"] = round(tr / t, 2) if t else None
+        report["scaling"].append(row)
+
+    report["mismatches"] = mismatches
+    return report
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the single-pass IEP text parser.")
+    ap.add_argument("--sizes", type=int, nargs="*", default=[200, 1000, 5000, 20000, 80000],
+                    help="synthetic document sizes in lines")
+    ap.add_argument("--repeat", type=int, default=5, help="best of N timings")
+    ap.add_argument("--reference-max", type=int, default=20000,
+                    help="skip the (slower) reference parser above this many lines")
+    ap.add_argument("--out", help="write the JSON report here instead of stdout")
+    return ap.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    t0 = time.perf_counter()
+    texts = sample_texts()
+    extract_s = time.perf_counter() - t0
+    if not texts:
+        print(f"No sample PDFs under {PDF_DIR}", file=sys.stderr)
+        return 2
+
+    report: Dict[str, Any] = {
+        "config": {"sizes": args.sizes, "repeat": args.repeat, "reference_max": args.reference_max},
+        "env": {"python": platform.python_version(), "platform": platform.platform()},
+        "extraction": {"pdfs": len(texts), "seconds": round(extract_s, 3)},
+    }
+    report.update(bench(texts, args.sizes, args.repeat, args.reference_max))
+
+    out = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(out, encoding="utf-8")
+    else:
+        print(out)
+    return 1 if report["mismatches"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
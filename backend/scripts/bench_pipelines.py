@@ -0,0 +1,454 @@
+"""
+bench_pipelines.py
+Stub-LLM throughput benchmark for the alignment pipelines.
+- swaps the pipelines' run_llm for a deterministic fake (configurable latency + failure injection)
+- times worksheet text extraction over sample_data/Classwork
+- drives run_iep_alignment_selected over sample_data/IEP/output_json x sample_data/Classwork
+- drives cc_alignment_pipeline.run_pipeline per Classwork course with the matching CC file
+- prints (or writes) one machine-readable JSON report
+
+Usage (from backend/):
+  python scripts/bench_pipelines.py --latency-ms 40 --jitter-ms 10 --fail-rate 0.05 --out bench.json
+  python scripts/bench_pipelines.py --courses engl6 soc6 --students 3 --skip-cc
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+BASE = Path(__file__).resolve().parents[1]  # backend/
+ROOT = BASE.parent  # repo root
+sys.path.insert(0, str(BASE))
+
+from pipelines import run_iep_alignment_selected  # noqa: E402
+from pipelines import iep_alignment_pipeline, cc_alignment_pipeline  # noqa: E402
+from pipelines.llm_pool import POOL  # noqa: E402
+
+try:
+    import resource  # POSIX only
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+SAMPLE_DIR = ROOT / "sample_data"
+CLASSWORK_DIR = SAMPLE_DIR / "Classwork"
+IEP_JSON_DIR = SAMPLE_DIR / "IEP" / "output_json"
+CC_DIR = SAMPLE_DIR / "CCs"
+
+# Classwork folder prefix -> core competency file
+CC_FILE_BY_PREFIX = {
+    "engl": "engl.json",
+    "math": "math.json",
+    "sci": "sci.json",
+    "soc": "social.json",
+}
+
+
+# ---------- Fake LLM ----------
+
+
+class FakeLLM:
+    """
+    Deterministic stand-in for pipelines.llm.run_llm.
+    Scores are derived from a hash of the prompt, so repeated runs produce identical verdicts.
+    Failure injection returns non-JSON text; the pipelines' retry path then calls again with
+    the same prompt, and the attempt counter makes the retry draw a fresh outcome.
+    A `format` schema (constrained decoding) suppresses failure injection unless
+    structured=False, which models a server that ignores `format`.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        fail_rate: float = 0.0,
+        seed: int = 0,
+        structured: bool = True,
+        ms_per_token: float = 0.0,
+    ):
+        self.latency_s = max(0.0, latency_ms) / 1000.0
+        self.jitter_s = max(0.0, jitter_ms) / 1000.0
+        self.fail_rate = min(max(fail_rate, 0.0), 0.95)  # keep retries finite
+        self.seed = seed
+        self.structured = structured
+        self.s_per_token = max(0.0, ms_per_token) / 1000.0
+        self.delegate: Optional[Callable[..., str]] = None  # set: forward calls, only count
+        self.output_tokens = 0
+        self.calls = 0
+        self.failures = 0
+        # prefix-cache estimate: chars each prompt shares with the previous one
+        self.prompt_chars = 0
+        self.prefix_chars = 0
+        self._last_prompt = ""
+        self._attempts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _draw(self, *parts) -> int:
+        h = hashlib.sha256("|".join(str(p) for p in (self.seed,) + parts).encode("utf-8"))
+        return int.from_bytes(h.digest()[:8], "big")
+
+    def __call__(self, prompt: str, model: str = "phi3", **kwargs) -> str:
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+            self.calls += 1
+            self.prompt_chars += len(prompt)
+            self.prefix_chars += len(os.path.commonprefix([self._last_prompt, prompt]))
+            self._last_prompt = prompt
+
+        if self.delegate is not None:
+            text = self.delegate(prompt, model=model, **kwargs)
+            with self._lock:
+                self.output_tokens += max(1, len(text) // 4)
+            return text
+
+        r = self._draw(key, attempt)
+        if self.latency_s or self.jitter_s:
+            jitter = ((r % 2001) / 1000.0 - 1.0) * self.jitter_s  # uniform in [-jitter, +jitter]
+            time.sleep(max(0.0, self.latency_s + jitter))
+
+        constrained = self.structured and kwargs.get("format") is not None
+        if not constrained and (r >> 16) % 10_000 < self.fail_rate * 10_000:
+            with self._lock:
+                self.failures += 1
+            return "Sure! Here is my evaluation of the worksheet, the scores are fairly high overall."
+
+        def score(salt: str) -> int:
+            return 40 + self._draw(key, salt) % 61
+
+        if "understanding_fit" in prompt:
+            parts = [score(k) for k in ("u", "a", "ac", "e")]
+            body = {
+                "understanding_fit": parts[0],
+                "accessibility_fit": parts[1],
+                "accommodation_fit": parts[2],
+                "engagement_fit": parts[3],
+                "overall_alignment": int(round(sum(parts) / 4.0)),
+                "explanation": "Stub verdict: worksheet structure broadly matches the listed accommodations.",
+            }
+        else:
+            body = {
+                "alignment": score("cc"),
+                "explanation": "Stub verdict: tasks exercise several of the listed indicators.",
+            }
+        if constrained:
+            props = (kwargs["format"] or {}).get("properties") if isinstance(kwargs["format"], dict) else None
+            if props:
+                body = {k: v for k, v in body.items() if k in props}
+            text = json.dumps(body)
+        else:
+            text = "```json\n" + json.dumps(body, indent=2) + "\n```"
+        # generation cost: ~4 chars per token
+        tokens = max(1, len(text) // 4)
+        with self._lock:
+            self.output_tokens += tokens
+        if self.s_per_token:
+            time.sleep(tokens * self.s_per_token)
+        return text
+
+
+# ---------- Measurement helpers ----------
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100.0 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class PairTimer:
+    """
+    Wraps a module's evaluate_alignment_for_pair and records one latency per *pair*.
+    The pipelines retry by recursing into the same function, so only the outermost call is timed.
+    """
+
+    def __init__(self, module):
+        self.module = module
+        self.original = module.evaluate_alignment_for_pair
+        self.latencies: List[float] = []
+        self._local = threading.local()
+
+    def _wrapped(self, *args, **kwargs):
+        depth = getattr(self._local, "depth", 0)
+        self._local.depth = depth + 1
+        t0 = time.perf_counter()
+        try:
+            return self.original(*args, **kwargs)
+        finally:
+            self._local.depth = depth
+            if depth == 0:
+                self.latencies.append(time.perf_counter() - t0)
+
+    def __enter__(self):
+        self.module.evaluate_alignment_for_pair = self._wrapped
+        return self
+
+    def __exit__(self, *exc):
+        self.module.evaluate_alignment_for_pair = self.original
+        return False
+
+
+class CallTimer:
+    """Accumulates wall time spent in module.<attr> (used for in-pipeline text extraction)."""
+
+    def __init__(self, module, attr: str):
+        self.module = module
+        self.attr = attr
+        self.original = getattr(module, attr)
+        self.seconds = 0.0
+
+    def _wrapped(self, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return self.original(*args, **kwargs)
+        finally:
+            self.seconds += time.perf_counter() - t0
+
+    def __enter__(self):
+        setattr(self.module, self.attr, self._wrapped)
+        return self
+
+    def __exit__(self, *exc):
+        setattr(self.module, self.attr, self.original)
+        return False
+
+
+def measured(fn: Callable[[], object]) -> Dict:
+    """Run fn under tracemalloc; return wall time, peak traced memory and the result."""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        result = fn()
+    finally:
+        wall = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {"result": result, "wall_s": wall, "peak_mem_bytes": peak}
+
+
+def pair_stats(latencies: List[float], wall_s: float, extraction_s: float) -> Dict:
+    pairs = len(latencies)
+    scoring_s = max(wall_s - extraction_s, 1e-9)
+    return {
+        "pairs": pairs,
+        "wall_s": round(wall_s, 4),
+        "extraction_s": round(extraction_s, 4),
+        "pairs_per_sec": round(pairs / wall_s, 3) if wall_s > 0 else 0.0,
+        "scoring_pairs_per_sec": round(pairs / scoring_s, 3) if pairs else 0.0,
+        "latency_p50_s": round(percentile(latencies, 50), 5),
+        "latency_p95_s": round(percentile(latencies, 95), 5),
+        "latency_max_s": round(max(latencies), 5) if latencies else 0.0,
+    }
+
+
+# ---------- Benchmarks ----------
+
+
+def course_dirs(courses: Optional[List[str]]) -> List[Path]:
+    dirs = sorted(p for p in CLASSWORK_DIR.iterdir() if p.is_dir())
+    if courses:
+        wanted = set(courses)
+        dirs = [p for p in dirs if p.name in wanted]
+    return dirs
+
+
+def student_names(limit: Optional[int]) -> List[str]:
+    names = []
+    for p in sorted(IEP_JSON_DIR.glob("*.json")):
+        raw = iep_alignment_pipeline.safe_load_json_file(p)
+        nm = str((raw.get("student", {}) or {}).get("student_name", "")).strip()
+        if nm:
+            names.append(nm)
+    return names[:limit] if limit else names
+
+
+def bench_extraction(dirs: List[Path]) -> Dict:
+    per_file: List[float] = []
+    chars = 0
+
+    def run():
+        nonlocal chars
+        for d in dirs:
+            for p in sorted(d.iterdir()):
+                if p.suffix.lower() not in (".pdf", ".txt"):
+                    continue
+                t0 = time.perf_counter()
+                text = iep_alignment_pipeline.extract_text_from_file(p)
+                per_file.append(time.perf_counter() - t0)
+                chars += len(text or "")
+
+    m = measured(run)
+    return {
+        "files": len(per_file),
+        "chars": chars,
+        "seconds": round(m["wall_s"], 4),
+        "per_file_p50_s": round(percentile(per_file, 50), 5),
+        "per_file_p95_s": round(percentile(per_file, 95), 5),
+        "peak_mem_bytes": m["peak_mem_bytes"],
+    }
+
+
+def bench_iep(fake: FakeLLM, dirs: List[Path], names: List[str], scores_only: bool = False) -> Dict:
+    selection = {CLASSWORK_DIR.name: [d.name for d in dirs]}
+    calls_before, failures_before = fake.calls, fake.failures
+    chars_before, prefix_before = fake.prompt_chars, fake.prefix_chars
+    tokens_before = fake.output_tokens
+    with PairTimer(iep_alignment_pipeline) as pt, CallTimer(iep_alignment_pipeline, "collect_worksheets_texts") as ct:
+        m = measured(
+            lambda: run_iep_alignment_selected(
+                student_names=names,
+                base_students_dir=str(IEP_JSON_DIR),
+                selection=selection,
+                base_curriculum_dir=str(SAMPLE_DIR),
+                scores_only=scores_only,
+            )
+        )
+    payload = m["result"] or {}
+    out = pair_stats(pt.latencies, m["wall_s"], ct.seconds)
+    out.update(
+        {
+            "students": len((payload.get("meta") or {}).get("students") or []),
+            "worksheets": len((payload.get("meta") or {}).get("worksheets") or []),
+            "llm_calls": fake.calls - calls_before,
+            "injected_failures": fake.failures - failures_before,
+            "output_tokens": fake.output_tokens - tokens_before,
+            # share of prompt chars a prefix cache could serve (vs. the previous prompt)
+            "prefix_reuse": round(
+                (fake.prefix_chars - prefix_before) / max(1, fake.prompt_chars - chars_before), 4
+            ),
+            "peak_mem_bytes": m["peak_mem_bytes"],
+        }
+    )
+    return out
+
+
+def bench_cc(fake: FakeLLM, dirs: List[Path]) -> Dict:
+    runs = []
+    latencies: List[float] = []
+    wall = extraction = 0.0
+    peak = 0
+    calls_before, failures_before = fake.calls, fake.failures
+    for d in dirs:
+        cc_name = next((f for pre, f in CC_FILE_BY_PREFIX.items() if d.name.startswith(pre)), None)
+        if not cc_name or not (CC_DIR / cc_name).exists():
+            continue
+        with PairTimer(cc_alignment_pipeline) as pt, CallTimer(cc_alignment_pipeline, "collect_worksheets_texts") as ct:
+            m = measured(lambda: cc_alignment_pipeline.run_pipeline(str(CC_DIR / cc_name), str(d)))
+        latencies.extend(pt.latencies)
+        wall += m["wall_s"]
+        extraction += ct.seconds
+        peak = max(peak, m["peak_mem_bytes"])
+        runs.append({"course": d.name, "cc_file": cc_name, "pairs": len(pt.latencies), "wall_s": round(m["wall_s"], 4)})
+    out = pair_stats(latencies, wall, extraction)
+    out.update(
+        {
+            "runs": runs,
+            "llm_calls": fake.calls - calls_before,
+            "injected_failures": fake.failures - failures_before,
+            "peak_mem_bytes": peak,
+        }
+    )
+    return out
+
+
+# ---------- CLI ----------
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Stub-LLM benchmark for the alignment pipelines")
+    p.add_argument("--latency-ms", type=float, default=0.0, help="Mean fake LLM latency per call")
+    p.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter around the mean latency")
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of calls returning unparseable output (0-0.95)")
+    p.add_argument(
+        "--free-form",
+        action="store_true",
+        help="Fake ignores the `format` schema (pre-structured-output behaviour; --fail-rate applies)",
+    )
+    p.add_argument(
+        "--ms-per-token", type=float, default=0.0, help="Extra fake latency per generated token (~4 chars)"
+    )
+    p.add_argument(
+        "--pool",
+        action="store_true",
+        help="Use the real run_llm + LLM pool (point LLM_HOSTS at scripts/stub_ollama.py servers)",
+    )
+    p.add_argument("--scores-only", action="store_true", help="IEP: numeric verdicts only, no explanations")
+    p.add_argument("--seed", type=int, default=0, help="Seed for deterministic scores/failures")
+    p.add_argument("--courses", nargs="*", help="Classwork subfolders to include (default: all)")
+    p.add_argument("--students", type=int, default=None, help="Limit number of IEP students")
+    p.add_argument(
+        "--prompt-layout",
+        choices=iep_alignment_pipeline.PROMPT_LAYOUTS,
+        help="IEP prompt layout (default: IEP_PROMPT_LAYOUT / worksheet_first)",
+    )
+    p.add_argument("--skip-iep", action="store_true")
+    p.add_argument("--skip-cc", action="store_true")
+    p.add_argument("--skip-extraction", action="store_true")
+    p.add_argument("--out", help="Write JSON report here instead of stdout")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    fake = FakeLLM(args.latency_ms, args.jitter_ms, args.fail_rate, args.seed, structured=not args.free_form, ms_per_token=args.ms_per_token)
+    dirs = course_dirs(args.courses)
+
+    originals = (iep_alignment_pipeline.run_llm, cc_alignment_pipeline.run_llm)
+    if args.pool:
+        fake.delegate = originals[0]  # real run_llm -> LLM pool; the wrapper only counts
+    if args.prompt_layout:
+        iep_alignment_pipeline.PROMPT_LAYOUT = args.prompt_layout
+    iep_alignment_pipeline.run_llm = fake
+    cc_alignment_pipeline.run_llm = fake
+    try:
+        report: Dict = {
+            "config": {
+                "latency_ms": args.latency_ms,
+                "jitter_ms": args.jitter_ms,
+                "fail_rate": fake.fail_rate,
+                "structured_output": fake.structured,
+                "ms_per_token": args.ms_per_token,
+                "scores_only": args.scores_only,
+                "seed": args.seed,
+                "prompt_layout": iep_alignment_pipeline.PROMPT_LAYOUT,
+                "courses": [d.name for d in dirs],
+            },
+            "env": {"python": platform.python_version(), "platform": platform.platform()},
+        }
+        if not args.skip_extraction:
+            report["extraction"] = bench_extraction(dirs)
+        if not args.skip_iep:
+            report["iep"] = bench_iep(fake, dirs, student_names(args.students), scores_only=args.scores_only)
+        if not args.skip_cc:
+            report["cc"] = bench_cc(fake, dirs)
+        if args.pool:
+            report["pool"] = POOL.status()
+    finally:
+        iep_alignment_pipeline.run_llm, cc_alignment_pipeline.run_llm = originals
+
+    if resource is not None:
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        report["env"]["max_rss_bytes"] = rss if sys.platform == "darwin" else rss * 1024
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+stub_ollama.py
+Minimal Ollama-compatible HTTP server for exercising the LLM pool without real models.
+- /api/chat, /api/generate: deterministic verdict JSON (honours a `format` schema); chat
+  prompts from chat_pipeline get a directive-style reply instead
+- "stream": true answers with NDJSON chunks, --token-ms apart
+- prompt_eval_count only counts what differs from the previous prompt on that port, like
+  Ollama's KV-cache reuse of a shared prefix
+- /api/ps, /api/tags, /api/version: enough for health checks and warm-up
+- configurable latency, per-server concurrency (like OLLAMA_NUM_PARALLEL) and failure rate
+- one process can listen on several ports, one independent "host" per port
+
+Usage (from backend/):
+  python scripts/stub_ollama.py --ports 11501 11502 11503 --latency-ms 200
+  python scripts/stub_ollama.py --ports 11504 --fail-rate 1.0          # a broken box
+  LLM_HOSTS="http://127.0.0.1:11501=2,http://127.0.0.1:11502,http://127.0.0.1:11503,http://127.0.0.1:11504" \\
+    python scripts/bench_pipelines.py --pool --courses engl6
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+
+def _score(seed: str, salt: str) -> int:
+    h = hashlib.sha256(f"{seed}|{salt}".encode("utf-8")).digest()
+    return 40 + int.from_bytes(h[:4], "big") % 61
+
+
+def fake_chat_reply(messages: Any) -> str:
+    """Reply in chat_pipeline's shape: echo the last user message as a directive."""
+    last = ""
+    for m in messages or []:
+        if m.get("role") == "user":
+            last = str(m.get("content") or "")
+    if last.startswith("Summarize"):
+        return "Earlier turns: the teacher asked for report changes; directives were proposed and confirmed."
+    marker = "User message to process:"
+    if marker in last:
+        last = last.split(marker, 1)[1].strip().split("\n\n", 1)[0]
+    line = next((ln for ln in reversed(last.splitlines()) if ln.strip()), "").strip()
+    return f"Understood.\nPROPOSED DIRECTIVE: {line[:120]}\nIs that right? (yes/no)"
+
+
+def fake_content(prompt: str, fmt: Any) -> str:
+    """Verdict JSON for the prompt; keys come from the schema, else from the prompt text."""
+    seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    props = fmt.get("properties") if isinstance(fmt, dict) else None
+    if not props:
+        if "understanding_fit" in prompt:
+            keys = ["understanding_fit", "accessibility_fit", "accommodation_fit", "engagement_fit", "overall_alignment"]
+            props = {k: {"type": "integer"} for k in keys}
+            props["explanation"] = {"type": "string"}
+        else:
+            props = {"alignment": {"type": "integer"}, "explanation": {"type": "string"}}
+    body: Dict[str, Any] = {}
+    for k, spec in props.items():
+        if spec.get("type") == "integer":
+            body[k] = _score(seed, k)
+        else:
+            body[k] = "Stub verdict from a local test server."
+    ints = [body[k] for k in ("understanding_fit", "accessibility_fit", "accommodation_fit", "engagement_fit") if k in body]
+    if ints and "overall_alignment" in body:
+        body["overall_alignment"] = int(round(sum(ints) / len(ints)))
+    text = json.dumps(body)
+    return text if fmt else "```json\n" + text + "\n```"
+
+
+class StubState:
+    def __init__(self, port: int, latency_ms: float, jitter_ms: float, fail_rate: float, parallel: int, seed: int,
+                 token_ms: float = 5.0):
+        self.port = port
+        self.token_s = token_ms / 1000.0
+        self.cached_prompts: List[str] = [""] * max(1, parallel)  # one KV cache per slot
+        self.latency_s = latency_ms / 1000.0
+        self.jitter_s = jitter_ms / 1000.0
+        self.fail_rate = fail_rate
+        self.slots = threading.BoundedSemaphore(max(1, parallel))
+        self.rng = random.Random(seed + port)
+        self.lock = threading.Lock()
+        self.loaded: Dict[str, float] = {}  # model -> expires (epoch)
+        self.served = 0
+
+    def delay(self) -> float:
+        with self.lock:
+            return max(0.0, self.latency_s + self.rng.uniform(-self.jitter_s, self.jitter_s))
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.rng.random() < self.fail_rate
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):  # keep the console quiet
+            pass
+
+        def _send(self, code: int, obj: Dict) -> None:
+            data = json.dumps(obj).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, req: Dict, content: str, prompt_tokens: int) -> None:
+            """NDJSON chunks of ~4 chars (one "token"), token_s apart; the last one carries the counts."""
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            chat = self.path == "/api/chat"
+
+            def emit(obj: Dict) -> None:
+                data = (json.dumps(obj) + "\n").encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            base = {"model": req.get("model") or "phi3", "created_at": datetime.now(timezone.utc).isoformat()}
+            for i in range(0, len(content), 4):
+                piece = content[i:i + 4]
+                body = {"message": {"role": "assistant", "content": piece}} if chat else {"response": piece}
+                emit(dict(base, done=False, **body))
+                time.sleep(state.token_s)
+            tail = {"message": {"role": "assistant", "content": ""}} if chat else {"response": ""}
+            emit(dict(base, done=True, done_reason="stop", prompt_eval_count=prompt_tokens,
+                      eval_count=len(content) // 4, **tail))
+            self.wfile.write(b"0\r\n\r\n")
+
+        def do_GET(self):
+            if self.path == "/api/version":
+                return self._send(200, {"version": "0.0.0-stub"})
+            if self.path in ("/api/ps", "/api/tags"):
+                now = time.time()
+                with state.lock:
+                    models = [
+                        {
+                            "name": f"{m}:latest",
+                            "model": f"{m}:latest",
+                            "size": 0,
+                            "digest": "stub",
+                            "expires_at": datetime.fromtimestamp(exp, timezone.utc).isoformat(),
+                        }
+                        for m, exp in state.loaded.items()
+                        if exp > now
+                    ]
+                return self._send(200, {"models": models})
+            if self.path == "/":
+                return self._send(200, {"status": "Ollama is running"})
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                req = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._send(400, {"error": "bad json"})
+            if self.path not in ("/api/chat", "/api/generate"):
+                return self._send(404, {"error": "not found"})
+
+            model = str(req.get("model") or "phi3").split(":")[0]
+            with state.slots:
+                t0 = time.perf_counter()
+                with state.lock:
+                    cold = model not in state.loaded or state.loaded[model] < time.time()
+                    state.loaded[model] = time.time() + 1800
+                if state.should_fail():
+                    return self._send(500, {"error": f"stub failure on port {state.port}"})
+                if self.path == "/api/chat":
+                    prompt = "\n".join(str(m.get("content", "")) for m in req.get("messages") or [])
+                else:
+                    prompt = str(req.get("prompt") or "")
+                with state.lock:
+                    # reuse the slot with the longest shared prefix, else the least recently used
+                    shared = [len(os.path.commonprefix([p, prompt])) for p in state.cached_prompts]
+                    cached = max(shared)
+                    state.cached_prompts.pop(shared.index(cached) if cached else 0)
+                    state.cached_prompts.append(prompt)  # most recently used last
+                if prompt:
+                    time.sleep(state.delay())
+                if self.path == "/api/chat" and not req.get("format") and "PROPOSED DIRECTIVE" in prompt:
+                    content = fake_chat_reply(req.get("messages"))
+                else:
+                    content = fake_content(prompt, req.get("format")) if prompt else ""
+                if req.get("stream"):
+                    self._stream(req, content, (len(prompt) - cached) // 4)
+                    with state.lock:
+                        state.served += 1
+                    return
+                total_ns = int((time.perf_counter() - t0) * 1e9)
+                with state.lock:
+                    state.served += 1
+
+            common = {
+                "model": req.get("model") or "phi3",
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": total_ns,
+                "load_duration": 1_200_000_000 if cold else 1_000_000,
+                "prompt_eval_count": (len(prompt) - cached) // 4,
+                "prompt_eval_duration": total_ns // 4,
+                "eval_count": len(content) // 4,
+                "eval_duration": total_ns // 2,
+            }
+            if self.path == "/api/chat":
+                common["message"] = {"role": "assistant", "content": content}
+            else:
+                common["response"] = content
+            self._send(200, common)
+
+    return Handler
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Stub Ollama server(s) for local pool testing")
+    p.add_argument("--ports", type=int, nargs="+", default=[11501])
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--latency-ms", type=float, default=100.0)
+    p.add_argument("--jitter-ms", type=float, default=0.0)
+    p.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 500")
+    p.add_argument("--parallel", type=int, default=1, help="Concurrent requests each server executes")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--token-ms", type=float, default=5.0, help="Delay between streamed chunks")
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    servers = []
+    for port in args.ports:
+        state = StubState(port, args.latency_ms, args.jitter_ms, args.fail_rate, args.parallel, args.seed,
+                          args.token_ms)
+        srv = ThreadingHTTPServer((args.host, port), make_handler(state))
+        srv.daemon_threads = True
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        servers.append(srv)
+        print(f"stub ollama listening on http://{args.host}:{port}", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for srv in servers:
+            srv.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
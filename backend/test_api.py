@@ -62,8 +62,29 @@ def test_secret_with_invalid_token():
     assert data == {"detail": "Invalid token"}
 
 
+def test_metrics_exposition():
+    token = test_login_success()
+    requests.get(f"{BASE_URL}/library", headers={"Authorization": f"Bearer {token}"})
+    response = requests.get(f"{BASE_URL}/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'instructive_http_requests_total{method="GET",route="/library",status="200"}' in response.text
+
+
+def test_align_explain_unknown_worksheet():
+    token = test_login_success()
+    response = requests.get(
+        f"{BASE_URL}/align/explain",
+        params={"worksheet": "no_such_worksheet.pdf", "student": "Nobody"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert response.status_code == 404
+
+
 if __name__ == "__main__":
     test_login_success()
     test_login_failure()
     test_secret_with_valid_token()
     test_secret_with_invalid_token()
+    test_metrics_exposition()
+    test_align_explain_unknown_worksheet()
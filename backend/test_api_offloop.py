@@ -0,0 +1,71 @@
+#
+# Route handlers must not open a store transaction on the event loop thread: it blocks
+# on the writer lock (and the writes behind it) while every other request waits.
+# Offline: the pipeline and the persistence helpers are replaced by stand-ins that
+# only open a transaction, with jsonstore's loop check turned on.
+# `python -m pytest -q test_api_offloop.py`
+#
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import jsonstore
+
+RESULT = {"meta": {}, "matrix": {}, "details": {}, "row_averages": [], "column_averages": []}
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    (tmp_path / "curriculum" / "c1" / "u1").mkdir(parents=True)
+    (tmp_path / "curriculum" / "c1" / "u1" / "w.pdf").write_bytes(b"%PDF-1.4\n%%EOF")
+    monkeypatch.setattr(api, "CUR_DIR", tmp_path / "curriculum")
+    monkeypatch.setattr(api, "CHECKPOINT_DIR", tmp_path / "checkpoints")
+    monkeypatch.setattr(api, "_student_name_from_id", lambda sid: "Test Student")
+    monkeypatch.setattr(api, "run_iep_alignment_selected", lambda **kw: dict(RESULT))
+    monkeypatch.setattr(jsonstore.STORE, "loop_check", True)
+    api.app.dependency_overrides[api.verify_jwt] = lambda: {"sub": "t", "email": "t@example.com"}
+    yield TestClient(api.app)
+    api.app.dependency_overrides.pop(api.verify_jwt, None)
+
+
+def _opens_transaction(calls, ret=None):
+    def fake(*args, **kwargs):
+        with jsonstore.transaction():
+            calls.append(args)
+        return ret
+    return fake
+
+
+def test_iep_selected_persists_off_the_loop(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, "_persist_iep_selected", _opens_transaction(calls))
+    r = client.post("/align/iep-selected", json={"student_ids": ["s1"], "courses": ["c1"], "units": ["u1"]})
+    assert r.status_code == 200, r.text
+    assert len(calls) == 1
+
+
+def test_course_selected_persists_off_the_loop(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, "_persist_course_rollup", _opens_transaction(calls))
+    r = client.post("/align/course-selected", json={"course": "c1", "units": ["u1"], "student_ids": ["s1"]})
+    assert r.status_code == 200, r.text
+    assert len(calls) == 1
+
+
+def test_report_routes_rebuild_the_index_off_the_loop(client, monkeypatch):
+    calls = []
+    monkeypatch.setattr(api, "_rebuild_reports_index", _opens_transaction(calls, {"reports": {}}))
+    assert client.get("/reports").status_code == 200
+    assert client.get("/reports/nope/file").status_code == 404
+    assert len(calls) == 2
+
+
+def test_the_check_catches_a_transaction_on_the_loop(client, monkeypatch):
+    # guards the tests above: run_in_threadpool made inline, the same stand-in must fail
+    async def inline(fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    monkeypatch.setattr(api, "run_in_threadpool", inline)
+    monkeypatch.setattr(api, "_rebuild_reports_index", _opens_transaction([], {"reports": {}}))
+    with pytest.raises(RuntimeError, match="event loop"):
+        client.get("/reports")
@@ -0,0 +1,175 @@
+#
+# Store transactions: commit, rollback and roll-forward after a crash mid-commit.
+# Runs offline against a temporary store: `python -m pytest -q test_jsonstore.py`
+#
+import asyncio
+import json
+import multiprocessing
+import os
+
+import pytest
+
+import jsonstore
+from jsonstore import JsonFileCache, JsonStore, StoreConflict, bump_rev, check_rev, write_json
+
+
+def _store(root):
+    cache = JsonFileCache(1 << 20)
+    return JsonStore(root, cache), cache
+
+
+def _load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_commit_writes_every_staged_file(tmp_path):
+    store, cache = _store(tmp_path)
+    a, b = tmp_path / "a.json", tmp_path / "b.json"
+    with store.transaction():
+        write_json(a, {"n": 1})
+        write_json(b, {"n": 2})
+        assert not a.exists() and not b.exists()  # staged until the block exits
+        assert cache.read(a, {}) == {"n": 1}       # but visible to reads in the block
+    assert _load(a) == {"n": 1} and _load(b) == {"n": 2}
+    assert not list((tmp_path / ".journal").glob("*.json"))
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_nested_transaction_joins_outer(tmp_path):
+    store, _ = _store(tmp_path)
+    a = tmp_path / "a.json"
+    with store.transaction() as outer:
+        with store.transaction() as inner:
+            assert inner is outer
+            write_json(a, {"n": 1})
+        assert not a.exists()
+    assert _load(a) == {"n": 1}
+
+
+def test_rollback_leaves_files_untouched(tmp_path):
+    store, _ = _store(tmp_path)
+    a, b = tmp_path / "a.json", tmp_path / "b.json"
+    write_json(a, {"n": 0})
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            write_json(a, {"n": 1})
+            write_json(b, {"n": 1})
+            raise RuntimeError("boom")
+    assert _load(a) == {"n": 0}
+    assert not b.exists()
+
+
+def test_conflict_rolls_back(tmp_path):
+    store, cache = _store(tmp_path)
+    a = tmp_path / "a.json"
+    write_json(a, {"_rev": 3})
+    with pytest.raises(StoreConflict):
+        with store.transaction():
+            rec = cache.read(a, {})
+            bump_rev(rec)
+            write_json(a, rec)
+            check_rev(rec, 3, "A")
+    assert _load(a) == {"_rev": 3}
+
+
+def test_failure_before_commit_point_discards_staged_files(tmp_path, monkeypatch):
+    store, _ = _store(tmp_path)
+    a, b = tmp_path / "a.json", tmp_path / "b.json"
+    write_json(a, {"n": 0})
+    real_fsync = os.fsync
+    calls = []
+
+    def flaky_fsync(fd):
+        calls.append(fd)
+        if len(calls) == 2:
+            raise OSError("disk full")
+        real_fsync(fd)
+
+    monkeypatch.setattr(jsonstore.os, "fsync", flaky_fsync)
+    with pytest.raises(OSError):
+        with store.transaction():
+            write_json(a, {"n": 1})
+            write_json(b, {"n": 1})
+    assert _load(a) == {"n": 0} and not b.exists()
+    assert not list(tmp_path.glob("*.tmp"))
+    assert store.recover() == 0
+
+
+def test_recover_rolls_forward_an_interrupted_commit(tmp_path, monkeypatch):
+    store, cache = _store(tmp_path)
+    a, b = tmp_path / "a.json", tmp_path / "b.json"
+    write_json(a, {"n": 0})
+    write_json(b, {"n": 0})
+    real_replace = os.replace
+    calls = []
+
+    def crash_after_first(src, dst):
+        calls.append(dst)
+        if len(calls) == 2:
+            raise OSError("killed")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(jsonstore.os, "replace", crash_after_first)
+    with pytest.raises(OSError):
+        with store.transaction():
+            write_json(a, {"n": 1})
+            write_json(b, {"n": 1})
+    monkeypatch.setattr(jsonstore.os, "replace", real_replace)
+    assert _load(a) == {"n": 1} and _load(b) == {"n": 0}  # half-applied
+
+    assert store.recover() == 1
+    assert _load(a) == {"n": 1} and _load(b) == {"n": 1}
+    assert cache.read(b, {}) == {"n": 1}
+    assert not list((tmp_path / ".journal").glob("*.json"))
+    assert store.recover() == 0
+
+
+def test_recover_drops_a_torn_journal(tmp_path):
+    store, _ = _store(tmp_path)
+    (tmp_path / ".journal").mkdir()
+    (tmp_path / ".journal" / "abc.json").write_text('{"replace": [["x', encoding="utf-8")
+    assert store.recover() == 1
+    assert not list((tmp_path / ".journal").glob("*.json"))
+
+
+def _increment(root, n):
+    store, cache = _store(root)
+    path = root / "counter.json"
+    for _ in range(n):
+        with store.transaction():
+            data = cache.read(path, {"n": 0})
+            data["n"] += 1
+            write_json(path, data)
+
+
+def test_no_lost_updates_across_processes(tmp_path):
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_increment, args=(tmp_path, 25)) for _ in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    assert _load(tmp_path / "counter.json") == {"n": 100}
+
+
+def test_loop_check_rejects_a_transaction_on_the_event_loop(tmp_path):
+    store, _ = _store(tmp_path)
+    store.loop_check = True
+
+    def _open():
+        with store.transaction():
+            write_json(tmp_path / "a.json", {"n": 1})
+
+    async def on_loop():
+        _open()
+
+    async def off_loop():
+        await asyncio.to_thread(_open)
+
+    with pytest.raises(RuntimeError, match="event loop"):
+        asyncio.run(on_loop())
+    assert not (tmp_path / "a.json").exists()
+    asyncio.run(off_loop())
+    assert _load(tmp_path / "a.json") == {"n": 1}
@@ -0,0 +1,74 @@
+#
+# SimpleAppLogger output: exceptions and sampling counts in both formats and modes.
+# Offline: `python -m pytest -q test_logger.py`
+#
+import json
+import logging
+import os
+import uuid
+
+import pytest
+
+import logger as applog
+from logger import SimpleAppLogger
+
+
+def _lines(tmp_path, name, mode, fmt, emit, **kw):
+    app = SimpleAppLogger(str(tmp_path), name, logging.INFO, mode=mode, fmt=fmt, **kw)
+    log = app.get_logger()
+    emit(log)
+    applog._stop_listeners()  # drains the queue
+    for h in list(log.handlers):
+        h.close()
+        log.removeHandler(h)
+    with open(os.path.join(str(tmp_path), f"{name}.{os.getpid()}.log"), encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def _name():
+    return f"t{uuid.uuid4().hex[:8]}"
+
+
+def _boom(log):
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        log.exception("failed %s", "here")
+
+
+@pytest.mark.parametrize("mode", ["queued", "sync"])
+def test_json_exception_goes_to_exc(tmp_path, mode):
+    lines = _lines(tmp_path, _name(), mode, "json", _boom)
+    assert len(lines) == 1
+    obj = json.loads(lines[0])
+    assert obj["msg"] == "failed here"
+    assert "ValueError: boom" in obj["exc"]
+
+
+@pytest.mark.parametrize("mode", ["queued", "sync"])
+def test_text_exception_follows_the_message(tmp_path, mode):
+    lines = _lines(tmp_path, _name(), mode, "text", _boom)
+    assert lines[0].endswith("[ERROR] - failed here")
+    assert lines[-1] == "ValueError: boom"
+
+
+def _burst(log):
+    for i in range(5):
+        log.info("pair %d of %d", i, 5)
+
+
+@pytest.mark.parametrize("mode", ["queued", "sync"])
+def test_json_suppressed_count_only_as_a_field(tmp_path, mode):
+    lines = [json.loads(l) for l in _lines(tmp_path, _name(), mode, "json", _burst, sample_rate=0.5)]
+    assert [o["msg"] for o in lines] == ["pair 0 of 5", "pair 2 of 5", "pair 4 of 5"]
+    assert [o.get("suppressed") for o in lines] == [None, 1, 1]
+
+
+def test_text_suppressed_marker_and_non_str_msg(tmp_path):
+    def emit(log):
+        for i in range(3):
+            log.info({"pair": i})  # msg that is not a str
+
+    lines = _lines(tmp_path, _name(), "queued", "text", emit, sample_rate=0.5)
+    assert lines[0].endswith("- {'pair': 0}")
+    assert lines[1].endswith("- {'pair': 2} [+1 similar suppressed]")
@@ -23,6 +23,23 @@ export async function apiGet<T>(path: string, options: RequestInit = {}): Promis
   return handle<T>(r);
 }
 
+export type ApiPage<T> = { data: T; total: number; nextCursor: string | null };
+
+/** GET a list route with paging params (limit, cursor, fields); totals come from the headers. */
+export async function apiGetPage<T>(path: string, options: RequestInit = {}): Promise<ApiPage<T>> {
+  const r = await fetch(`${API_BASE}${path}`, {
+    ...options,
+    method: "GET",
+    headers: { ...authHeaders(), ...(options.headers || {}) },
+  });
+  const data = await handle<T>(r);
+  return {
+    data,
+    total: Number(r.headers.get("X-Total-Count") ?? 0),
+    nextCursor: r.headers.get("X-Next-Cursor"),
+  };
+}
+
 export async function apiDelete(path: string, options: RequestInit = {}): Promise<void> {
   const r = await fetch(`${API_BASE}${path}`, {
     ...options,
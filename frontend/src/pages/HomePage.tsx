@@ -1,5 +1,5 @@
 import { useEffect, useMemo, useState } from "react";
-import { apiGet, apiGetBlobUrl } from "../lib/api";
+import { apiGetBlobUrl, apiGetPage } from "../lib/api";
 
 const COLORS = {
   border: "#e5e7eb",
@@ -27,13 +27,12 @@ type ReportMeta = {
   unit?: string | null;
 };
 
-type DocMeta = { id: string; size: number; uploaded_at: string; title: string };
+type DocMeta = { id: string; uploaded_at: string };
 
-type CurriculumResourceFit = { status: "good" | "warn" | "bad" };
-type CurriculumResource = { fit: CurriculumResourceFit };
-type CurriculumDTO = { courses: Record<string, Record<string, CurriculumResource[]>> };
+type FitStatus = "good" | "warn" | "bad";
+type CurriculumDTO = { courses: Record<string, Record<string, unknown[]>> };
 
-type Student = { id: string; name: string };
+type Student = { id: string };
 
 function pct(n: number) {
   return Math.round(n);
@@ -62,9 +61,11 @@ const go = (path: string) => {
 
 export default function HomePage() {
   const [reports, setReports] = useState<ReportMeta[]>([]);
-  const [docs, setDocs] = useState<DocMeta[]>([]);
-  const [students, setStudents] = useState<Student[]>([]);
-  const [curriculum, setCurriculum] = useState<CurriculumDTO | null>(null);
+  const [reportCount, setReportCount] = useState(0);
+  const [latestDoc, setLatestDoc] = useState<DocMeta | null>(null);
+  const [docCount, setDocCount] = useState(0);
+  const [studentCount, setStudentCount] = useState(0);
+  const [fitCounts, setFitCounts] = useState<Record<FitStatus, number>>({ good: 0, warn: 0, bad: 0 });
   const [busy, setBusy] = useState(false);
 
   useEffect(() => {
@@ -72,19 +73,32 @@ export default function HomePage() {
     (async () => {
       try {
         setBusy(true);
-        const [rep, lib, stu, cur] = await Promise.allSettled([
-          apiGet<ReportMeta[]>("/reports?sort=recent"),
-          apiGet<DocMeta[]>("/library"),
-          apiGet<Student[]>("/students"),
-          apiGet<CurriculumDTO>("/curriculum"),
+        // Only what the page shows: five reports, the newest document, and counts
+        // (X-Total-Count) for students and for resources per fit status.
+        const fitStatuses: FitStatus[] = ["good", "warn", "bad"];
+        const [rep, lib, stu, ...fits] = await Promise.allSettled([
+          apiGetPage<ReportMeta[]>("/reports?sort=recent&limit=5"),
+          apiGetPage<DocMeta[]>("/library?sort=recent&limit=1&fields=id,uploaded_at"),
+          apiGetPage<Student[]>("/students?limit=1&fields=id"),
+          ...fitStatuses.map((s) => apiGetPage<CurriculumDTO>(`/curriculum?status=${s}&limit=1&fields=path`)),
         ]);
 
         if (!alive) return;
 
-        if (rep.status === "fulfilled") setReports(rep.value.slice(0, 5));
-        if (lib.status === "fulfilled") setDocs(rep.status === "fulfilled" ? lib.value : []);
-        if (stu.status === "fulfilled") setStudents(stu.value);
-        if (cur.status === "fulfilled") setCurriculum(cur.value);
+        if (rep.status === "fulfilled") {
+          setReports(rep.value.data);
+          setReportCount(rep.value.total);
+        }
+        if (lib.status === "fulfilled") {
+          setLatestDoc(lib.value.data[0] ?? null);
+          setDocCount(lib.value.total);
+        }
+        if (stu.status === "fulfilled") setStudentCount(stu.value.total);
+        const counts = { good: 0, warn: 0, bad: 0 };
+        fits.forEach((f, i) => {
+          if (f.status === "fulfilled") counts[fitStatuses[i]] = f.value.total;
+        });
+        setFitCounts(counts);
       } finally {
         if (alive) setBusy(false);
       }
@@ -94,20 +108,10 @@ export default function HomePage() {
     };
   }, []);
 
-  const snapshot = useMemo(() => {
-    const counts = { good: 0, warn: 0, bad: 0, total: 0 };
-    if (!curriculum) return counts;
-    for (const course of Object.keys(curriculum.courses || {})) {
-      const units = curriculum.courses[course] || {};
-      for (const unit of Object.keys(units)) {
-        for (const r of units[unit] || []) {
-          counts.total += 1;
-          counts[r.fit.status] += 1;
-        }
-      }
-    }
-    return counts;
-  }, [curriculum]);
+  const snapshot = useMemo(
+    () => ({ ...fitCounts, total: fitCounts.good + fitCounts.warn + fitCounts.bad }),
+    [fitCounts]
+  );
 
   const snapPct = useMemo(() => {
     const t = snapshot.total || 1;
@@ -143,7 +147,7 @@ export default function HomePage() {
         <div>
           <h1 style={{ fontSize: 28, marginBottom: 4 }}>Welcome</h1>
           <div style={{ color: COLORS.muted }}>
-            {students.length} students • {reports.length} reports • {docs.length} documents
+            {studentCount} students • {reportCount} reports • {docCount} documents
           </div>
         </div>
       </div>
@@ -342,8 +346,8 @@ export default function HomePage() {
             >
               <div style={{ fontWeight: 700, marginBottom: 6 }}>Library Status</div>
               <div style={{ fontSize: 14, color: COLORS.muted }}>
-                {docs.length} PDFs in Library •{" "}
-                {docs.length ? new Date(docs[0].uploaded_at).toLocaleDateString() : "—"}
+                {docCount} PDFs in Library •{" "}
+                {latestDoc ? new Date(latestDoc.uploaded_at).toLocaleDateString() : "—"}
               </div>
             </div>
           </aside>